@@ -4,6 +4,48 @@ import sqlite3
 import pandas as pd
 import os
 from app.database import DATA_DIR, DB_PATH
+from app.utils.cache import invalidar_cache
+from app.services.presencia_service import get_indice_presencia
+from app.services.busqueda_service import construir_indice_busqueda
+from app.services.producto_service import get_catalogo_productos
+from app.services.analisis_marca_service import construir_clave_marca, construir_top_marcas
+
+# Índices de las tablas _raw: las consultas por código (consulta de producto,
+# validaciones, análisis) filtran por c_barra
+INDICES_RAW = {
+    "ventas_saldos_raw": ["c_barra"],
+    "inventario_bodega_raw": ["c_barra"],
+    "ventas_historico_raw": ["c_barra"],
+}
+
+
+def crear_indices_raw(cur):
+    for tabla, columnas in INDICES_RAW.items():
+        existe = cur.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (tabla,)
+        ).fetchone()
+        if not existe:
+            continue
+        for columna in columnas:
+            cur.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabla}_{columna} ON {tabla} ({columna})")
+
+def construir_derivados():
+    """
+    Índices y tablas que se derivan de las tablas _raw. Corre después de
+    cargar los CSV; las consultas de la API solo los leen.
+    """
+    # Paso 3: índice de presencia producto × almacén de los datos nuevos
+    indice = get_indice_presencia()
+    print(f"🧭 Índice de presencia: {len(indice.codigos)} códigos × {len(indice.almacenes)} almacenes")
+    print(f"📇 Catálogo de productos: {len(get_catalogo_productos())} códigos")
+    construir_clave_marca()
+    print("🏷️ Clave de marca (marca_key) creada en ventas_saldos_raw")
+    construir_top_marcas()
+    print("🏆 Top de productos por marca (top_marcas) calculado")
+
+    # Paso 4: índice de búsqueda de productos (trigram)
+    if construir_indice_busqueda():
+        print("🔎 Índice de búsqueda de productos creado")
 
 def resetear_y_cargar():
 
@@ -53,7 +95,14 @@ def resetear_y_cargar():
         df.to_sql(f"{tabla}_raw", conn, if_exists="replace", index=False)
         print(f"✅ {len(df)} filas insertadas en {tabla}_raw")
 
+    print("🗂️ Creando índices por código de barras...")
+    crear_indices_raw(cur)
+    conn.commit()
+
     conn.close()
+    invalidar_cache()
+    construir_derivados()
+
     print(f"\n🎉 Tablas _raw recreadas y cargadas con éxito en {DB_PATH}")
 
 if __name__ == "__main__":
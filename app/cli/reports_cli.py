@@ -9,7 +9,7 @@ from app.consultas import (
     get_redistribucion_regional,
 )
 
-from app.reports.excel_exporter import exportar_excel_formateado
+from app.reports.excel_exporter import exportar_excel_formateado, exportar_excel_por_tienda_zip
 
 def menu():
 # ======================================================
@@ -44,6 +44,7 @@ def run():
             nuevos_codigos = [c.strip() for c in codigos.split(",") if c.strip()]
 
         solo_ventas = input("¿Mostrar solo códigos con ventas? (s/n): ").lower() == "s"
+        paralelo = input("¿Calcular en paralelo por región? (s/n): ").lower() == "s"
 
         df = get_reabastecimiento_avanzado(
             dias_reab=dias_reab,
@@ -54,12 +55,17 @@ def run():
             guardar_debug_csv=True,
             nuevos_codigos=nuevos_codigos,
             solo_con_ventas=solo_ventas,
+            particionar_por="region" if paralelo else None,
         )
 
         df = limpiar_dataframe(df)
 
         print(f"\n🔍 Total filas en reporte: {len(df)}")
-        exportar_excel_formateado(df, "reabastecimiento_jagi.xlsx", "Reabastecimiento")
+        por_tienda = input("¿Generar un libro por tienda (zip, en paralelo)? (s/n): ").lower() == "s"
+        if por_tienda:
+            exportar_excel_por_tienda_zip(df, "reabastecimiento_jagi.zip", "Reabastecimiento")
+        else:
+            exportar_excel_formateado(df, "reabastecimiento_jagi.xlsx", "Reabastecimiento")
 
     elif opcion == "2":
         df = get_existencias_por_tienda()
@@ -85,7 +91,10 @@ def run():
         dias = int(input("Ingrese los días para analizar redistribución: "))
         ventas_min = int(input("Ventas mínimas para considerar demanda: "))
         tienda_filtro = input("¿Desea analizar una tienda específica? (dejar vacío para todas): ").strip() or None
-        df_redis = get_redistribucion_regional(dias, ventas_min, tienda_filtro)
+        optimo = input("¿Optimizar traslados en toda la cadena? (s/n): ").strip().lower() == "s"
+        df_redis = get_redistribucion_regional(
+            dias, ventas_min, tienda_filtro, modo="optimo" if optimo else "regional"
+        )
         print(f"🔎 Orígenes candidatos: {df_redis['tienda_origen'].nunique()}, "
               f"Destinos candidatos: {df_redis['tienda_destino'].nunique()}")
         print(f"📦 Redistribución generada: {len(df_redis)} movimientos sugeridos.")
@@ -4,11 +4,18 @@
 from app.database import DB_NAME
 from app.services import (
     get_analisis_marca,
+    get_analisis_todas_marcas,
     get_consulta_producto,
+    get_consulta_productos,
+    get_catalogo_productos,
     get_existencias_por_tienda,
+    stream_existencias_por_tienda,
     get_movimiento,
     get_resumen_movimiento,
+    stream_movimiento,
     get_faltantes,
     get_reabastecimiento_avanzado,
-    get_redistribucion_regional
+    evaluar_escenarios_reabastecimiento,
+    get_redistribucion_regional,
+    buscar_productos
 )
\ No newline at end of file
@@ -9,7 +9,7 @@ Actualizado: Ahora usa sistema de logging profesional.
 
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, declarative_base
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import QueuePool
 import logging
 import os
 
@@ -52,10 +52,16 @@ else:  # SQLite
     
     DATABASE_URL = f"sqlite:///{DB_PATH}"
     
+    # Una conexión por petición: los endpoints síncronos corren en el
+    # threadpool de FastAPI y no deben compartir cursores ni transacciones.
+    # check_same_thread=False solo permite que la conexión vuelva al pool
+    # desde otro hilo; cada una la usa un solo hilo a la vez.
     engine = create_engine(
         DATABASE_URL,
         connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
+        poolclass=QueuePool,
+        pool_size=5,
+        max_overflow=10,
         echo=settings.app.debug,
     )
     logger.info(f"📦 Conectado a SQLite: {DB_PATH}")
@@ -149,6 +155,22 @@ def date_format_convert(column: str, sqlite_format: str = "DD/MM/YYYY") -> str:
             return f"DATE({column})"
 
 
+def date_literal(fecha) -> str:
+    """Genera SQL compatible para una fecha fija (date o datetime)."""
+    if DB_TYPE == "postgresql":
+        return f"DATE '{fecha:%Y-%m-%d}'"
+    else:
+        return f"DATE('{fecha:%Y-%m-%d}')"
+
+
+def row_id(alias: str) -> str:
+    """Identificador físico de la fila de una tabla, para desempatar órdenes."""
+    if DB_TYPE == "postgresql":
+        return f"{alias}.ctid::text"
+    else:
+        return f"{alias}.rowid"
+
+
 def current_date() -> str:
     """Retorna SQL para fecha actual según BD."""
     if DB_TYPE == "postgresql":
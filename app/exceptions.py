@@ -123,6 +123,20 @@ class TransactionError(DatabaseException):
         )
 
 
+class DerivedDataMissingError(DatabaseException):
+    """Falta una tabla o columna que se genera en la carga de datos."""
+    
+    def __init__(self, objeto: str):
+        super().__init__(
+            message=(
+                f"Falta '{objeto}' en la base de datos. "
+                f"Ejecute la carga de datos: python -m app.cargar_csv"
+            ),
+            code="DB_DERIVED_DATA_MISSING",
+            details={"objeto": objeto}
+        )
+
+
 # ==========================================
 # EXCEPCIONES DE VALIDACIÓN
 # ==========================================
@@ -1,11 +1,12 @@
 # app/main.py
 
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
 from urllib.parse import unquote
+from datetime import date
 import os
 
 from app.logging_config import setup_logging
@@ -14,24 +15,40 @@ setup_logging()
 import shutil
 import pandas as pd
 import logging
-from app.database import get_connection, test_connection, get_db_info, DATA_DIR, date_subtract_days, date_format_convert
+from app.database import get_connection, test_connection, get_db_info, DATA_DIR, date_subtract_days, date_format_convert, row_id
 from app.consultas import(
     get_reabastecimiento_avanzado,
+    evaluar_escenarios_reabastecimiento,
     get_redistribucion_regional,
     get_existencias_por_tienda,
+    stream_existencias_por_tienda,
     get_movimiento,
     get_resumen_movimiento,
+    stream_movimiento,
     get_faltantes,
     get_consulta_producto,
-    get_analisis_marca
+    get_consulta_productos,
+    get_catalogo_productos,
+    get_analisis_marca,
+    get_analisis_todas_marcas,
+    buscar_productos
 )
 from app.cargar_csv import resetear_y_cargar
-from app.reports.excel_exporter import exportar_excel_formateado
+from app.utils.cache import CacheGeneracional, invalidar_cache
+from app.utils.paginacion import sql_pagina, cortar_pagina, pagina_dataframe
+from app.utils.streaming import FORMATOS_STREAM
+from app.reports.excel_exporter import (
+    exportar_excel_formateado,
+    exportar_excel_por_tienda_zip,
+    exportar_hojas_excel,
+)
+from app.reports.parquet_exporter import exportar_parquet_zip, parquet_disponible
 
 from app.schemas import (
     ReabastecimientoCalculoRequest,
+    ReabastecimientoEscenariosRequest,
     ReabastecimientoResponse,
-    ReabastecimientoItem,
+    PaginationParams,
 )
 
 # Configurar logging
@@ -46,7 +63,7 @@ from app.middleware import (
     http_exception_handler,
     general_exception_handler
 )
-from app.exceptions import BaseAppException
+from app.exceptions import BaseAppException, InvalidDataError
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
@@ -79,6 +96,8 @@ class ReabastecimientoParams(BaseModel):
     ventas_min_exp: int = 3
     solo_con_ventas: bool = False
     nuevos_codigos: Optional[List[ProductoNuevo]] = None
+    particionar_por: Optional[Literal["region", "tienda"]] = None
+    paginacion: Optional[PaginationParams] = None
 
 class ReabastecimientoExportParams(BaseModel):
     dias_reab: int = 10
@@ -86,6 +105,7 @@ class ReabastecimientoExportParams(BaseModel):
     ventas_min_exp: int = 3
     solo_con_ventas: bool = False
     nuevos_codigos: Optional[List[ProductoNuevo]] = None
+    particionar_por: Optional[Literal["region", "tienda"]] = None
     columnas_seleccionadas: Optional[List[str]] = None
     tiendas_filtro: Optional[List[str]] = None
     observaciones_filtro: Optional[List[str]] = None
@@ -94,6 +114,7 @@ class RedistribucionParams(BaseModel):
     dias: int = 30
     ventas_min: int = 1
     tienda_origen: Optional[str] = None
+    modo: Literal["regional", "optimo"] = "regional"
 
 class ExistenciasParams(BaseModel):
     tienda: Optional[str] = None
@@ -101,16 +122,25 @@ class ExistenciasParams(BaseModel):
     stock_min: Optional[int] = 0
     stock_max: Optional[int] = 999999
     region: Optional[str] = None
+    paginacion: Optional[PaginationParams] = None
 
 class FaltantesParams(BaseModel):
     dias_sin_venta: Optional[int] = 90
     region: Optional[str] = None
     tienda: Optional[str] = None
     marca: Optional[str] = None
+    paginacion: Optional[PaginationParams] = None
+
+class ConsultaProductosParams(BaseModel):
+    codigos: List[str] = Field(..., min_length=1, max_length=5000)
+
+class ValidarCodigosParams(BaseModel):
+    codigos: List[str] = Field(..., min_length=1, max_length=5000)
 
 class ExportarPreviewParams(BaseModel):
     datos: List[dict]
     nombre_reporte: str = "Reporte"
+    por_tienda: bool = False  # zip con un libro por tienda, generados en paralelo
 
 class TiendaCreate(BaseModel):
     raw_name: str
@@ -288,6 +318,7 @@ async def actualizar_inventario_fisico(file: UploadFile = File(...)):
                 no_encontrados.append(c_barra)
 
         conn.commit()
+        invalidar_cache()
 
         if no_encontrados:
             pd.DataFrame({"producto_id": no_encontrados}).to_excel("codigos_no_encontrados.xlsx", index=False)
@@ -319,7 +350,10 @@ async def calcular_reabastecimiento(
         ReabastecimientoResponse con items calculados y resumen
     """
     import logging
-    from app.services.reabastecimiento_service import get_reabastecimiento_avanzado
+    from app.services.reabastecimiento_service import (
+        get_reabastecimiento_avanzado,
+        construir_items_respuesta,
+    )
     
     logger = logging.getLogger(__name__)
     
@@ -337,61 +371,34 @@ async def calcular_reabastecimiento(
             dias_exp=request.dias_stock,
             excluir_sin_movimiento=not request.incluir_sin_movimiento,
             incluir_fijos=True,
-            guardar_debug_csv=False
+            guardar_debug_csv=False,
+            tiendas=request.tiendas,
+            codigos=request.productos,
+            fecha_inicio=request.fecha_inicio,
+            fecha_fin=request.fecha_fin
         )
         
-        # Convertir DataFrame a lista de items
-        items = []
-        for _, row in df.iterrows():
-            # Determinar prioridad basada en días de stock
-            if row.get('dias_stock_actual', 0) < 3:
-                prioridad = "ALTA"
-            elif row.get('dias_stock_actual', 0) < 7:
-                prioridad = "MEDIA"
-            else:
-                prioridad = "BAJA"
-            
-            item = ReabastecimientoItem(
-                tienda=str(row.get('tienda', '')),
-                producto=str(row.get('producto', '')),
-                descripcion=str(row.get('descripcion', '')),
-                stock_actual=int(row.get('stock_actual', 0)),
-                venta_promedio=float(row.get('venta_promedio', 0)),
-                dias_stock_actual=float(row.get('dias_stock_actual', 0)),
-                necesidad=int(row.get('necesidad', 0)),
-                prioridad=prioridad
-            )
-            items.append(item)
+        # Items y resumen por tienda (vectorizado, sin un modelo por fila)
+        df_items, resumen_tiendas = construir_items_respuesta(df)
         
         # Calcular estadísticas
-        items_con_necesidad = len([i for i in items if i.necesidad > 0])
-        total_unidades = sum(i.necesidad for i in items)
-        
-        # Resumen por tienda
-        resumen_tiendas = {}
-        for item in items:
-            if item.tienda not in resumen_tiendas:
-                resumen_tiendas[item.tienda] = {
-                    "total_productos": 0,
-                    "productos_con_necesidad": 0,
-                    "unidades_necesarias": 0
-                }
-            resumen_tiendas[item.tienda]["total_productos"] += 1
-            if item.necesidad > 0:
-                resumen_tiendas[item.tienda]["productos_con_necesidad"] += 1
-                resumen_tiendas[item.tienda]["unidades_necesarias"] += item.necesidad
+        items_con_necesidad = int((df_items["necesidad"] > 0).sum())
+        total_unidades = int(df_items["necesidad"].sum())
         
         logger.info(
             f"Reabastecimiento calculado | "
-            f"Total items: {len(items)} | "
+            f"Total items: {len(df_items)} | "
             f"Con necesidad: {items_con_necesidad} | "
             f"Unidades: {total_unidades}"
         )
         
-        return ReabastecimientoResponse(
+        # Se valida el encabezado con el modelo; los items vienen de un
+        # DataFrame interno con los tipos de ReabastecimientoItem ya
+        # normalizados (construir_items_respuesta) y no se validan uno a uno.
+        respuesta = ReabastecimientoResponse(
             success=True,
             message=f"Reabastecimiento calculado: {items_con_necesidad} productos necesitan reposición",
-            total_items=len(items),
+            total_items=len(df_items),
             items_con_necesidad=items_con_necesidad,
             total_unidades_necesarias=total_unidades,
             parametros={
@@ -402,16 +409,21 @@ async def calcular_reabastecimiento(
                 "tiendas": request.tiendas,
                 "productos": request.productos,
             },
-            items=items,
+            items=[],
             resumen_por_tienda=resumen_tiendas
         )
         
+        contenido = respuesta.model_dump(mode="json", exclude={"items"})
+        contenido["items"] = df_items.to_dict(orient="records")
+        
+        return JSONResponse(contenido)
+        
     except Exception as e:
         logger.error(f"Error calculando reabastecimiento: {str(e)}", exc_info=True)
         raise
     
 @app.post("/reabastecimiento/columnas-disponibles")
-async def obtener_columnas_reabastecimiento(params: ReabastecimientoParams):
+def obtener_columnas_reabastecimiento(params: ReabastecimientoParams):
     """
     Retorna las columnas disponibles en el reporte de reabastecimiento
     sin generar el archivo completo (más rápido)
@@ -434,7 +446,8 @@ async def obtener_columnas_reabastecimiento(params: ReabastecimientoParams):
             dias_exp=params.dias_exp,
             ventas_min_exp=params.ventas_min_exp,
             solo_con_ventas=params.solo_con_ventas,
-            nuevos_codigos=nuevos_codigos_dict
+            nuevos_codigos=nuevos_codigos_dict,
+            particionar_por=params.particionar_por
         )
         
         if "region" in df.columns:
@@ -453,7 +466,7 @@ async def obtener_columnas_reabastecimiento(params: ReabastecimientoParams):
         raise HTTPException(status_code=500, detail=str(e))
     
 @app.post("/reabastecimiento/opciones-filtros")
-async def obtener_opciones_filtros(params: ReabastecimientoParams):
+def obtener_opciones_filtros(params: ReabastecimientoParams):
     """
     Obtiene las opciones disponibles para filtros:
     - Lista de tiendas
@@ -478,7 +491,8 @@ async def obtener_opciones_filtros(params: ReabastecimientoParams):
             dias_exp=params.dias_exp,
             ventas_min_exp=params.ventas_min_exp,
             solo_con_ventas=params.solo_con_ventas,
-            nuevos_codigos=nuevos_codigos_dict
+            nuevos_codigos=nuevos_codigos_dict,
+            particionar_por=params.particionar_por
         )
         
         if "region" in df.columns:
@@ -501,7 +515,7 @@ async def obtener_opciones_filtros(params: ReabastecimientoParams):
         raise HTTPException(status_code=500, detail=str(e))
     
 @app.post("/reabastecimiento/preview-filtrado")
-async def preview_reabastecimiento_filtrado(params: ReabastecimientoExportParams):
+def preview_reabastecimiento_filtrado(params: ReabastecimientoExportParams):
     """
     Genera preview filtrado según tiendas y observaciones seleccionadas.
     Retorna solo primeras 100 filas para mejor rendimiento.
@@ -518,13 +532,15 @@ async def preview_reabastecimiento_filtrado(params: ReabastecimientoExportParams
                 for p in params.nuevos_codigos
             ]
         
-        # Generar reporte completo
+        # Generar reporte solo para las tiendas pedidas
         df = get_reabastecimiento_avanzado(
             dias_reab=params.dias_reab,
             dias_exp=params.dias_exp,
             ventas_min_exp=params.ventas_min_exp,
             solo_con_ventas=params.solo_con_ventas,
-            nuevos_codigos=nuevos_codigos_dict
+            nuevos_codigos=nuevos_codigos_dict,
+            particionar_por=params.particionar_por,
+            tiendas=params.tiendas_filtro
         )
         
         if "region" in df.columns:
@@ -562,13 +578,35 @@ async def preview_reabastecimiento_filtrado(params: ReabastecimientoExportParams
         logging.error(f"Error en preview filtrado: {e}")
         raise HTTPException(status_code=500, detail=str(e))    
 
+@app.post("/reabastecimiento/escenarios")
+def calcular_escenarios_reabastecimiento(request: ReabastecimientoEscenariosRequest):
+    """
+    Evalúa varias combinaciones de dias_reab, dias_exp y ventas_min_exp
+    en una sola pasada y retorna los totales de cada escenario
+    (unidades a despachar, COMPRA y expansión).
+    """
+    try:
+        escenarios = evaluar_escenarios_reabastecimiento(
+            request.escenarios(),
+            solo_con_ventas=request.solo_con_ventas
+        )
+        return JSONResponse({
+            "success": True,
+            "total": len(escenarios),
+            "escenarios": escenarios
+        })
+    except Exception as e:
+        logging.error(f"Error al evaluar escenarios: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/redistribucion")
-async def generar_redistribucion(params: RedistribucionParams):
+def generar_redistribucion(params: RedistribucionParams):
     try:
         df = get_redistribucion_regional(
             dias=params.dias,
             ventas_min=params.ventas_min,
-            tienda_origen=params.tienda_origen if params.tienda_origen else None
+            tienda_origen=params.tienda_origen if params.tienda_origen else None,
+            modo=params.modo
         )
         if df.empty:
             raise HTTPException(status_code=404, detail="No hay redistribuciones sugeridas")
@@ -578,11 +616,62 @@ async def generar_redistribucion(params: RedistribucionParams):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-# ===== PREVIEWS =====
-@app.post("/reabastecimiento-preview")
-async def preview_reabastecimiento(params: ReabastecimientoParams):
-    try:
-        # Convertir nuevos_codigos de Pydantic a dict si existen
+# ===== PAGINACIÓN DE PREVIEWS =====
+# Totales por filtros y resultados de reabastecimiento ya calculados; valen
+# mientras no cambie la generación de datos.
+_cache_totales = CacheGeneracional(maxsize=64)
+_cache_reabastecimiento = CacheGeneracional(maxsize=4)
+
+# Columnas de orden (keyset) de cada preview, agregadas por la consulta.
+# Juntas deben ser únicas por fila: existencias desempata con la fila de
+# saldos, faltantes ya es único por su SELECT DISTINCT y reabastecimiento
+# con la posición de la fila en el resultado ordenado.
+ORDEN_EXISTENCIAS = ["k_region", "k_tienda", "k_marca", "k_barra", "k_almacen", "k_fila"]
+ORDEN_FALTANTES = ["k_region", "k_tienda", "k_marca", "k_barra", "k_color"]
+ORDEN_REABASTECIMIENTO = ["k_region", "k_tienda", "k_marca", "k_barra", "k_fila"]
+
+
+def _preview_paginado(conn, sql_base, params_list, orden, paginacion, clave_total):
+    """
+    Página keyset de un preview SQL más el total de filas y las estadísticas
+    de todo el resultado (cacheados por filtros).
+    """
+    def contar():
+        totales = pd.read_sql(
+            f"""
+            SELECT COUNT(*) AS total_registros,
+                   COUNT(DISTINCT tienda) AS tiendas,
+                   COUNT(DISTINCT c_barra) AS productos
+            FROM ({sql_base}) conteo
+            """,
+            conn, params=tuple(params_list)
+        )
+        estadisticas = {k: int(v) for k, v in totales.iloc[0].items()}
+        # Existencias y faltantes no tienen columna de cantidad a mover
+        estadisticas["unidades"] = 0
+        return estadisticas
+
+    estadisticas = _cache_totales.obtener(clave_total, contar)
+    sql, params_extra = sql_pagina(sql_base, orden, paginacion.cursor, paginacion.page_size)
+    df = pd.read_sql(sql, conn, params=tuple(params_list) + tuple(params_extra))
+    df, siguiente = cortar_pagina(df, orden, paginacion.page_size)
+
+    return {
+        "success": True,
+        "total": estadisticas["total_registros"],
+        "estadisticas": estadisticas,
+        "page_size": paginacion.page_size,
+        "has_more": siguiente is not None,
+        "next_cursor": siguiente,
+        "datos": df.drop(columns=orden).to_dict(orient='records'),
+    }
+
+
+def _reabastecimiento_preview(params: ReabastecimientoParams):
+    """Resultado de reabastecimiento del preview, ordenado para keyset y cacheado."""
+    clave = (params.model_dump_json(exclude={"paginacion"}), date.today())
+
+    def calcular():
         nuevos_codigos_dict = None
         if params.nuevos_codigos:
             nuevos_codigos_dict = [
@@ -593,25 +682,69 @@ async def preview_reabastecimiento(params: ReabastecimientoParams):
                 }
                 for p in params.nuevos_codigos
             ]
-        
+
         df = get_reabastecimiento_avanzado(
             dias_reab=params.dias_reab,
             dias_exp=params.dias_exp,
             ventas_min_exp=params.ventas_min_exp,
             solo_con_ventas=params.solo_con_ventas,
-            nuevos_codigos=nuevos_codigos_dict  # ⭐ PASAR NUEVOS CÓDIGOS
+            nuevos_codigos=nuevos_codigos_dict,  # ⭐ PASAR NUEVOS CÓDIGOS
+            particionar_por=params.particionar_por
         )
-        
-        if "region" in df.columns:
-            df = df.drop(columns=["region"])
-        
+
+        claves = df[["region", "tienda", "d_marca", "c_barra"]].fillna("").astype(str)
+        claves.columns = ORDEN_REABASTECIMIENTO[:-1]
+        df = pd.concat([df, claves], axis=1)
+        df = df.sort_values(ORDEN_REABASTECIMIENTO[:-1], kind="stable").reset_index(drop=True)
+        # Filas con las mismas claves (p. ej. dos almacenes con el mismo
+        # nombre limpio) se desempatan por su posición
+        df["k_fila"] = df.index
+        return df
+
+    return _cache_reabastecimiento.obtener(clave, calcular)
+
+
+def _estadisticas_reabastecimiento(df):
+    """Estadísticas de todo el resultado, para las tarjetas del preview por lotes."""
+    return {
+        "total_registros": len(df),
+        "tiendas": int(df["tienda"].nunique()),
+        "productos": int(df["c_barra"].nunique()),
+        "unidades": int(df["cantidad_a_despachar"].fillna(0).sum()),
+    }
+
+
+# ===== PREVIEWS =====
+@app.post("/reabastecimiento-preview")
+def preview_reabastecimiento(params: ReabastecimientoParams):
+    try:
+        df = _reabastecimiento_preview(params)
+
+        if params.paginacion:
+            pagina, siguiente = pagina_dataframe(
+                df, ORDEN_REABASTECIMIENTO, params.paginacion.cursor, params.paginacion.page_size
+            )
+            datos = pagina.drop(columns=ORDEN_REABASTECIMIENTO + ["region"]).to_dict(orient='records')
+            return JSONResponse({
+                "success": True,
+                "total": len(df),
+                "estadisticas": _estadisticas_reabastecimiento(df),
+                "page_size": params.paginacion.page_size,
+                "has_more": siguiente is not None,
+                "next_cursor": siguiente,
+                "datos": datos,
+            })
+
+        df = df.drop(columns=ORDEN_REABASTECIMIENTO + ["region"])
         datos = df.to_dict(orient='records')
         return JSONResponse({"success": True, "total": len(datos), "datos": datos[:10000]})
+    except InvalidDataError:
+        raise
     except Exception as e: 
         raise HTTPException(status_code=500, detail=str(e))
     
 @app.post("/exportar-preview-personalizado")
-async def exportar_preview_personalizado(params: ExportarPreviewParams):
+def exportar_preview_personalizado(params: ExportarPreviewParams):
     """
     Exporta datos del preview con columnas personalizadas ya filtradas
     """
@@ -624,6 +757,12 @@ async def exportar_preview_personalizado(params: ExportarPreviewParams):
         
         # Generar nombre de archivo seguro
         nombre_archivo = params.nombre_reporte.replace(' ', '_').lower()
+
+        if params.por_tienda:
+            archivo = f"{nombre_archivo}_por_tienda.zip"
+            exportar_excel_por_tienda_zip(df, archivo, params.nombre_reporte)
+            return FileResponse(archivo, media_type="application/zip", filename=archivo)
+
         archivo = f"{nombre_archivo}_personalizado.xlsx"
         
         # Exportar con formato
@@ -639,12 +778,13 @@ async def exportar_preview_personalizado(params: ExportarPreviewParams):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/redistribucion-preview")
-async def preview_redistribucion(params: RedistribucionParams):
+def preview_redistribucion(params: RedistribucionParams):
     try:
         df = get_redistribucion_regional(
             dias=params.dias,
             ventas_min=params.ventas_min,
-            tienda_origen=params.tienda_origen if params.tienda_origen else None
+            tienda_origen=params.tienda_origen if params.tienda_origen else None,
+            modo=params.modo
         )
         if df.empty:
             return JSONResponse({"success": False, "message": "No hay redistribuciones sugeridas"})
@@ -671,6 +811,7 @@ async def agregar_referencia_fija(codigo: dict):
             cursor = conn.connection.cursor()
             cursor.execute("INSERT INTO referencias_fijas (cod_barras) VALUES (?)", (codigo.get('codigo'),))
             conn.commit()
+            invalidar_cache()
         return JSONResponse({"success": True, "message": "Referencia agregada"})
     except Exception as e:
         return JSONResponse({"success": False, "error": str(e)})
@@ -685,6 +826,7 @@ async def eliminar_referencia_fija(codigo: str):
             cursor.execute("DELETE FROM referencias_fijas WHERE cod_barras = ?", (codigo,))
             filas = cursor.rowcount
             conn.commit()
+            invalidar_cache()
             if filas == 0:
                 return JSONResponse({"success": False, "error": "Código no encontrado"}, status_code=404)
         return JSONResponse({"success": True, "message": f"Referencia {codigo} eliminada"})
@@ -707,6 +849,7 @@ async def agregar_codigo_excluido(codigo: dict):
             cursor = conn.connection.cursor()
             cursor.execute("INSERT INTO codigos_excluidos (cod_barras) VALUES (?)", (codigo.get('codigo'),))
             conn.commit()
+            invalidar_cache()
         return JSONResponse({"success": True, "message": "Código excluido agregado"})
     except Exception as e:
         return JSONResponse({"success": False, "error": str(e)})
@@ -721,6 +864,7 @@ async def eliminar_codigo_excluido(codigo: str):
             cursor.execute("DELETE FROM codigos_excluidos WHERE cod_barras = ?", (codigo,))
             filas = cursor.rowcount
             conn.commit()
+            invalidar_cache()
             if filas == 0:
                 return JSONResponse({"success": False, "error": "Código no encontrado"}, status_code=404)
         return JSONResponse({"success": True, "message": "Código eliminado"})
@@ -755,6 +899,7 @@ async def actualizar_stock_minimo(config: dict):
             for tipo, cantidad in config.items():
                 cursor.execute("INSERT OR REPLACE INTO stock_minimo_config (tipo, cantidad) VALUES (?, ?)", (tipo, cantidad))
             conn.commit()
+            invalidar_cache()
         return JSONResponse({"success": True, "message": "Configuración actualizada correctamente"})
     except Exception as e:
         return JSONResponse({"success": False, "error": str(e)})
@@ -869,6 +1014,7 @@ async def agregar_tienda(tienda: TiendaCreate):
             """, (tienda.raw_name, tienda.clean_name, tienda.region, 1 if tienda.fija else 0))
             
             conn.commit()
+            invalidar_cache()
             
         return JSONResponse({"success": True, "message": "Tienda agregada correctamente"})
     except Exception as e:
@@ -907,6 +1053,7 @@ async def actualizar_tienda(raw_name: str, tienda: TiendaUpdate):
             cursor.execute(query, params)
             filas = cursor.rowcount
             conn.commit()
+            invalidar_cache()
             
             if filas == 0:
                 return JSONResponse({"success": False, "error": "Tienda no encontrada"}, status_code=404)
@@ -929,6 +1076,7 @@ async def eliminar_tienda(raw_name: str):
             cursor.execute("DELETE FROM config_tiendas WHERE raw_name = ?", (raw_name,))
             filas = cursor.rowcount
             conn.commit()
+            invalidar_cache()
             
             if filas == 0:
                 return JSONResponse({"success": False, "error": "Tienda no encontrada"}, status_code=404)
@@ -956,58 +1104,22 @@ async def obtener_regiones_disponibles():
 @app.get("/validar-codigo-lanzamiento/{codigo:path}")
 async def validar_codigo_lanzamiento(codigo: str):
     """
-    Valida si un código de barras existe en la BD.
+    Valida si un código de barras existe (en saldos o, si no, en bodega).
     Si existe, retorna marca y color.
     Si no existe, indica que es un nuevo producto.
+    Se resuelve con el catálogo en memoria, sin consultar la BD.
     """
     try:
-        with get_connection() as conn:
-            # Buscar primero en ventas_saldos_raw
-            query = """
-            SELECT DISTINCT 
-                c_barra,
-                d_marca,
-                d_color_proveedor AS color
-            FROM ventas_saldos_raw
-            WHERE c_barra = ?
-            LIMIT 1
-            """
-            df = pd.read_sql(query, conn, params=(codigo,))
-            
-            if not df.empty:
-                # Producto existe
-                producto = df.iloc[0]
-                return JSONResponse({
-                    "success": True,
-                    "existe": True,
-                    "c_barra": producto['c_barra'],
-                    "marca": producto['d_marca'],
-                    "color": producto['color'] if pd.notna(producto['color']) else 'SIN COLOR'
-                })
-            
-            # Si no está en ventas_saldos, buscar en inventario_bodega
-            query_bodega = """
-            SELECT DISTINCT 
-                c_barra,
-                d_marca,
-                d_color_proveedor AS color
-            FROM inventario_bodega_raw
-            WHERE c_barra = ?
-            LIMIT 1
-            """
-            df_bodega = pd.read_sql(query_bodega, conn, params=(codigo,))
-            
-            if not df_bodega.empty:
-                # Producto existe en bodega
-                producto = df_bodega.iloc[0]
-                return JSONResponse({
-                    "success": True,
-                    "existe": True,
-                    "c_barra": producto['c_barra'],
-                    "marca": producto['d_marca'],
-                    "color": producto['color'] if pd.notna(producto['color']) else 'SIN COLOR'
-                })
-            
+        producto = get_catalogo_productos().get(codigo)
+        if producto is not None:
+            return JSONResponse({
+                "success": True,
+                "existe": True,
+                "c_barra": codigo,
+                "marca": producto.marca,
+                "color": producto.color if producto.color is not None else 'SIN COLOR'
+            })
+
         # Producto no existe - es nuevo
         return JSONResponse({
             "success": True,
@@ -1022,6 +1134,39 @@ async def validar_codigo_lanzamiento(codigo: str):
             "error": str(e)
         }, status_code=500) 
 
+@app.post("/validar-codigos-lanzamiento")
+async def validar_codigos_lanzamiento(params: ValidarCodigosParams):
+    """
+    Validación por lote de códigos de lanzamiento: la lista completa se
+    resuelve de una vez contra el catálogo en memoria.
+    Retorna los existentes con marca y color, y los nuevos (sin repetidos,
+    en el orden recibido).
+    """
+    try:
+        codigos = list(dict.fromkeys(c.strip() for c in params.codigos if c.strip()))
+        existentes, nuevos = get_catalogo_productos().resolver(codigos)
+
+        return JSONResponse({
+            "success": True,
+            "total": len(codigos),
+            "existentes": [
+                {
+                    "c_barra": codigo,
+                    "marca": producto.marca,
+                    "color": producto.color if producto.color is not None else 'SIN COLOR'
+                }
+                for codigo, producto in existentes
+            ],
+            "nuevos": nuevos
+        })
+
+    except Exception as e:
+        logging.error(f"Error al validar códigos: {e}")
+        return JSONResponse({
+            "success": False,
+            "error": str(e)
+        }, status_code=500)
+
 # ===== CONSULTA DE PRODUCTO =====
 @app.get("/consulta-producto")
 async def consultar_producto(codigo_barras: str):
@@ -1044,30 +1189,39 @@ async def consultar_producto(codigo_barras: str):
         logging.error(f"Error en consulta de producto: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/consulta-productos")
+def consultar_productos(params: ConsultaProductosParams):
+    """
+    Consulta por lote (auditorías de inventario): la misma ficha de
+    /consulta-producto para cada código, resuelta con consultas por conjunto.
+    """
+    try:
+        codigos = [c.strip() for c in params.codigos if c.strip()]
+        fichas = get_consulta_productos(codigos)
+        encontrados = sum(1 for f in fichas.values() if f.get("encontrado"))
+
+        return JSONResponse({
+            "success": True,
+            "total": len(fichas),
+            "encontrados": encontrados,
+            "datos": fichas
+        })
+
+    except Exception as e:
+        logging.error(f"Error en consulta de productos por lote: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # ===== BÚSQUEDA POR TÉRMINO =====
 @app.get("/buscar-producto/{termino}")
 async def buscar_producto(termino: str):
     """
-    Busca productos que coincidan con el término (código o marca).
+    Busca productos que coincidan con el término (código, marca, color o
+    descripción), con el código exacto y los prefijos de código primero.
     Útil para autocompletado.
     """
     try:
-        with get_connection() as conn:
-        
-            query = """
-            SELECT DISTINCT 
-                c_barra,
-                d_marca,
-                d_color_proveedor as color
-            FROM ventas_saldos_raw
-            WHERE c_barra LIKE ? OR d_marca LIKE ?
-            LIMIT 20
-            """
-            
-            termino_busqueda = f"%{termino}%"
-            df = pd.read_sql(query, conn, params=(termino_busqueda, termino_busqueda))
-            
-            resultados = df.to_dict(orient='records')
+        df = buscar_productos(termino, limite=20)
+        resultados = df.to_dict(orient='records')
         
         return JSONResponse({
             "success": True,
@@ -1079,20 +1233,45 @@ async def buscar_producto(termino: str):
         logging.error(f"Error en búsqueda de producto: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     
+# ===== DESCARGAS POR STREAMING =====
+
+def _respuesta_stream(contenido, formato, nombre):
+    """StreamingResponse NDJSON o CSV; el CSV se descarga como archivo."""
+    headers = {}
+    if formato == "csv":
+        headers["Content-Disposition"] = f'attachment; filename="{nombre}.csv"'
+    return StreamingResponse(contenido, media_type=FORMATOS_STREAM[formato], headers=headers)
+
+@app.get("/reportes/existencias/stream")
+async def stream_existencias(formato: Literal["ndjson", "csv"] = "ndjson"):
+    """Existencias por tienda completas, enviadas por lotes a medida que se leen."""
+    return _respuesta_stream(stream_existencias_por_tienda(formato), formato, "existencias")
+
+@app.get("/reportes/movimiento/stream")
+async def stream_movimiento_productos(dias: int = 30, formato: Literal["ndjson", "csv"] = "ndjson"):
+    """Movimiento por producto y tienda, enviado por lotes a medida que se lee."""
+    return _respuesta_stream(stream_movimiento(dias, formato), formato, f"movimiento_{dias}d")
+
 # ===== REPORTES CON FILTROS =====
 
 @app.post("/reportes/existencias-preview")
 async def preview_existencias(params: ExistenciasParams):
     try:
         with get_connection() as conn:
-                query = """
+                query = f"""
                 SELECT 
                     COALESCE(ct.clean_name, s.d_almacen) AS tienda,
                     ct.region,
                     s.c_barra,
                     s.d_marca,
                     s.d_color_proveedor AS color,
-                    s.saldo_disponible AS stock_actual
+                    s.saldo_disponible AS stock_actual,
+                    COALESCE(ct.region, '') AS k_region,
+                    COALESCE(ct.clean_name, s.d_almacen, '') AS k_tienda,
+                    COALESCE(s.d_marca, '') AS k_marca,
+                    COALESCE(s.c_barra, '') AS k_barra,
+                    COALESCE(s.d_almacen, '') AS k_almacen,
+                    {row_id("s")} AS k_fila
                 FROM ventas_saldos_raw s
                 LEFT JOIN config_tiendas ct ON s.d_almacen = ct.raw_name
                 WHERE s.saldo_disponible BETWEEN ? AND ?
@@ -1112,16 +1291,28 @@ async def preview_existencias(params: ExistenciasParams):
                     query += " AND ct.region LIKE ?"
                     params_list.append(f"%{params.region}%")
                 
+                if params.paginacion:
+                    clave = ("existencias", params.stock_min, params.stock_max,
+                             params.tienda, params.marca, params.region)
+                    pagina = _preview_paginado(
+                        conn, query, params_list, ORDEN_EXISTENCIAS, params.paginacion, clave
+                    )
+                    if pagina["total"] == 0:
+                        return JSONResponse({"success": False, "message": "No hay datos con los filtros aplicados"})
+                    return JSONResponse(pagina)
+                
                 query += " ORDER BY ct.region, tienda, s.d_marca, s.c_barra"
                 
-                df = pd.read_sql(query, conn, params=params_list)
+                df = pd.read_sql(query, conn, params=tuple(params_list))
                 
                 if df.empty:
                     return JSONResponse({"success": False, "message": "No hay datos con los filtros aplicados"})
                 
-                datos = df.to_dict(orient='records')
+                datos = df.drop(columns=ORDEN_EXISTENCIAS).to_dict(orient='records')
         return JSONResponse({"success": True, "total": len(datos), "datos": datos})
             
+    except InvalidDataError:
+        raise
     except Exception as e:
         logging.error(f"Error en preview existencias: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1201,7 +1392,12 @@ async def preview_faltantes(params: FaltantesParams):
                     s.c_barra,
                     s.d_marca,
                     s.d_color_proveedor AS color,
-                    s.saldo_disponible AS stock_actual
+                    s.saldo_disponible AS stock_actual,
+                    COALESCE(t.region, '') AS k_region,
+                    t.clean_name AS k_tienda,
+                    COALESCE(s.d_marca, '') AS k_marca,
+                    COALESCE(s.c_barra, '') AS k_barra,
+                    COALESCE(s.d_color_proveedor, '') AS k_color
                 FROM ventas_saldos_raw s
                 JOIN tiendas_activas t ON s.d_almacen = t.raw_name
                 LEFT JOIN productos_con_venta p ON s.c_barra = p.c_barra
@@ -1225,16 +1421,28 @@ async def preview_faltantes(params: FaltantesParams):
                     query += " AND s.d_marca LIKE ?"
                     params_list.append(f"%{params.marca}%")
                 
+                if params.paginacion:
+                    clave = ("faltantes", params.dias_sin_venta, params.region,
+                             params.tienda, params.marca, date.today())
+                    pagina = _preview_paginado(
+                        conn, query, params_list, ORDEN_FALTANTES, params.paginacion, clave
+                    )
+                    if pagina["total"] == 0:
+                        return JSONResponse({"success": False, "message": "No hay faltantes con los filtros aplicados"})
+                    return JSONResponse(pagina)
+                
                 query += " ORDER BY t.region, tienda, s.d_marca, s.c_barra"
                 
-                df = pd.read_sql(query, conn, params=params_list)
+                df = pd.read_sql(query, conn, params=tuple(params_list))
                 
                 if df.empty:
                     return JSONResponse({"success": False, "message": "No hay faltantes con los filtros aplicados"})
                 
-                datos = df.to_dict(orient='records')
+                datos = df.drop(columns=ORDEN_FALTANTES).to_dict(orient='records')
         return JSONResponse({"success": True, "total": len(datos), "datos": datos})
             
+    except InvalidDataError:
+        raise
     except Exception as e:
         logging.error(f"Error en preview faltantes: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1302,17 +1510,77 @@ async def generar_faltantes(params: FaltantesParams):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/analisis-marca/{marca}")
-async def analisis_marca_completo(marca: str):
+async def analisis_marca_completo(marca: str, aproximada: bool = False):
     """
     Endpoint para análisis completo de una marca.
+    aproximada=true busca también marcas que contengan el texto.
     """
     try:
-        resultado = get_analisis_marca(marca)
+        resultado = get_analisis_marca(marca, aproximada=aproximada)
         return JSONResponse({"success": True, "datos": resultado})
+    except BaseAppException:
+        raise
     except Exception as e:
         logging.error(f"Error en análisis de marca: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/analisis-marcas")
+def analisis_todas_las_marcas(top_n: int = Query(10, ge=1, le=100)):
+    """
+    Análisis de todas las marcas en una pasada: resumen por marca, top N de
+    cada una y cobertura marca × tienda.
+    """
+    try:
+        tablas = get_analisis_todas_marcas(top_n)
+        return JSONResponse({
+            "success": True,
+            "total_marcas": len(tablas["marcas"]),
+            "datos": {
+                nombre: df.to_dict(orient="records") for nombre, df in tablas.items()
+            }
+        })
+    except BaseAppException:
+        raise
+    except Exception as e:
+        logging.error(f"Error en análisis de todas las marcas: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/analisis-marcas/exportar")
+def exportar_analisis_todas_las_marcas(
+    top_n: int = Query(10, ge=1, le=100),
+    formato: Literal["xlsx", "parquet"] = "xlsx"
+):
+    """
+    Descarga el análisis de todas las marcas: un libro Excel con una hoja
+    por tabla, o un zip con un Parquet por tabla (requiere pyarrow).
+    """
+    if formato == "parquet" and not parquet_disponible():
+        raise HTTPException(status_code=400, detail="La exportación Parquet requiere pyarrow instalado")
+
+    try:
+        tablas = get_analisis_todas_marcas(top_n)
+        if tablas["marcas"].empty:
+            raise HTTPException(status_code=404, detail="No hay marcas para analizar")
+
+        if formato == "parquet":
+            archivo = "analisis_marcas.zip"
+            exportar_parquet_zip(tablas, archivo)
+            return FileResponse(archivo, media_type="application/zip", filename=archivo)
+
+        archivo = "analisis_marcas.xlsx"
+        hojas = {
+            "Marcas": tablas["marcas"],
+            f"Top {top_n}": tablas["productos"],
+            "Tiendas": tablas["tiendas"],
+        }
+        exportar_hojas_excel(hojas, archivo, f"Análisis de marcas - Top {top_n}")
+        return FileResponse(archivo, media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", filename=archivo)
+    except (HTTPException, BaseAppException):
+        raise
+    except Exception as e:
+        logging.error(f"Error al exportar análisis de marcas: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # ---------------------- MAIN ----------------------
 if __name__ == "__main__":
     import uvicorn
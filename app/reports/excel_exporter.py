@@ -1,100 +1,246 @@
 # excel_exporter.py
 
+import io
+import re
+import zipfile
+
 import pandas as pd
 
-from openpyxl import load_workbook
-from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, Border, Side, PatternFill, NamedStyle
 from openpyxl.utils import get_column_letter
 from openpyxl.worksheet.page import PageMargins
 
+from app.utils.procesos import mapear_en_procesos
+
 # ======================================================
-# 🔧 EXPORTADOR EXCEL FORMATEADO
+# 🎨 ESTILOS COMPARTIDOS
 # ======================================================
 
-def exportar_excel_formateado(df, archivo, nombre_reporte="Reporte"):
-    """Crea un Excel con una hoja por tienda, con formato visual profesional."""
+ESTILO_ENCABEZADO = "jagi_encabezado"
+ESTILO_CUERPO = "jagi_cuerpo"
+ESTILO_ALTERNO = "jagi_cuerpo_alterno"
+
+FORMATO_FECHA = "YYYY-MM-DD HH:MM:SS"
+
+# Con menos tiendas el costo de enviar los datos al pool no compensa
+MIN_TIENDAS_PARALELO = 4
+
+# Filas usadas para estimar los anchos de columna en hojas grandes
+MUESTRA_ANCHOS = 5000
+
+
+def _registrar_estilos(wb):
+    """Estilos con nombre del libro: cada celda los referencia, no se copian."""
+    thin = Side(border_style="thin", color="000000")
+    borde = Border(top=thin, left=thin, right=thin, bottom=thin)
+    cuerpo = Alignment(vertical="center", wrap_text=False)
+
+    wb.add_named_style(NamedStyle(
+        name=ESTILO_ENCABEZADO,
+        font=Font(bold=True, color="000000"),
+        alignment=Alignment(horizontal="center", vertical="center", wrap_text=True),
+        border=borde,
+        fill=PatternFill(start_color="CCE5FF", end_color="CCE5FF", fill_type="solid"),
+    ))
+    wb.add_named_style(NamedStyle(name=ESTILO_CUERPO, alignment=cuerpo, border=borde))
+    wb.add_named_style(NamedStyle(
+        name=ESTILO_ALTERNO,
+        alignment=cuerpo,
+        border=borde,
+        fill=PatternFill(start_color="F9F9F9", end_color="F9F9F9", fill_type="solid"),
+    ))
+
+
+def _nuevo_libro():
+    """Libro en modo streaming (write_only): las filas van al archivo a medida que se agregan."""
+    wb = Workbook(write_only=True)
+    _registrar_estilos(wb)
+    return wb
+
+# ======================================================
+# 📄 ESCRITURA DE HOJAS
+# ======================================================
+
+def _anchos_columnas(df):
+    """
+    Ancho de cada columna ({columna: ancho}) según el texto más largo
+    entre el encabezado y los valores no vacíos.
+
+    Las longitudes se calculan por columna sobre la Serie completa; en hojas
+    de más de MUESTRA_ANCHOS filas se usa una muestra fija.
+    """
+    if len(df) > MUESTRA_ANCHOS:
+        df = df.sample(MUESTRA_ANCHOS, random_state=0)
+
+    anchos = {}
+    for columna in df.columns:
+        valores = df[columna].dropna()
+        largo = valores.astype(str).str.len().max() if len(valores) else 0
+        anchos[columna] = (max(len(str(columna)), largo) + 2) * 1.1
+    return anchos
+
+
+def _configurar_hoja(ws, df, nombre_reporte):
+    """Anchos, encabezado fijo e impresión; en write_only va antes de las filas."""
+    anchos = _anchos_columnas(df)
+    for col_idx, columna in enumerate(df.columns, start=1):
+        ws.column_dimensions[get_column_letter(col_idx)].width = anchos[columna]
+    ws.row_dimensions[1].height = 40
+    ws.freeze_panes = "A2"
+
+    # --- Configuración de impresión ---
+    ws.page_setup.orientation = "landscape"
+    ws.page_setup.fitToWidth = 1
+    ws.page_setup.fitToHeight = 0
+    ws.print_options.horizontalCentered = True
+    ws.page_margins = PageMargins(left=0.25, right=0.25, top=0.5, bottom=0.5)
+
+    # --- Encabezado / pie ---
+    ws.oddHeader.left.text = f"JAGI - {nombre_reporte}"
+    ws.oddHeader.right.text = "&P de &N"
+    ws.oddFooter.center.text = "Generado automáticamente"
+
+
+def _celda(ws, valor, estilo, formato=None):
+    cell = WriteOnlyCell(ws, value=valor)
+    cell.style = estilo
+    if formato:
+        cell.number_format = formato
+    return cell
+
+
+def _escribir_hoja(wb, titulo, df, nombre_reporte):
+    """Escribe df como una hoja formateada, fila por fila, en una sola pasada."""
+    ws = wb.create_sheet(title=titulo)
+    _configurar_hoja(ws, df, nombre_reporte)
+
+    formatos = [
+        FORMATO_FECHA if pd.api.types.is_datetime64_any_dtype(df[c]) else None
+        for c in df.columns
+    ]
+    # NaN/NaT como celdas vacías (igual que pandas.to_excel)
+    valores = df.astype(object).where(df.notna(), None)
+
+    ws.append([_celda(ws, columna, ESTILO_ENCABEZADO) for columna in df.columns])
+    for i, fila in enumerate(valores.itertuples(index=False, name=None), start=2):
+        estilo = ESTILO_ALTERNO if i % 2 == 0 else ESTILO_CUERPO
+        ws.append([_celda(ws, v, estilo, f) for v, f in zip(fila, formatos)])
+
+# ======================================================
+# 🔧 EXPORTADOR EXCEL FORMATEADO
+# ======================================================
 
+def _columna_tienda(df):
+    """Columna de tienda según el tipo de reporte; valida que haya datos."""
     if df.empty:
         raise ValueError("El DataFrame está vacío, no se puede exportar.")
 
     # 🔍 Detectar columna de tienda según el tipo de reporte
     if "tienda" in df.columns:
-        col_tienda = "tienda"
-    elif "tienda_origen" in df.columns:
-        col_tienda = "tienda_origen"
-    elif "tienda_destino" in df.columns:
-        col_tienda = "tienda_destino"
-    else:
-        raise KeyError(
-            f"No se encontró ninguna columna de tienda en el DataFrame.\n"
-            f"Columnas disponibles: {list(df.columns)}"
-        )
-
-    # --- Crear archivo base ---
-    with pd.ExcelWriter(archivo, engine="openpyxl") as writer:
-        for tienda, df_tienda in df.groupby(col_tienda, sort=True):
-            hoja = tienda[:25] if isinstance(tienda, str) else str(tienda)
-            df_tienda.to_excel(writer, sheet_name=hoja, index=False)
-
-    wb = load_workbook(archivo)
-    thin = Side(border_style="thin", color="000000")
+        return "tienda"
+    if "tienda_origen" in df.columns:
+        return "tienda_origen"
+    if "tienda_destino" in df.columns:
+        return "tienda_destino"
+    raise KeyError(
+        f"No se encontró ninguna columna de tienda en el DataFrame.\n"
+        f"Columnas disponibles: {list(df.columns)}"
+    )
+
+
+def _nombre_hoja(tienda):
+    """Nombre de hoja válido para Excel (sin []:*?/\\)."""
+    nombre = tienda[:25] if isinstance(tienda, str) else str(tienda)
+    return re.sub(r"[\[\]:*?/\\]", "_", nombre)
+
+
+def exportar_excel_formateado(df, archivo, nombre_reporte="Reporte"):
+    """Crea un Excel con una hoja por tienda, con formato visual profesional."""
+
+    col_tienda = _columna_tienda(df)
+    wb = _nuevo_libro()
+    for tienda, df_tienda in df.groupby(col_tienda, sort=True):
+        _escribir_hoja(wb, _nombre_hoja(tienda), df_tienda, nombre_reporte)
 
-    # 🎨 Colores de estilo
-    header_fill = PatternFill(start_color="CCE5FF", end_color="CCE5FF", fill_type="solid")
-    alt_fill = PatternFill(start_color="F9F9F9", end_color="F9F9F9", fill_type="solid")
-
-    for ws in wb.worksheets:
-        ws.row_dimensions[1].height = 40
-        for cell in ws[1]:
-            cell.font = Font(bold=True, color="000000")
-            cell.alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-            cell.border = Border(top=thin, left=thin, right=thin, bottom=thin)
-            cell.fill = header_fill
-
-        # --- Ajuste de anchos ---
-        for col_idx in range(1, ws.max_column + 1):
-            col_letter = get_column_letter(col_idx)
-            if col_letter in ["E", "F", "G", "H"]:
-                if col_letter == "E":
-                    ws.column_dimensions[col_letter].width = 56 / 7
-                elif col_letter == "F":
-                    ws.column_dimensions[col_letter].width = 46 / 7
-                elif col_letter == "G":
-                    ws.column_dimensions[col_letter].width = 94 / 7
-                elif col_letter == "H":
-                    ws.column_dimensions[col_letter].width = 81 / 7
-            else:
-                max_length = 0
-                for cell in ws[get_column_letter(col_idx)]:
-                    if cell.value:
-                        max_length = max(max_length, len(str(cell.value)))
-                ws.column_dimensions[col_letter].width = (max_length + 2) * 1.1
-
-        # --- Bordes, alineación y alternancia de color ---
-        for i, row in enumerate(ws.iter_rows(min_row=2, max_row=ws.max_row, max_col=ws.max_column), start=2):
-            fill = alt_fill if i % 2 == 0 else None
-            for cell in row:
-                cell.border = Border(top=thin, left=thin, right=thin, bottom=thin)
-                cell.alignment = Alignment(vertical="center", wrap_text=False)
-                if fill:
-                    cell.fill = fill
-
-        ws.freeze_panes = "A2"
-
-        # --- Configuración de impresión ---
-        ws.page_setup.orientation = ws.ORIENTATION_LANDSCAPE
-        ws.page_setup.fitToWidth = 1
-        ws.page_setup.fitToHeight = 0
-        ws.print_options.horizontalCentered = True
-        ws.page_margins = PageMargins(left=0.25, right=0.25, top=0.5, bottom=0.5)
-
-        # --- Encabezado / pie ---
-        try:
-            ws.HeaderFooter.left_header.text = f"&LJAGI - {nombre_reporte}"
-            ws.HeaderFooter.right_header.text = "&R&P de &N"
-            ws.HeaderFooter.center_footer.text = "&CGenerado automáticamente"
-        except AttributeError:
-            pass
+    wb.save(archivo)
+    print(f"\n🖨️ Archivo listo y formateado: {archivo}")
+
+
+def exportar_hojas_excel(hojas, archivo, nombre_reporte="Reporte"):
+    """
+    Crea un Excel con una hoja por cada DataFrame de hojas ({nombre: df}),
+    con el mismo formato de exportar_excel_formateado.
+    """
+    wb = _nuevo_libro()
+    for nombre, df in hojas.items():
+        _escribir_hoja(wb, nombre[:31], df, nombre_reporte)
 
     wb.save(archivo)
-    print(f"\n🖨️ Archivo listo y formateado: {archivo}")
\ No newline at end of file
+    print(f"\n🖨️ Archivo listo y formateado: {archivo}")
+
+
+# ======================================================
+# 📦 UN LIBRO POR TIENDA (PARALELO)
+# ======================================================
+
+def _nombre_archivo(tienda):
+    return re.sub(r"[^\w\- ]", "_", str(tienda)).strip() or "SIN_TIENDA"
+
+
+def _nombres_archivo(tiendas):
+    """
+    Nombre de archivo de cada tienda, único dentro del zip: si dos tiendas
+    quedan con el mismo nombre ("A/B" y "A:B"), la segunda lleva sufijo _2.
+    """
+    usados, nombres = set(), []
+    for tienda in tiendas:
+        base = _nombre_archivo(tienda)
+        nombre, n = base, 1
+        # Sin distinguir mayúsculas: al extraer en Windows también chocarían
+        while nombre.lower() in usados:
+            n += 1
+            nombre = f"{base}_{n}"
+        usados.add(nombre.lower())
+        nombres.append(f"{nombre}.xlsx")
+    return nombres
+
+
+def _libro_tienda(tienda, df_tienda, nombre_reporte):
+    """Libro de una sola tienda, como bytes (se ejecuta en el pool)."""
+    wb = _nuevo_libro()
+    _escribir_hoja(wb, _nombre_hoja(tienda), df_tienda, nombre_reporte)
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def exportar_excel_por_tienda_zip(df, archivo, nombre_reporte="Reporte", max_workers=None):
+    """
+    Crea un zip con un libro Excel por tienda (mismo formato de
+    exportar_excel_formateado).
+
+    Los libros se generan en el pool de procesos compartido, las tiendas más
+    grandes primero; con menos de MIN_TIENDAS_PARALELO tiendas o
+    max_workers=1 se generan en el proceso actual.
+    """
+    col_tienda = _columna_tienda(df)
+    # Tiendas más grandes primero para balancear la carga
+    grupos = sorted(df.groupby(col_tienda, sort=True), key=lambda g: len(g[1]), reverse=True)
+    tiendas = [tienda for tienda, _ in grupos]
+    partes = [df_tienda for _, df_tienda in grupos]
+    titulos = [nombre_reporte] * len(tiendas)
+
+    if len(tiendas) < MIN_TIENDAS_PARALELO or max_workers == 1:
+        libros = list(map(_libro_tienda, tiendas, partes, titulos))
+    else:
+        libros = mapear_en_procesos(_libro_tienda, tiendas, partes, titulos, max_workers=max_workers)
+
+    # xlsx ya va comprimido: el zip solo agrupa, en orden de tienda
+    with zipfile.ZipFile(archivo, "w", zipfile.ZIP_STORED) as zf:
+        ordenados = sorted(zip(tiendas, libros), key=lambda t: str(t[0]))
+        nombres = _nombres_archivo(tienda for tienda, _ in ordenados)
+        for nombre, (_, libro) in zip(nombres, ordenados):
+            zf.writestr(nombre, libro)
+    print(f"\n📦 {len(tiendas)} libros por tienda listos: {archivo}")
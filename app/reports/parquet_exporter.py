@@ -0,0 +1,21 @@
+# parquet_exporter.py
+
+import importlib.util
+import io
+import zipfile
+
+
+def parquet_disponible():
+    """Parquet necesita pyarrow (dependencia opcional)."""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def exportar_parquet_zip(tablas, archivo):
+    """Crea un zip con un archivo .parquet por cada DataFrame de tablas ({nombre: df})."""
+    # Parquet ya va comprimido: el zip solo agrupa
+    with zipfile.ZipFile(archivo, "w", zipfile.ZIP_STORED) as zf:
+        for nombre, df in tablas.items():
+            buffer = io.BytesIO()
+            df.to_parquet(buffer, index=False)
+            zf.writestr(f"{nombre}.parquet", buffer.getvalue())
+    print(f"\n📦 Archivo Parquet listo: {archivo}")
@@ -3,4 +3,6 @@ from .movimiento_repository import *
 from .faltantes_repository import *
 from .existencias_repository import *
 from .reabastecimiento_repository import *
-from .redistribucion_repository import *
\ No newline at end of file
+from .redistribucion_repository import *
+from .presencia_repository import *
+from .busqueda_repository import *
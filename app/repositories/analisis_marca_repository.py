@@ -1,49 +1,209 @@
 # analisis_marca_repository.py
 
 import pandas as pd
+from sqlalchemy import bindparam, inspect, text
 
-def get_top10_marca(conn, marca_norm):
-    query = """
-    SELECT 
-        s.c_barra,
-        s.d_marca,
-        s.d_color_proveedor AS color,
-        SUM(h.cn_venta) AS ventas_30d
-    FROM ventas_saldos_raw s
-    INNER JOIN ventas_historico_raw h ON s.c_barra = h.c_barra
-    WHERE UPPER(s.d_marca) LIKE ?
-      AND DATE(substr(h.f_sistema,7,4)||'-'||substr(h.f_sistema,4,2)||'-'||substr(h.f_sistema,1,2)) >= DATE('now', '-30 days')
-    GROUP BY s.c_barra, s.d_marca, s.d_color_proveedor
-    ORDER BY ventas_30d DESC
-    LIMIT 10
+from app.database import date_format_convert, date_subtract_days
+
+
+# Modos de búsqueda de la marca sobre marca_key, de más a menos estricto.
+# "contiene" es la búsqueda aproximada: solo se usa si se pide.
+MODOS_MARCA = ("exacta", "prefijo", "contiene")
+
+
+def _filtro_marca(modo, columna):
+    """Condición SQL sobre marca_key para el modo; usa :clave / :clave_fin / :contiene."""
+    if modo == "exacta":
+        return f"{columna} = :clave"
+    if modo == "prefijo":
+        return f"{columna} >= :clave AND {columna} < :clave_fin"
+    if modo == "contiene":
+        return f"{columna} LIKE :contiene"
+    raise ValueError(f"Modo de búsqueda de marca inválido: {modo}")
+
+
+def _params_marca(clave):
+    return {
+        "clave": clave,
+        "clave_fin": clave + "\uffff",
+        "contiene": f"%{clave}%",
+    }
+
+# ==========================================
+# CLAVE DE MARCA (marca_key)
+# ==========================================
+
+def tiene_clave_marca(conn):
+    columnas = inspect(conn).get_columns("ventas_saldos_raw")
+    return any(c["name"] == "marca_key" for c in columnas)
+
+def fetch_map_marcas(conn):
+    if not inspect(conn).has_table("map_marcas"):
+        return pd.DataFrame(columns=["raw_name", "clean_name"])
+    return pd.read_sql(text("SELECT raw_name, clean_name FROM map_marcas"), conn)
+
+def fetch_marcas_saldos(conn):
+    query = text("SELECT DISTINCT d_marca FROM ventas_saldos_raw WHERE d_marca IS NOT NULL")
+    return pd.read_sql(query, conn)
+
+def crear_clave_marca(conn, claves):
     """
-    return pd.read_sql(query, conn, params=(f"%{marca_norm}%",))
-
-def get_productos_marca_sin_ventas(conn, marca_norm):
-    query = """
-    SELECT DISTINCT
-        c_barra,
-        d_marca,
-        d_color_proveedor AS color,
-        0 AS ventas_30d
-    FROM ventas_saldos_raw
-    WHERE UPPER(d_marca) LIKE ?
-    LIMIT 10
+    Agrega (o actualiza) marca_key en ventas_saldos_raw con su índice.
+
+    claves: dict d_marca -> clave normalizada. Se sube como tabla temporal
+    y se aplica con un solo UPDATE.
+    """
+    if not tiene_clave_marca(conn):
+        conn.execute(text("ALTER TABLE ventas_saldos_raw ADD COLUMN marca_key TEXT"))
+    # Una carga fallida anterior pudo dejar la tabla en la conexión
+    conn.execute(text("DROP TABLE IF EXISTS tmp_marca_key"))
+    conn.execute(text(
+        "CREATE TEMPORARY TABLE tmp_marca_key (d_marca TEXT PRIMARY KEY, marca_key TEXT)"
+    ))
+    try:
+        if claves:
+            conn.execute(
+                text("INSERT INTO tmp_marca_key (d_marca, marca_key) VALUES (:d_marca, :marca_key)"),
+                [{"d_marca": m, "marca_key": k} for m, k in claves.items()],
+            )
+        conn.execute(text("""
+            UPDATE ventas_saldos_raw
+            SET marca_key = (
+                SELECT t.marca_key FROM tmp_marca_key t
+                WHERE t.d_marca = ventas_saldos_raw.d_marca
+            )
+        """))
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute(text("DROP TABLE IF EXISTS tmp_marca_key"))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS idx_ventas_saldos_raw_marca_key "
+        "ON ventas_saldos_raw (marca_key)"
+    ))
+    conn.commit()
+
+# ==========================================
+# CONSULTAS DEL ANÁLISIS
+# ==========================================
+
+def get_top_todas_marcas(conn, top_n=10):
     """
-    return pd.read_sql(query, conn, params=(f"%{marca_norm}%",))
+    Top N de cada marca (por marca_key) en una sola pasada.
+
+    El histórico de 30 días se agrega una vez por código; ROW_NUMBER arma
+    el ranking por marca. Igual que get_top10_marca, cuenta solo productos
+    con ventas; una marca sin ventas trae sus productos con ventas_30d = 0.
+    """
+    fecha = date_format_convert("h.f_sistema")
+    query = text(f"""
+    WITH ventas AS (
+        SELECT h.c_barra, SUM(h.cn_venta) AS ventas
+        FROM ventas_historico_raw h
+        WHERE {fecha} >= {date_subtract_days(30)}
+        GROUP BY h.c_barra
+    ),
+    productos AS (
+        SELECT
+            s.marca_key,
+            s.c_barra,
+            s.d_marca,
+            s.d_color_proveedor AS color,
+            MAX(CASE WHEN v.c_barra IS NULL THEN 0 ELSE 1 END) AS con_ventas,
+            COALESCE(SUM(v.ventas), 0) AS ventas_30d
+        FROM ventas_saldos_raw s
+        LEFT JOIN ventas v ON v.c_barra = s.c_barra
+        WHERE s.marca_key IS NOT NULL
+        GROUP BY s.marca_key, s.c_barra, s.d_marca, s.d_color_proveedor
+    ),
+    candidatos AS (
+        SELECT
+            p.*,
+            MAX(con_ventas) OVER (PARTITION BY marca_key) AS marca_con_ventas
+        FROM productos p
+    ),
+    ranking AS (
+        SELECT
+            c.*,
+            ROW_NUMBER() OVER (
+                PARTITION BY marca_key ORDER BY ventas_30d DESC, c_barra
+            ) AS puesto
+        FROM candidatos c
+        WHERE con_ventas = marca_con_ventas
+    )
+    SELECT marca_key, puesto, c_barra, d_marca, color, ventas_30d, con_ventas
+    FROM ranking
+    WHERE puesto <= :top_n
+    ORDER BY marca_key, puesto
+    """)
+    return pd.read_sql(query, conn, params={"top_n": top_n})
 
 def get_tiendas_configuradas(conn):
-    query = """
+    query = text("""
     SELECT raw_name, clean_name, region
     FROM config_tiendas
     WHERE clean_name NOT LIKE '%BODEGA%'
-    """
+    """)
     return pd.read_sql(query, conn)
 
-def get_stock_por_barra(conn, barra):
-    query = """
-    SELECT d_almacen, saldo_disponible
+def get_stock_por_barras(conn, barras):
+    """Stock disponible total (saldos) de cada código, en una sola consulta."""
+    barras = list(barras)
+    if not barras:
+        return pd.DataFrame(columns=["c_barra", "stock_total"])
+    query = text("""
+    SELECT c_barra, SUM(saldo_disponible) AS stock_total
     FROM ventas_saldos_raw
-    WHERE c_barra = ?
+    WHERE c_barra IN :barras
+    GROUP BY c_barra
+    """).bindparams(bindparam("barras", expanding=True))
+    return pd.read_sql(query, conn, params={"barras": barras})
+
+# ==========================================
+# TOP PRECALCULADO POR MARCA (top_marcas)
+# ==========================================
+
+def fecha_top_marcas(conn):
+    """Fecha de cálculo de top_marcas, o None si la tabla no existe."""
+    if not inspect(conn).has_table("top_marcas"):
+        return None
+    fila = conn.execute(text("SELECT MAX(fecha_calculo) FROM top_marcas")).fetchone()
+    return fila[0]
+
+def crear_top_marcas(conn, df_top, fecha_calculo):
+    """Reemplaza top_marcas con df_top (salida de get_top_todas_marcas) y su índice."""
+    df_top.assign(fecha_calculo=fecha_calculo.isoformat()).to_sql(
+        "top_marcas", conn, if_exists="replace", index=False
+    )
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS idx_top_marcas_marca_key ON top_marcas (marca_key, puesto)"
+    ))
+    conn.commit()
+
+def get_top_marca(conn, clave, modo="exacta", limite=10):
+    """
+    Top de la marca leído de top_marcas. Con varias marcas (prefijo o
+    subcadena) toma los de más ventas entre todas; si alguna tiene ventas,
+    solo productos con ventas.
     """
-    return pd.read_sql(query, conn, params=(barra,))
\ No newline at end of file
+    filtro = _filtro_marca(modo, "marca_key")
+    query = text(f"""
+    SELECT c_barra, d_marca, color, ventas_30d
+    FROM top_marcas
+    WHERE {filtro}
+      AND con_ventas = (SELECT MAX(con_ventas) FROM top_marcas WHERE {filtro})
+    ORDER BY ventas_30d DESC, marca_key, puesto
+    LIMIT :limite
+    """)
+    return pd.read_sql(query, conn, params={**_params_marca(clave), "limite": limite})
+
+def get_top_marcas_precalculado(conn, top_n):
+    """Top N de todas las marcas leído de top_marcas (top_n <= N calculado)."""
+    query = text("""
+    SELECT marca_key, puesto, c_barra, d_marca, color, ventas_30d, con_ventas
+    FROM top_marcas
+    WHERE puesto <= :top_n
+    ORDER BY marca_key, puesto
+    """)
+    return pd.read_sql(query, conn, params={"top_n": top_n})
@@ -0,0 +1,153 @@
+# busqueda_repository.py
+
+import logging
+
+import pandas as pd
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import DBAPIError
+
+from app.database import DB_TYPE
+
+
+logger = logging.getLogger(__name__)
+
+TABLA_BUSQUEDA = "productos_busqueda"
+
+# Una fila por (código, marca, color) de saldos, con la descripción del producto
+_SQL_FUENTE_BUSQUEDA = """
+SELECT
+    c_barra,
+    d_marca,
+    d_color_proveedor AS color,
+    MAX(d_producto) AS d_producto
+FROM ventas_saldos_raw
+WHERE c_barra IS NOT NULL
+GROUP BY c_barra, d_marca, d_color_proveedor
+"""
+
+# Coincidencia exacta de código, luego prefijo de código, luego el resto
+_ORDEN_RELEVANCIA = """
+CASE
+    WHEN UPPER(c_barra) = UPPER(:termino) THEN 0
+    WHEN UPPER(c_barra) LIKE UPPER(:prefijo) ESCAPE '\\' THEN 1
+    ELSE 2
+END
+"""
+
+
+def _escapar_like(termino):
+    return termino.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _params_busqueda(termino, limite):
+    patron = _escapar_like(termino)
+    return {
+        "termino": termino,
+        "prefijo": f"{patron}%",
+        "contiene": f"%{patron}%",
+        "limite": limite,
+    }
+
+
+def crear_indice_busqueda(conn):
+    """
+    (Re)crea la tabla de búsqueda de productos desde saldos.
+
+    SQLite: tabla FTS5 con tokenizador trigram (subcadenas de 3+ caracteres).
+    PostgreSQL: tabla normal con índice GIN pg_trgm sobre el texto buscable.
+
+    La tabla se arma aparte y reemplaza a la anterior solo si se completó.
+    Retorna False si el motor no soporta el índice (sin FTS5/trigram, sin
+    permiso para crear pg_trgm, etc.); la tabla anterior, si había, queda
+    igual, y sin ninguna la búsqueda sigue con LIKE sobre saldos.
+    """
+    nueva = f"{TABLA_BUSQUEDA}_nueva"
+    try:
+        conn.execute(text(f"DROP TABLE IF EXISTS {nueva}"))
+        if DB_TYPE == "postgresql":
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            conn.execute(text(f"""
+                CREATE TABLE {nueva} AS
+                SELECT
+                    f.*,
+                    LOWER(CONCAT_WS(' ', f.c_barra, f.d_marca, f.color, f.d_producto)) AS texto
+                FROM ({_SQL_FUENTE_BUSQUEDA}) f
+            """))
+            conn.execute(text(
+                f"CREATE INDEX idx_{nueva}_texto ON {nueva} USING gin (texto gin_trgm_ops)"
+            ))
+        else:
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE {nueva} "
+                f"USING fts5(c_barra, d_marca, color, d_producto, tokenize = 'trigram')"
+            ))
+            conn.execute(text(f"""
+                INSERT INTO {nueva} (c_barra, d_marca, color, d_producto)
+                {_SQL_FUENTE_BUSQUEDA}
+            """))
+
+        conn.execute(text(f"DROP TABLE IF EXISTS {TABLA_BUSQUEDA}"))
+        conn.execute(text(f"ALTER TABLE {nueva} RENAME TO {TABLA_BUSQUEDA}"))
+        if DB_TYPE == "postgresql":
+            conn.execute(text(
+                f"ALTER INDEX idx_{nueva}_texto RENAME TO idx_{TABLA_BUSQUEDA}_texto"
+            ))
+    except DBAPIError as e:
+        logger.warning(f"⚠️ Índice de búsqueda no disponible en este motor: {e}")
+        conn.rollback()
+        # En SQLite la tabla virtual se crea fuera de la transacción
+        conn.execute(text(f"DROP TABLE IF EXISTS {nueva}"))
+        conn.commit()
+        return False
+
+    conn.commit()
+    return True
+
+
+def existe_indice_busqueda(conn):
+    return inspect(conn).has_table(TABLA_BUSQUEDA)
+
+
+def fetch_busqueda_indexada(conn, termino, limite):
+    """
+    Productos cuyo código, marca, color o descripción contienen el término,
+    usando el índice trigram. El término debe tener al menos 3 caracteres.
+    """
+    params = _params_busqueda(termino, limite)
+    if DB_TYPE == "postgresql":
+        params["contiene"] = params["contiene"].lower()
+        query = f"""
+        SELECT c_barra, d_marca, color
+        FROM {TABLA_BUSQUEDA}
+        WHERE texto LIKE :contiene ESCAPE '\\'
+        ORDER BY {_ORDEN_RELEVANCIA}, similarity(texto, LOWER(:termino)) DESC, c_barra
+        LIMIT :limite
+        """
+    else:
+        # Frase entre comillas: el trigram la busca como subcadena en todas las columnas
+        params["frase"] = '"' + termino.replace('"', '""') + '"'
+        query = f"""
+        SELECT c_barra, d_marca, color
+        FROM {TABLA_BUSQUEDA}
+        WHERE {TABLA_BUSQUEDA} MATCH :frase
+        ORDER BY {_ORDEN_RELEVANCIA}, rank, c_barra
+        LIMIT :limite
+        """
+    return pd.read_sql(text(query), conn, params=params)
+
+
+def fetch_busqueda_like(conn, termino, limite):
+    """Búsqueda sin índice (código o marca con LIKE sobre saldos), mismo orden."""
+    query = f"""
+    SELECT
+        c_barra,
+        d_marca,
+        d_color_proveedor AS color
+    FROM ventas_saldos_raw
+    WHERE c_barra LIKE :contiene ESCAPE '\\'
+       OR d_marca LIKE :contiene ESCAPE '\\'
+    GROUP BY c_barra, d_marca, d_color_proveedor
+    ORDER BY {_ORDEN_RELEVANCIA}, c_barra
+    LIMIT :limite
+    """
+    return pd.read_sql(text(query), conn, params=_params_busqueda(termino, limite))
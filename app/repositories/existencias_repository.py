@@ -4,8 +4,7 @@ import pandas as pd
 from app.database import get_connection
 
 
-def fetch_existencias_por_tienda():
-    query = """
+_SQL_EXISTENCIAS_POR_TIENDA = """
     SELECT 
         t.clean_name AS tienda,
         s.c_barra,
@@ -16,7 +15,16 @@ def fetch_existencias_por_tienda():
         t.fija
     FROM ventas_saldos_raw s
     LEFT JOIN config_tiendas t ON s.d_almacen = t.raw_name
-    ORDER BY t.clean_name, s.d_marca;
+    ORDER BY t.clean_name, s.d_marca
     """
+
+
+def fetch_existencias_por_tienda():
     with get_connection() as conn:
-        return pd.read_sql(query, conn)
\ No newline at end of file
+        return pd.read_sql(_SQL_EXISTENCIAS_POR_TIENDA, conn)
+
+
+def iter_existencias_por_tienda(conn, chunksize):
+    """Existencias por tienda en lotes de chunksize filas, leídos del cursor."""
+    conn = conn.execution_options(stream_results=True)
+    return pd.read_sql(_SQL_EXISTENCIAS_POR_TIENDA, conn, chunksize=chunksize)
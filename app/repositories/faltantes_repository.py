@@ -22,14 +22,6 @@ def fetch_ventas_periodo(conn, fecha_col, fecha_desde):
     return pd.read_sql(query, conn)
 
 
-def fetch_existencias(conn):
-    query = """
-        SELECT c_barra, d_almacen, saldo_disponible
-        FROM ventas_saldos_raw
-    """
-    return pd.read_sql(query, conn)
-
-
 def fetch_tiendas(conn):
     query = "SELECT raw_name, clean_name FROM config_tiendas"
     return pd.read_sql(query, conn)
\ No newline at end of file
@@ -2,7 +2,11 @@
 
 import pandas as pd
 
-def fetch_movimiento(conn, fecha_col, fecha_desde):
+def fetch_movimiento(conn, fecha_col, fecha_desde, chunksize=None):
+    """
+    Movimiento por producto y almacén en el periodo.
+    Con chunksize retorna un iterador de lotes leídos del cursor.
+    """
     query = f"""
     WITH ventas_periodo AS (
         SELECT 
@@ -31,6 +35,43 @@ def fetch_movimiento(conn, fecha_col, fecha_desde):
         ON s.c_barra = v.c_barra AND s.d_almacen = v.d_almacen
     LEFT JOIN config_tiendas t
         ON s.d_almacen = t.raw_name
-    ORDER BY t.clean_name, s.d_marca;
+    ORDER BY t.clean_name, s.d_marca
+    """
+    if chunksize:
+        conn = conn.execution_options(stream_results=True)
+    return pd.read_sql(query, conn, chunksize=chunksize)
+
+
+def fetch_resumen_movimiento(conn, fecha_col, fecha_desde):
+    """
+    Resumen por tienda y estado (con / sin movimiento) agrupado en la base:
+    cantidad de productos y stock total.
+    """
+    query = f"""
+    WITH ventas_periodo AS (
+        SELECT 
+            c_barra,
+            d_almacen,
+            SUM(cn_venta) AS ventas_periodo
+        FROM ventas_historico_raw
+        WHERE {fecha_col} >= {fecha_desde}
+        GROUP BY c_barra, d_almacen
+    )
+    SELECT 
+        t.clean_name AS tienda,
+        CASE 
+            WHEN COALESCE(v.ventas_periodo, 0) > 0 THEN 'EN MOVIMIENTO'
+            ELSE 'SIN MOVIMIENTO'
+        END AS estado,
+        COUNT(s.c_barra) AS productos,
+        COALESCE(SUM(s.saldo_disponible), 0) AS stock_total
+    FROM ventas_saldos_raw s
+    LEFT JOIN ventas_periodo v
+        ON s.c_barra = v.c_barra AND s.d_almacen = v.d_almacen
+    JOIN config_tiendas t
+        ON s.d_almacen = t.raw_name
+    WHERE t.clean_name IS NOT NULL
+    GROUP BY t.clean_name, estado
+    ORDER BY t.clean_name, estado
     """
-    return pd.read_sql(query, conn)
\ No newline at end of file
+    return pd.read_sql(query, conn)
@@ -0,0 +1,22 @@
+# presencia_repository.py
+
+import pandas as pd
+
+
+def fetch_presencia_saldos(conn):
+    """Una fila por (código, almacén) en saldos, con marca de saldo positivo."""
+    query = """
+    SELECT 
+        c_barra,
+        d_almacen,
+        MAX(CASE WHEN saldo_disponible > 0 THEN 1 ELSE 0 END) AS con_stock
+    FROM ventas_saldos_raw
+    WHERE c_barra IS NOT NULL
+      AND d_almacen IS NOT NULL
+    GROUP BY c_barra, d_almacen
+    """
+    return pd.read_sql(query, conn)
+
+
+def fetch_config_almacenes(conn):
+    return pd.read_sql("SELECT raw_name, clean_name FROM config_tiendas", conn)
@@ -1,130 +1,150 @@
 # producto_repository.py
 
 import pandas as pd
+from app.database import date_format_convert, date_subtract_days
 
-def fetch_info_producto(conn, codigo):
-    query = """
-    SELECT DISTINCT
-        c_barra,
-        d_marca,
-        d_color_proveedor AS color
-    FROM ventas_saldos_raw
-    WHERE c_barra = ?
-    LIMIT 1
-    """
-    return pd.read_sql(query, conn, params=(codigo,))
 
+# Códigos por consulta en las búsquedas por lote
+TAMANO_LOTE_CODIGOS = 500
 
-def fetch_info_producto_bodega(conn, codigo):
-    query = """
-    SELECT DISTINCT
-        c_barra,
-        'DESCONOCIDO' as d_marca,
-        'DESCONOCIDO' as color
-    FROM inventario_bodega_raw
-    WHERE c_barra = ?
-    LIMIT 1
-    """
-    return pd.read_sql(query, conn, params=(codigo,))
 
+def _lotes(codigos, tamano=TAMANO_LOTE_CODIGOS):
+    for i in range(0, len(codigos), tamano):
+        yield codigos[i:i + tamano]
 
-def fetch_existencias_tiendas(conn, codigo):
-    query = """
-    SELECT 
-        COALESCE(ct.clean_name, s.d_almacen) AS tienda,
-        ct.region,
-        s.saldo_disponible AS stock_actual
-    FROM ventas_saldos_raw s
-    LEFT JOIN config_tiendas ct ON s.d_almacen = ct.raw_name
-    WHERE s.c_barra = ?
-    """
-    return pd.read_sql(query, conn, params=(codigo,))
 
-
-def fetch_existencias_bodega(conn, codigo):
-    query = """
-    SELECT 
-        'BODEGA JAGI' AS tienda,
-        'BODEGA' AS region,
-        saldo_disponibles AS stock_actual
-    FROM inventario_bodega_raw
-    WHERE c_barra = ?
-    """
-    return pd.read_sql(query, conn, params=(codigo,))
+def _cte_codigos(lote):
+    """CTE con los códigos del lote, para unir contra las tablas _raw."""
+    valores = ", ".join("(?)" for _ in lote)
+    return f"WITH codigos(c_barra) AS (VALUES {valores})"
 
 
-def fetch_ventas_periodo(conn, codigo, dias):
-    query = f"""
-    SELECT SUM(cn_venta) as ventas
-    FROM ventas_historico_raw
-    WHERE c_barra = ?
-    AND DATE(substr(f_sistema,7,4)||'-'||substr(f_sistema,4,2)||'-'||substr(f_sistema,1,2))
-        >= DATE('now', '-{dias} days')
+def fetch_existencias_productos(conn, codigos):
     """
-    return pd.read_sql(query, conn, params=(codigo,))
-
+    Existencias de los códigos en tiendas (saldos) y en bodega, una consulta
+    por lote de códigos.
 
-def fetch_ultima_venta(conn, codigo):
-    query = """
-    SELECT MAX(DATE(substr(f_sistema,7,4)||'-'||substr(f_sistema,4,2)||'-'||substr(f_sistema,1,2))) as ultima_venta
-    FROM ventas_historico_raw
-    WHERE c_barra = ?
+    Retorna (df_tiendas, df_bodega). codigo es el código tal como se pidió;
+    c_barra, d_marca y color son los de la fila, para armar la ficha.
     """
-    return pd.read_sql(query, conn, params=(codigo,))
-
-
-def fetch_ventas_por_tienda(conn, codigo):
-    query = """
-    SELECT 
-        COALESCE(ct.clean_name, h.d_almacen) AS tienda,
-        SUM(h.cn_venta) as ventas_30d
-    FROM ventas_historico_raw h
-    LEFT JOIN config_tiendas ct ON h.d_almacen = ct.raw_name
-    WHERE h.c_barra = ?
-    AND DATE(substr(f_sistema,7,4)||'-'||substr(f_sistema,4,2)||'-'||substr(f_sistema,1,2))
-        >= DATE('now', '-30 days')
-    AND h.d_almacen NOT LIKE '%BODEGA%'
-    GROUP BY tienda
+    tiendas, bodega, columnas = [], [], None
+    for lote in _lotes(list(codigos)):
+        query = f"""
+        {_cte_codigos(lote)}
+        SELECT 
+            0 AS es_bodega,
+            k.c_barra AS codigo,
+            COALESCE(ct.clean_name, s.d_almacen) AS tienda,
+            ct.region,
+            s.saldo_disponible AS stock_actual,
+            s.c_barra,
+            s.d_marca,
+            s.d_color_proveedor AS color
+        FROM codigos k
+        JOIN ventas_saldos_raw s ON s.c_barra = k.c_barra
+        LEFT JOIN config_tiendas ct ON s.d_almacen = ct.raw_name
+        UNION ALL
+        SELECT 
+            1 AS es_bodega,
+            k.c_barra AS codigo,
+            'BODEGA JAGI' AS tienda,
+            'BODEGA' AS region,
+            b.saldo_disponibles AS stock_actual,
+            b.c_barra,
+            'DESCONOCIDO' AS d_marca,
+            'DESCONOCIDO' AS color
+        FROM codigos k
+        JOIN inventario_bodega_raw b ON b.c_barra = k.c_barra
+        """
+        resultado = conn.exec_driver_sql(query, tuple(lote))
+        columnas = list(resultado.keys())[1:]
+        for fila in resultado.fetchall():
+            (bodega if fila[0] == 1 else tiendas).append(tuple(fila[1:]))
+
+    # Cada origen arma su propio DataFrame para que los tipos de stock
+    # salgan de sus propias filas (saldos y bodega no comparten tipo)
+    columnas = columnas or ["codigo", "tienda", "region", "stock_actual", "c_barra", "d_marca", "color"]
+    return (
+        pd.DataFrame.from_records(tiendas, columns=columnas),
+        pd.DataFrame.from_records(bodega, columns=columnas),
+    )
+
+
+def _ventas_por_lotes(conn, codigos, cuerpo):
     """
-    return pd.read_sql(query, conn, params=(codigo,))
-
-
-def fetch_todas_tiendas(conn):
-    query = """
-    SELECT DISTINCT clean_name as tienda
-    FROM config_tiendas
-    WHERE clean_name NOT LIKE '%BODEGA%'
+    Ejecuta cuerpo (consulta sobre la CTE codigos, con h = histórico) por
+    lote de códigos y une los resultados.
     """
-    return pd.read_sql(query, conn)
+    partes = [
+        pd.read_sql(f"{_cte_codigos(lote)}\n{cuerpo}", conn, params=tuple(lote))
+        for lote in _lotes(list(codigos))
+    ]
+    if len(partes) == 1:
+        return partes[0]
+    return pd.concat(partes, ignore_index=True)
 
 
-def fetch_historial(conn, codigo):
+def fetch_ventas_productos(conn, codigos, ventanas=(30, 60, 90), dias_detalle=30):
+    """
+    Ventas de los códigos agregadas en una sola pasada por el histórico,
+    agrupadas por código (codigo, tal como se pidió), tienda y día.
+
+    Solo las ventas de los últimos dias_detalle días conservan el día
+    (columna fecha); las anteriores quedan en una fila por tienda con
+    fecha nula. Columnas:
+        cantidad: unidades de la fila
+        en_<dias>: unidades de la fila dentro de cada ventana
+        en_tienda: unidades de los últimos dias_detalle días fuera de bodega
+        ultima_venta: fecha de la última venta de la fila
+    """
+    fecha = date_format_convert("h.f_sistema")
+    desde_detalle = date_subtract_days(dias_detalle)
+    tienda = "COALESCE(ct.clean_name, h.d_almacen)"
+    dia = f"CASE WHEN {fecha} >= {desde_detalle} THEN {fecha} END"
+    sumas = "".join(
+        f"COALESCE(SUM(CASE WHEN {fecha} >= {date_subtract_days(dias)} "
+        f"THEN h.cn_venta ELSE 0 END), 0) AS en_{dias},\n"
+        for dias in ventanas
+    )
+    return _ventas_por_lotes(conn, codigos, f"""
+        SELECT
+            k.c_barra AS codigo,
+            {tienda} AS tienda,
+            {dia} AS fecha,
+            COALESCE(SUM(h.cn_venta), 0) AS cantidad,
+            {sumas}
+            COALESCE(SUM(CASE WHEN {fecha} >= {desde_detalle}
+                               AND h.d_almacen NOT LIKE '%BODEGA%'
+                              THEN h.cn_venta ELSE 0 END), 0) AS en_tienda,
+            MAX({fecha}) AS ultima_venta
+        FROM codigos k
+        JOIN ventas_historico_raw h ON h.c_barra = k.c_barra
+        LEFT JOIN config_tiendas ct ON h.d_almacen = ct.raw_name
+        GROUP BY k.c_barra, {tienda}, {dia}
+    """)
+
+
+def fetch_catalogo_saldos(conn):
+    """Combinaciones (c_barra, d_marca, color) presentes en saldos."""
     query = """
-    SELECT 
-        DATE(substr(f_sistema,7,4)||'-'||substr(f_sistema,4,2)||'-'||substr(f_sistema,1,2)) as fecha,
-        COALESCE(ct.clean_name, d_almacen) AS tienda,
-        cn_venta as cantidad
-    FROM ventas_historico_raw h
-    LEFT JOIN config_tiendas ct ON h.d_almacen = ct.raw_name
-    WHERE c_barra = ?
-    AND DATE(substr(f_sistema,7,4)||'-'||substr(f_sistema,4,2)||'-'||substr(f_sistema,1,2))
-        >= DATE('now', '-30 days')
-    ORDER BY fecha DESC
-    LIMIT 50
+    SELECT DISTINCT
+        c_barra,
+        d_marca,
+        d_color_proveedor AS color
+    FROM ventas_saldos_raw
+    WHERE c_barra IS NOT NULL
     """
-    return pd.read_sql(query, conn, params=(codigo,))
+    return pd.read_sql(query, conn)
 
 
-def fetch_grafico_ventas(conn, codigo):
+def fetch_catalogo_bodega(conn):
+    """Combinaciones (c_barra, d_marca, color) presentes en bodega."""
     query = """
-    SELECT 
-        DATE(substr(f_sistema,7,4)||'-'||substr(f_sistema,4,2)||'-'||substr(f_sistema,1,2)) as fecha,
-        SUM(cn_venta) as ventas
-    FROM ventas_historico_raw
-    WHERE c_barra = ?
-    AND DATE(substr(f_sistema,7,4)||'-'||substr(f_sistema,4,2)||'-'||substr(f_sistema,1,2))
-        >= DATE('now', '-30 days')
-    GROUP BY fecha
-    ORDER BY fecha
+    SELECT DISTINCT
+        c_barra,
+        d_marca,
+        d_color_proveedor AS color
+    FROM inventario_bodega_raw
+    WHERE c_barra IS NOT NULL
     """
-    return pd.read_sql(query, conn, params=(codigo,))
\ No newline at end of file
+    return pd.read_sql(query, conn)
@@ -3,6 +3,26 @@
 import pandas as pd
 
 
+def _filtros_sql(tienda_expr=None, codigo_col=None, tiendas=None, codigos=None):
+    """
+    Condiciones AND opcionales por tienda y código.
+    Los códigos se comparan en mayúsculas.
+
+    Returns:
+        (sql, params) para agregar a un WHERE existente
+    """
+    condiciones = []
+    params = []
+    if tiendas and tienda_expr:
+        condiciones.append(f"{tienda_expr} IN ({', '.join('?' * len(tiendas))})")
+        params.extend(tiendas)
+    if codigos and codigo_col:
+        condiciones.append(f"UPPER({codigo_col}) IN ({', '.join('?' * len(codigos))})")
+        params.extend(codigos)
+    sql = "".join(f"\n      AND {c}" for c in condiciones)
+    return sql, tuple(params)
+
+
 # ======================================================
 # CONFIGURACIONES BÁSICAS
 # ======================================================
@@ -49,112 +69,118 @@ def fetch_config_tiendas(conn):
 # REABASTECIMIENTO BASE
 # ======================================================
 
-def fetch_base_reabastecimiento(conn, fecha_col, fecha_desde):
+def fetch_saldos_reabastecimiento(conn, tiendas=None, codigos=None):
     """
-    Base de reabastecimiento:
-    - Stock por tienda
-    - Stock en bodega
-    - Ventas en el período
+    Saldos por tienda con stock de bodega, sin ventas.
+    Las ventas se cruzan aparte para poder reutilizar la misma
+    base con distintas ventanas de días.
+
+    tiendas / codigos limitan la lectura a ese subconjunto.
     """
+    filtros, params = _filtros_sql(
+        "COALESCE(ct.clean_name, s.d_almacen)", "s.c_barra", tiendas, codigos
+    )
     query = f"""
-    WITH base AS (
-        SELECT 
-            s.c_barra,
-            s.d_marca,
-            COALESCE(ct.clean_name, s.d_almacen) AS tienda,
-            s.d_color_proveedor AS color,
-            s.saldo_disponible AS stock_actual,
-            COALESCE(
-                b.saldo_disponibles,
-                b.saldo_disponible,
-                0
-            ) AS stock_bodega
-        FROM ventas_saldos_raw s
-        LEFT JOIN inventario_bodega_raw b
-            ON s.c_barra = b.c_barra
-        LEFT JOIN config_tiendas ct
-            ON s.d_almacen = ct.raw_name
-        WHERE s.c_barra NOT IN (
-            SELECT cod_barras
-            FROM codigos_excluidos
-            WHERE cod_barras IS NOT NULL
-        )
-    ),
-    ventas_reab AS (
-        SELECT 
-            h.c_barra,
-            COALESCE(ct.clean_name, h.d_almacen) AS tienda,
-            SUM(h.cn_venta) AS ventas_periodo
-        FROM ventas_historico_raw h
-        LEFT JOIN config_tiendas ct
-            ON h.d_almacen = ct.raw_name
-        WHERE {fecha_col} >= {fecha_desde}
-        GROUP BY h.c_barra, tienda
+    SELECT 
+        s.c_barra,
+        s.d_marca,
+        COALESCE(ct.clean_name, s.d_almacen) AS tienda,
+        s.d_color_proveedor AS color,
+        s.saldo_disponible AS stock_actual,
+        COALESCE(b.saldo_disponibles, 0) AS stock_bodega
+    FROM ventas_saldos_raw s
+    LEFT JOIN inventario_bodega_raw b
+        ON s.c_barra = b.c_barra
+    LEFT JOIN config_tiendas ct
+        ON s.d_almacen = ct.raw_name
+    WHERE s.c_barra NOT IN (SELECT cod_barras FROM codigos_excluidos){filtros}
+    """
+    return pd.read_sql(query, conn, params=params or None)
+
+
+def fetch_ventas_ventanas(conn, fecha_col, ventanas, fecha_hasta=None, tiendas=None, codigos=None):
+    """
+    Ventas por (c_barra, tienda) para varias ventanas de días en un solo recorrido.
+
+    Args:
+        ventanas: dict {dias: expresión SQL de fecha desde}
+        fecha_hasta: expresión SQL de fecha límite (opcional)
+        tiendas / codigos: limitan la lectura a ese subconjunto
+
+    Returns:
+        DataFrame con columnas c_barra, tienda y ventas_<dias> por ventana.
+        Una ventana sin ventas queda en NULL (igual que si el grupo no existiera).
+    """
+    columnas = ",\n        ".join(
+        f"SUM(CASE WHEN {fecha_col} >= {desde} THEN h.cn_venta END) AS ventas_{dias}"
+        for dias, desde in ventanas.items()
+    )
+    fecha_min = ventanas[max(ventanas)]
+    hasta = f"\n      AND {fecha_col} <= {fecha_hasta}" if fecha_hasta else ""
+    filtros, params = _filtros_sql(
+        "COALESCE(ct.clean_name, h.d_almacen)", "h.c_barra", tiendas, codigos
     )
+
+    query = f"""
     SELECT 
-        base.c_barra,
-        base.d_marca,
-        base.tienda,
-        base.color,
-        base.stock_actual,
-        base.stock_bodega,
-        COALESCE(v.ventas_periodo, 0) AS ventas_periodo
-    FROM base
-    LEFT JOIN ventas_reab v
-        ON base.c_barra = v.c_barra
-       AND base.tienda = v.tienda;
+        h.c_barra,
+        COALESCE(ct.clean_name, h.d_almacen) AS tienda,
+        {columnas}
+    FROM ventas_historico_raw h
+    LEFT JOIN config_tiendas ct
+        ON h.d_almacen = ct.raw_name
+    WHERE {fecha_col} >= {fecha_min}{hasta}{filtros}
+    GROUP BY h.c_barra, tienda
     """
-    return pd.read_sql(query, conn)
+    return pd.read_sql(query, conn, params=params or None)
 
 
 # ======================================================
 # EXPANSIÓN
 # ======================================================
 
-def fetch_ventas_expansion(conn, fecha_col, fecha_desde):
+def fetch_codigos_expansion(conn, fecha_col, fecha_desde, ventas_min, fecha_hasta=None, codigos=None):
+    """
+    Códigos que alcanzan ventas_min en al menos una tienda de la cadena.
+    Se usa cuando las ventas leídas están limitadas a unas tiendas y la
+    validez para expansión debe seguir mirando toda la cadena.
+    """
+    hasta = f"\n      AND {fecha_col} <= {fecha_hasta}" if fecha_hasta else ""
+    filtros, params = _filtros_sql(codigo_col="h.c_barra", codigos=codigos)
+
     query = f"""
     SELECT 
-        h.c_barra,
-        COALESCE(ct.clean_name, h.d_almacen) AS tienda,
-        SUM(h.cn_venta) AS ventas_expansion
+        h.c_barra
     FROM ventas_historico_raw h
     LEFT JOIN config_tiendas ct
         ON h.d_almacen = ct.raw_name
-    WHERE {fecha_col} >= {fecha_desde}
-    GROUP BY h.c_barra, tienda
+    WHERE {fecha_col} >= {fecha_desde}{hasta}
+      AND h.c_barra IS NOT NULL
+      AND COALESCE(ct.clean_name, h.d_almacen) IS NOT NULL
+      AND h.c_barra NOT IN (
+          SELECT cod_barras FROM codigos_excluidos WHERE cod_barras IS NOT NULL
+      ){filtros}
+    GROUP BY h.c_barra, COALESCE(ct.clean_name, h.d_almacen)
+    HAVING SUM(h.cn_venta) >= ?
     """
-    return pd.read_sql(query, conn)
+    return pd.read_sql(query, conn, params=params + (ventas_min,))
 
 
 # ======================================================
 # DATOS AUXILIARES
 # ======================================================
 
-def fetch_info_referencias(conn):
+def fetch_info_referencias(conn, codigos=None):
+    filtros, params = _filtros_sql(codigo_col="c_barra", codigos=codigos)
     return pd.read_sql(
-        """
+        f"""
         SELECT DISTINCT 
             c_barra,
             d_marca,
             d_color_proveedor AS color
         FROM ventas_saldos_raw
-        WHERE c_barra IS NOT NULL
+        WHERE c_barra IS NOT NULL{filtros}
         """,
-        conn
+        conn,
+        params=params or None
     )
-
-
-def fetch_existencias(conn):
-    return pd.read_sql(
-        """
-        SELECT DISTINCT 
-            COALESCE(ct.clean_name, s.d_almacen) AS tienda,
-            s.c_barra,
-            s.saldo_disponible
-        FROM ventas_saldos_raw s
-        LEFT JOIN config_tiendas ct
-            ON s.d_almacen = ct.raw_name
-        WHERE s.c_barra IS NOT NULL
-        """,
-        conn
-    )
\ No newline at end of file
@@ -1,6 +1,7 @@
 # redistribucion_repository.py
 
 import pandas as pd
+from sqlalchemy import inspect
 
 def fetch_configuracion(conn):
     cfg = pd.read_sql("SELECT tipo, cantidad FROM stock_minimo_config", conn)
@@ -49,4 +50,15 @@ def fetch_existencias(conn):
             s.saldo_disponible AS stock_actual
         FROM ventas_saldos_raw s
         LEFT JOIN config_tiendas ct ON s.d_almacen = ct.raw_name
-    """, conn)
\ No newline at end of file
+    """, conn)
+
+
+def fetch_costos_traslado(conn):
+    """Costo por unidad entre regiones (tabla opcional costos_traslado)."""
+    if not inspect(conn).has_table("costos_traslado"):
+        return pd.DataFrame(columns=["region_origen", "region_destino", "costo"])
+
+    return pd.read_sql_query(
+        "SELECT region_origen, region_destino, costo FROM costos_traslado",
+        conn
+    )
@@ -33,6 +33,7 @@ from app.schemas.common import (
 from app.schemas.reabastecimiento import (
     ReabastecimientoCalculoRequest,
     ReabastecimientoFiltrosRequest,
+    ReabastecimientoEscenariosRequest,
     ReabastecimientoItem,
     ReabastecimientoResponse,
     ReabastecimientoExportRequest,
@@ -56,6 +57,7 @@ __all__ = [
     # Reabastecimiento
     "ReabastecimientoCalculoRequest",
     "ReabastecimientoFiltrosRequest",
+    "ReabastecimientoEscenariosRequest",
     "ReabastecimientoItem",
     "ReabastecimientoResponse",
     "ReabastecimientoExportRequest",
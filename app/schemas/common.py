@@ -33,9 +33,15 @@ class ErrorResponse(BaseModel):
 
 
 class PaginationParams(BaseModel):
-    """Parámetros de paginación estándar."""
+    """
+    Parámetros de paginación estándar.
+
+    Los previews de reportes paginan por keyset: usan page_size y cursor
+    (next_cursor de la respuesta anterior); page no aplica en ellos.
+    """
     page: int = Field(default=1, ge=1, description="Número de página")
     page_size: int = Field(default=50, ge=1, le=1000, description="Items por página")
+    cursor: Optional[str] = Field(default=None, description="Cursor de la página siguiente")
     
     @property
     def offset(self) -> int:
@@ -10,8 +10,9 @@ Define la estructura y validación de datos para:
 
 """
 
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, field_validator, model_validator
 from typing import Optional, List
+from itertools import product
 from app.schemas.common import (
     DateRangeParams,
     TiendaFilter,
@@ -169,6 +170,79 @@ class ReabastecimientoFiltrosRequest(BaseModel):
     )
 
 
+MAX_ESCENARIOS = 100
+
+
+class ReabastecimientoEscenariosRequest(BaseModel):
+    """
+    Request para evaluar escenarios (what-if) de reabastecimiento.
+    
+    Se evalúan todas las combinaciones de los valores recibidos
+    sobre una sola lectura de la base de datos.
+    
+    Ejemplo:
+        {
+            "dias_reab": [7, 10, 15],
+            "dias_exp": [60, 90],
+            "ventas_min_exp": [3]
+        }
+    """
+    
+    dias_reab: List[int] = Field(
+        ...,
+        min_length=1,
+        description="Valores de días para reabastecimiento"
+    )
+    
+    dias_exp: List[int] = Field(
+        ...,
+        min_length=1,
+        description="Valores de días para expansión"
+    )
+    
+    ventas_min_exp: List[int] = Field(
+        ...,
+        min_length=1,
+        description="Valores de ventas mínimas para expansión"
+    )
+    
+    solo_con_ventas: bool = Field(
+        default=False,
+        description="Contar solo códigos con ventas (más expansión y nuevos)"
+    )
+    
+    @field_validator('dias_reab', 'dias_exp')
+    def validate_dias(cls, v):
+        """Valida días entre 1 y 365, sin repetidos."""
+        if any(d < 1 or d > 365 for d in v):
+            raise ValueError('Los días deben estar entre 1 y 365')
+        return sorted(set(v))
+    
+    @field_validator('ventas_min_exp')
+    def validate_ventas_min(cls, v):
+        """Valida ventas mínimas no negativas, sin repetidos."""
+        if any(x < 0 for x in v):
+            raise ValueError('Las ventas mínimas no pueden ser negativas')
+        return sorted(set(v))
+    
+    @model_validator(mode='after')
+    def validate_total_escenarios(self):
+        """Limita la cantidad de combinaciones."""
+        total = len(self.dias_reab) * len(self.dias_exp) * len(self.ventas_min_exp)
+        if total > MAX_ESCENARIOS:
+            raise ValueError(
+                f'Demasiados escenarios ({total}); máximo {MAX_ESCENARIOS}'
+            )
+        return self
+    
+    def escenarios(self) -> List[dict]:
+        """Combinaciones de parámetros a evaluar."""
+        return [
+            {"dias_reab": r, "dias_exp": e, "ventas_min_exp": v}
+            for r, e, v in product(self.dias_reab, self.dias_exp, self.ventas_min_exp)
+        ]
+
+
 # ==========================================
 # RESPONSE SCHEMAS
 # ==========================================
@@ -1,7 +1,9 @@
-from .analisis_marca_service import get_analisis_marca
-from .producto_service import get_consulta_producto
-from .existencias_service import get_existencias_por_tienda
-from .movimiento_service import get_movimiento, get_resumen_movimiento
+from .analisis_marca_service import get_analisis_marca, get_analisis_todas_marcas
+from .producto_service import get_consulta_producto, get_consulta_productos, get_catalogo_productos
+from .existencias_service import get_existencias_por_tienda, stream_existencias_por_tienda
+from .movimiento_service import get_movimiento, get_resumen_movimiento, stream_movimiento
 from .faltantes_service import get_faltantes
-from .reabastecimiento_service import get_reabastecimiento_avanzado
-from .redistribucion_service import get_redistribucion_regional
\ No newline at end of file
+from .reabastecimiento_service import get_reabastecimiento_avanzado, evaluar_escenarios_reabastecimiento
+from .redistribucion_service import get_redistribucion_regional
+from .presencia_service import get_indice_presencia
+from .busqueda_service import buscar_productos, construir_indice_busqueda
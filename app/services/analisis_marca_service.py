@@ -1,36 +1,109 @@
 # analisis_marca_service.py
 
-import os
-import sqlite3
+from datetime import date
+
+import numpy as np
 import pandas as pd
 
 from app.repositories.analisis_marca_repository import (
-    get_top10_marca,
-    get_productos_marca_sin_ventas,
+    MODOS_MARCA,
+    crear_clave_marca,
+    crear_top_marcas,
+    fecha_top_marcas,
+    fetch_map_marcas,
+    fetch_marcas_saldos,
+    get_top_marca,
+    get_top_marcas_precalculado,
+    get_top_todas_marcas,
     get_tiendas_configuradas,
-    get_stock_por_barra,
+    get_stock_por_barras,
+    tiene_clave_marca,
 )
 
-from app.database import DATA_DIR
-from app.utils.text import _norm
+from app.database import get_connection
+from app.exceptions import DerivedDataMissingError
+from app.services.presencia_service import get_indice_presencia
+from app.utils.cache import CacheGeneracional
+from app.utils.text import _norm, clave_marca
+
+# Productos por marca que guarda top_marcas
+TOP_MARCAS_N = 50
+
+_cache_mapa_marcas = CacheGeneracional(maxsize=1)
+_cache_todas_marcas = CacheGeneracional(maxsize=4)
+
+
+def get_mapa_marcas():
+    """Mapa clave cruda -> clave limpia de map_marcas, por generación de datos."""
+    return _cache_mapa_marcas.obtener("mapa", _leer_mapa_marcas)
+
 
-def get_analisis_marca(marca: str) -> dict:
+def _leer_mapa_marcas():
+    with get_connection() as conn:
+        df_map = fetch_map_marcas(conn)
+    return {
+        _norm(raw): _norm(limpio)
+        for raw, limpio in zip(df_map["raw_name"], df_map["clean_name"])
+        if _norm(limpio)
+    }
+
+
+def construir_clave_marca():
     """
-    Lógica de negocio para el análisis completo de una marca.
-    Devuelve la estructura exacta que espera el frontend.
+    Crea o actualiza marca_key en ventas_saldos_raw con el mapa de marcas.
+    Es parte de la carga de CSV: las consultas no modifican el esquema.
+    """
+    mapa = get_mapa_marcas()
+    with get_connection() as conn:
+        marcas = fetch_marcas_saldos(conn)["d_marca"]
+        crear_clave_marca(conn, {m: clave_marca(m, mapa) for m in marcas})
+
+
+def _verificar_clave_marca(conn):
+    if not tiene_clave_marca(conn):
+        raise DerivedDataMissingError("ventas_saldos_raw.marca_key")
+
+
+def _fecha_top_marcas(conn):
+    """Fecha de cálculo de top_marcas; error si la carga aún no la creó."""
+    fecha = fecha_top_marcas(conn)
+    if fecha is None:
+        raise DerivedDataMissingError("top_marcas")
+    return fecha
+
+
+def construir_top_marcas():
     """
+    Recalcula top_marcas (top TOP_MARCAS_N por ventas de 30 días de cada
+    marca) con los datos cargados. Lo llaman la carga de CSV y la tarea
+    diaria scripts/recalcular_top_marcas.py (la ventana de 30 días se mueve).
+    """
+    with get_connection() as conn:
+        _verificar_clave_marca(conn)
+        crear_top_marcas(conn, get_top_todas_marcas(conn, TOP_MARCAS_N), date.today())
+
 
-    db_path = os.path.join(DATA_DIR, "jagi_mahalo.db")
-    conn = sqlite3.connect(db_path)
+def get_analisis_marca(marca: str, aproximada: bool = False) -> dict:
+    """
+    Lógica de negocio para el análisis completo de una marca.
+    Devuelve la estructura exacta que espera el frontend.
 
-    try:
-        marca_norm = marca.upper().strip()
+    La marca se busca por marca_key: primero igual a la clave, luego como
+    prefijo; con aproximada=True, también como subcadena. El top sale de
+    top_marcas tal como quedó en su último cálculo (fecha_calculo).
+    """
+    clave = clave_marca(marca, get_mapa_marcas())
+    modos = MODOS_MARCA if aproximada else MODOS_MARCA[:-1]
 
-        # 1. TOP 10 productos
-        df_top10 = get_top10_marca(conn, marca_norm)
+    with get_connection() as conn:
+        _verificar_clave_marca(conn)
+        fecha_calculo = _fecha_top_marcas(conn)
 
-        if df_top10.empty:
-            df_top10 = get_productos_marca_sin_ventas(conn, marca_norm)
+        # 1. TOP 10 productos (de top_marcas)
+        for modo in modos:
+            df_top10 = get_top_marca(conn, clave, modo)
+            if not df_top10.empty:
+                break
 
         # 2. Tiendas configuradas
         df_tiendas = get_tiendas_configuradas(conn)
@@ -38,55 +111,65 @@ def get_analisis_marca(marca: str) -> dict:
         tiendas_dict = df_tiendas.set_index("raw_name")["clean_name"].to_dict()
         regiones_dict = df_tiendas.set_index("clean_name")["region"].to_dict()
 
-        top10_detalles = []
-        tiendas_con_top10 = set()
-
-        # 3. Detalle por producto
-        for _, fila in df_top10.iterrows():
-            barra = str(fila["c_barra"])
+        barras = df_top10["c_barra"].astype(str).tolist()
+        ventas = df_top10["ventas_30d"].astype(int).to_numpy()
 
-            df_stock = get_stock_por_barra(conn, barra)
+        # Presencia con stock de todo el top en las tiendas configuradas
+        tiendas_config = list(dict.fromkeys(tiendas_dict.values()))
+        con_stock = get_indice_presencia().matriz(
+            barras, tiendas_dict, tiendas_config, con_stock=True
+        )
 
-            tiendas_con_producto = [
-                tiendas_dict[r]
-                for r in df_stock[df_stock["saldo_disponible"] > 0]["d_almacen"]
-                if r in tiendas_dict
-            ]
+        # 3. Stock de todo el top en una consulta
+        df_stock = get_stock_por_barras(conn, barras)
+        stock_total = dict(zip(df_stock["c_barra"].astype(str), df_stock["stock_total"]))
 
-            tiendas_con_top10.update(tiendas_con_producto)
+        # Matriz producto × tienda (una columna por cada tienda de config,
+        # repetidas incluidas, en el orden de tiendas_dict)
+        tiendas = list(tiendas_dict.values())
+        columna = {t: j for j, t in enumerate(tiendas_config)}
+        matriz = con_stock[:, [columna[t] for t in tiendas]]
 
-            tiendas_sin_producto = [
-                t for t in tiendas_dict.values() if t not in tiendas_con_producto
-            ]
+        top10_detalles = []
+        for k, barra in enumerate(barras):
+            color = df_top10["color"].iloc[k]
+            tiendas_con_producto = [t for t, esta in zip(tiendas_config, con_stock[k]) if esta]
+            tiendas_sin_producto = [t for t, esta in zip(tiendas, matriz[k]) if not esta]
+            stock = stock_total.get(barra)
 
             top10_detalles.append({
                 "c_barra": barra,
-                "color": str(fila["color"]) if pd.notna(fila["color"]) else "N/A",
-                "ventas_30d": int(fila["ventas_30d"]),
+                "color": str(color) if pd.notna(color) else "N/A",
+                "ventas_30d": int(ventas[k]),
                 "tiendas_con_producto": tiendas_con_producto,
                 "tiendas_sin_producto": tiendas_sin_producto,
-                "stock_total": int(df_stock["saldo_disponible"].sum()),
+                "stock_total": int(stock) if pd.notna(stock) else 0,
                 "potencial_faltante": len(tiendas_sin_producto),
             })
 
-        # 4. Análisis por tienda
-        analisis_tiendas = []
-        for tienda in tiendas_dict.values():
-            productos_con = [p for p in top10_detalles if tienda in p["tiendas_con_producto"]]
-            productos_sin = [p for p in top10_detalles if tienda not in p["tiendas_con_producto"]]
+        tiendas_con_top10 = {
+            t for t, alguna in zip(tiendas_config, con_stock.any(axis=0)) if alguna
+        }
 
-            analisis_tiendas.append({
+        # 4. Análisis por tienda
+        productos_con = matriz.sum(axis=0)
+        ventas_con = ventas @ matriz
+        analisis_tiendas = [
+            {
                 "tienda": tienda,
                 "region": regiones_dict.get(tienda, "N/A"),
-                "productos_top10": len(productos_con),
-                "productos_faltantes": len(productos_sin),
-                "ventas_top10": sum(p["ventas_30d"] for p in productos_con),
+                "productos_top10": int(productos_con[j]),
+                "productos_faltantes": len(barras) - int(productos_con[j]),
+                "ventas_top10": int(ventas_con[j]),
                 "stock_top10": 0,
-            })
+            }
+            for j, tienda in enumerate(tiendas)
+        ]
 
         # 5. Respuesta final
         return {
             "marca": marca,
+            "fecha_calculo": fecha_calculo,
             "resumen": {
                 "total_productos": len(top10_detalles),
                 "tiendas_totales": len(tiendas_dict),
@@ -102,5 +185,93 @@ def get_analisis_marca(marca: str) -> dict:
             ],
         }
 
-    finally:
-        conn.close()
\ No newline at end of file
+
+def get_analisis_todas_marcas(top_n: int = 10) -> dict:
+    """
+    Análisis de todas las marcas a la vez, en tablas:
+    - marcas: resumen por marca (como "resumen" de get_analisis_marca)
+    - productos: top N de cada marca con stock y cobertura de tiendas
+    - tiendas: marca × tienda con productos del top presentes y faltantes
+
+    Una consulta para el ranking de todas las marcas; la cobertura sale del
+    índice de presencia para todo el lote. Con top_n <= TOP_MARCAS_N se lee
+    de top_marcas; marcas.fecha_calculo es la fecha de ese cálculo.
+    Cacheado por generación y día.
+    """
+    tablas = _cache_todas_marcas.obtener(
+        (top_n, date.today()), lambda: _analisis_todas_marcas(top_n)
+    )
+    return {nombre: df.copy() for nombre, df in tablas.items()}
+
+
+def _analisis_todas_marcas(top_n):
+    with get_connection() as conn:
+        _verificar_clave_marca(conn)
+        if top_n <= TOP_MARCAS_N:
+            fecha_calculo = _fecha_top_marcas(conn)
+            df_top = get_top_marcas_precalculado(conn, top_n)
+        else:
+            fecha_calculo = date.today().isoformat()
+            df_top = get_top_todas_marcas(conn, top_n)
+        df_tiendas = get_tiendas_configuradas(conn)
+        barras = df_top["c_barra"].astype(str)
+        df_stock = get_stock_por_barras(conn, barras.unique().tolist())
+
+    tiendas_dict = df_tiendas.set_index("raw_name")["clean_name"].to_dict()
+    regiones_dict = df_tiendas.set_index("clean_name")["region"].to_dict()
+    tiendas_config = list(dict.fromkeys(tiendas_dict.values()))
+    tiendas = list(tiendas_dict.values())
+    columna = {t: j for j, t in enumerate(tiendas_config)}
+
+    # Presencia con stock producto × tienda de todos los tops juntos
+    con_stock = get_indice_presencia().matriz(
+        barras.tolist(), tiendas_dict, tiendas_config, con_stock=True
+    )
+    matriz = con_stock[:, [columna[t] for t in tiendas]]
+    ventas = df_top["ventas_30d"].astype(int).to_numpy()
+
+    # Marca de cada fila como matriz one-hot marcas × productos
+    fila_marca, claves = pd.factorize(df_top["marca_key"])
+    uno = np.zeros((len(claves), len(df_top)), dtype=np.int64)
+    uno[fila_marca, np.arange(len(df_top))] = 1
+    nombre_marca = df_top.groupby("marca_key", sort=False)["d_marca"].first().reindex(claves)
+
+    stock = dict(zip(df_stock["c_barra"].astype(str), df_stock["stock_total"]))
+    faltantes = (~matriz).sum(axis=1)
+    productos = pd.DataFrame({
+        "marca": nombre_marca.to_numpy()[fila_marca],
+        "puesto": df_top["puesto"].astype(int),
+        "c_barra": barras,
+        "color": df_top["color"].fillna("N/A").astype(str),
+        "ventas_30d": ventas,
+        "stock_total": barras.map(stock).fillna(0).astype(int),
+        "tiendas_con_producto": con_stock.sum(axis=1),
+        "potencial_faltante": faltantes,
+        "tiendas_sin_producto": [
+            ", ".join(t for t, esta in zip(tiendas, fila) if not esta) for fila in matriz
+        ],
+    })
+
+    productos_con = uno @ matriz
+    ventas_con = (uno * ventas) @ matriz
+    n_productos = uno.sum(axis=1)
+    tiendas_df = pd.DataFrame({
+        "marca": np.repeat(nombre_marca.to_numpy(), len(tiendas)),
+        "tienda": np.tile(tiendas, len(claves)),
+        "region": np.tile([regiones_dict.get(t, "N/A") for t in tiendas], len(claves)),
+        "productos_top": productos_con.ravel(),
+        "productos_faltantes": (n_productos[:, None] - productos_con).ravel(),
+        "ventas_top": ventas_con.ravel(),
+    })
+
+    marcas = pd.DataFrame({
+        "marca": nombre_marca.to_numpy(),
+        "total_productos": n_productos,
+        "tiendas_totales": len(tiendas_dict),
+        "tiendas_con_top": ((uno @ con_stock) > 0).sum(axis=1),
+        "oportunidades_redistribucion": uno @ faltantes,
+        "ventas_top": uno @ ventas,
+        "fecha_calculo": fecha_calculo,
+    })
+
+    return {"marcas": marcas, "productos": productos, "tiendas": tiendas_df}
@@ -0,0 +1,29 @@
+# busqueda_service.py
+
+from app.database import get_connection
+from app.repositories import busqueda_repository as repo
+
+
+# El índice trigram solo resuelve subcadenas de 3+ caracteres
+MIN_CARACTERES_INDICE = 3
+
+
+def construir_indice_busqueda():
+    """Recrea el índice de búsqueda de productos con los datos cargados."""
+    with get_connection() as conn:
+        return repo.crear_indice_busqueda(conn)
+
+
+def buscar_productos(termino, limite=20):
+    """
+    Productos que coinciden con el término, para autocompletado.
+
+    Primero el código exacto, luego los códigos que empiezan por el término
+    y después las coincidencias en marca, color o descripción. Sin índice
+    (o con términos cortos) busca con LIKE en código y marca.
+    """
+    termino = termino.strip()
+    with get_connection() as conn:
+        if len(termino) >= MIN_CARACTERES_INDICE and repo.existe_indice_busqueda(conn):
+            return repo.fetch_busqueda_indexada(conn, termino, limite)
+        return repo.fetch_busqueda_like(conn, termino, limite)
@@ -1,7 +1,12 @@
 # existencias_service.py
 
-from app.repositories.existencias_repository import fetch_existencias_por_tienda
+from app.database import get_connection
+from app.repositories.existencias_repository import (
+    fetch_existencias_por_tienda,
+    iter_existencias_por_tienda,
+)
 from app.utils.text import _norm
+from app.utils.streaming import TAMANO_LOTE, codificar_lotes
 
 
 def get_existencias_por_tienda():
@@ -9,4 +14,14 @@ def get_existencias_por_tienda():
     Retorna las existencias actuales por tienda.
     Servicio del dominio Inventario / Existencias.
     """
-    return fetch_existencias_por_tienda()
\ No newline at end of file
+    return fetch_existencias_por_tienda()
+
+
+def stream_existencias_por_tienda(formato="ndjson", tamano_lote=TAMANO_LOTE):
+    """
+    Existencias por tienda codificadas por lotes (NDJSON o CSV) directo
+    del cursor, sin armar el DataFrame completo.
+    """
+    with get_connection() as conn:
+        lotes = iter_existencias_por_tienda(conn, tamano_lote)
+        yield from codificar_lotes(lotes, formato)
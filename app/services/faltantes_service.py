@@ -1,8 +1,10 @@
 # altantes_service.py
 
+import numpy as np
 import pandas as pd
 from app.database import get_connection, date_subtract_days, date_format_convert
 from app.repositories import faltantes_repository as repo
+from app.services.presencia_service import get_indice_presencia, tienda_por_almacen
 from app.utils.text import _norm
 
 
@@ -18,47 +20,40 @@ def get_faltantes(dias=90):
         )
 
         ventas = repo.fetch_ventas_periodo(conn, fecha_col, fecha_desde)
-        existencias = repo.fetch_existencias(conn)
         tiendas = repo.fetch_tiendas(conn)
 
     # Normalizar tiendas
     ventas = ventas.merge(tiendas, left_on="d_almacen", right_on="raw_name", how="left")
-    existencias = existencias.merge(tiendas, left_on="d_almacen", right_on="raw_name", how="left")
-
     ventas["tienda"] = ventas["clean_name"].fillna(ventas["d_almacen"])
-    existencias["tienda"] = existencias["clean_name"].fillna(existencias["d_almacen"])
 
     # Limpiar bodegas y excluidos
     ventas = ventas[~ventas["tienda"].str.contains("BODEGA", case=False, na=False)]
-    existencias = existencias[~existencias["tienda"].str.contains("BODEGA", case=False, na=False)]
-
     ventas = ventas[~ventas["c_barra"].isin(cod_excluidos)]
-    existencias = existencias[~existencias["c_barra"].isin(cod_excluidos)]
-
-    tiendas_activas = existencias["tienda"].drop_duplicates().tolist()
-    productos = ventas[["c_barra", "d_marca"]].drop_duplicates()
-
-    # Lógica de negocio: detectar faltantes
-    faltantes = []
 
-    for _, prod in productos.iterrows():
-        c_barra = prod["c_barra"]
-        d_marca = prod["d_marca"]
+    # Tiendas activas: las que tienen algún código (no excluido) en saldos
+    indice = get_indice_presencia()
+    tienda_de = tienda_por_almacen(tiendas)
+    tiendas_activas = pd.Series(
+        [tienda_de[a] for a in indice.almacenes_activos(excluir=cod_excluidos)]
+    ).drop_duplicates()
+    tiendas_activas = tiendas_activas[
+        ~tiendas_activas.str.contains("BODEGA", case=False, na=False)
+    ].tolist()
 
-        tiendas_con_stock = (
-            existencias.loc[existencias["c_barra"] == c_barra, "tienda"]
-            .unique()
-            .tolist()
-        )
-
-        for tienda in tiendas_activas:
-            if tienda not in tiendas_con_stock:
-                faltantes.append({
-                    "c_barra": c_barra,
-                    "d_marca": d_marca,
-                    "tienda_faltante": tienda
-                })
+    productos = ventas[["c_barra", "d_marca"]].drop_duplicates()
 
-    return pd.DataFrame(faltantes).sort_values(
-        by=["d_marca", "tienda_faltante"]
-    )
\ No newline at end of file
+    # Lógica de negocio: producto vendido × tienda activa sin el código en
+    # saldos, sacado del índice de presencia (que compara los códigos sin
+    # distinguir mayúsculas; la salida los deja como vienen en ventas)
+    presente = indice.matriz(productos["c_barra"], tienda_de, tiendas_activas)
+    fila, columna = np.nonzero(~presente)
+
+    faltantes = pd.DataFrame({
+        "c_barra": productos["c_barra"].to_numpy()[fila],
+        "d_marca": productos["d_marca"].to_numpy()[fila],
+        "tienda_faltante": np.asarray(tiendas_activas, dtype=object)[columna],
+    })
+
+    # Orden estable: dentro de la misma marca y tienda, los productos quedan
+    # en el orden de ventas
+    return faltantes.sort_values(by=["d_marca", "tienda_faltante"], kind="stable")
@@ -1,8 +1,15 @@
 # movimiento_service.py
 
+from datetime import date
+
 from app.database import get_connection, date_subtract_days, date_format_convert
 from app.repositories import movimiento_repository as repo
 from app.utils.text import _norm
+from app.utils.streaming import TAMANO_LOTE, codificar_lotes
+from app.utils.cache import CacheGeneracional
+
+# Resúmenes por (días, fecha del cálculo); se descartan al cambiar los datos
+_cache_resumen = CacheGeneracional(maxsize=8)
 
 def get_movimiento(dias=30):
     fecha_desde = date_subtract_days(dias)
@@ -10,18 +17,30 @@ def get_movimiento(dias=30):
 
     with get_connection() as conn:
         return repo.fetch_movimiento(conn, fecha_col, fecha_desde)
+
+
+def stream_movimiento(dias=30, formato="ndjson", tamano_lote=TAMANO_LOTE):
+    """
+    Movimiento codificado por lotes (NDJSON o CSV) directo del cursor,
+    sin armar el DataFrame completo.
+    """
+    fecha_desde = date_subtract_days(dias)
+    fecha_col = date_format_convert("f_sistema")
+
+    with get_connection() as conn:
+        lotes = repo.fetch_movimiento(conn, fecha_col, fecha_desde, chunksize=tamano_lote)
+        yield from codificar_lotes(lotes, formato)
     
 
 def get_resumen_movimiento(dias=30):
-    df = get_movimiento(dias)
-
-    resumen = (
-        df.groupby(["tienda", "estado"])
-        .agg(
-            productos=("c_barra", "count"),
-            stock_total=("stock_actual", "sum")
-        )
-        .reset_index()
-    )
-
-    return resumen
\ No newline at end of file
+    """
+    Productos y stock por tienda y estado, agrupados en la base de datos.
+    """
+    def calcular():
+        fecha_desde = date_subtract_days(dias)
+        fecha_col = date_format_convert("f_sistema")
+
+        with get_connection() as conn:
+            return repo.fetch_resumen_movimiento(conn, fecha_col, fecha_desde)
+
+    return _cache_resumen.obtener((dias, date.today()), calcular).copy()
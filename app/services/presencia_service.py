@@ -0,0 +1,53 @@
+# presencia_service.py
+
+import pandas as pd
+
+from app.database import get_connection
+from app.repositories import presencia_repository as repo
+from app.utils.cache import CacheGeneracional
+from app.utils.presencia import IndicePresencia
+
+
+_cache_indice = CacheGeneracional(maxsize=1)
+_cache_config = CacheGeneracional(maxsize=1)
+
+
+def get_indice_presencia():
+    """
+    Índice de presencia producto × almacén de la generación de datos actual.
+    Se construye al cargar los CSV; si no existe aún, en la primera consulta.
+    """
+    return _cache_indice.obtener("presencia", construir_indice_presencia)
+
+
+def construir_indice_presencia():
+    with get_connection() as conn:
+        df = repo.fetch_presencia_saldos(conn)
+    return IndicePresencia.desde_saldos(df)
+
+
+def get_config_almacenes():
+    """raw_name y clean_name de config_tiendas, cacheados por generación de datos."""
+    def cargar():
+        with get_connection() as conn:
+            return repo.fetch_config_almacenes(conn)
+
+    return _cache_config.obtener("config", cargar)
+
+
+def tienda_por_almacen(config_tiendas=None):
+    """
+    d_almacen -> nombre de tienda como lo muestran los reportes
+    (clean_name si está configurada, si no el mismo d_almacen).
+
+    config_tiendas: DataFrame con raw_name y clean_name (el cacheado si no llega)
+    """
+    indice = get_indice_presencia()
+    if config_tiendas is None:
+        config_tiendas = get_config_almacenes()
+
+    limpio = dict(zip(config_tiendas["raw_name"], config_tiendas["clean_name"]))
+    return {
+        a: limpio[a] if pd.notna(limpio.get(a)) else a
+        for a in indice.almacenes
+    }
@@ -1,91 +1,239 @@
 # producto_service.py
 
+import numpy as np
 import pandas as pd
 from app.database import get_connection
 from app.repositories import producto_repository as repo
+from app.services.presencia_service import (
+    get_config_almacenes,
+    get_indice_presencia,
+    tienda_por_almacen,
+)
+from app.utils.cache import CacheGeneracional
+from app.utils.catalogo import CatalogoProductos
 from app.utils.text import _norm
 
 
+COLUMNAS_EXISTENCIA = ["tienda", "region", "stock_actual"]
+VENTANAS_DIAS = (30, 60, 90)
+VENTANAS = [f"en_{dias}" for dias in VENTANAS_DIAS]
+
+# Ventas del historial de la ficha (días y filas por código)
+DIAS_HISTORIAL = 30
+LIMITE_HISTORIAL = 50
+
+_cache_catalogo = CacheGeneracional(maxsize=1)
+
+
+def get_catalogo_productos():
+    """
+    Catálogo código -> (marca, color, fuente) de la generación de datos actual.
+    Se construye al cargar los CSV; si no existe aún, en la primera consulta.
+    """
+    return _cache_catalogo.obtener("catalogo", construir_catalogo_productos)
+
+
+def construir_catalogo_productos():
+    with get_connection() as conn:
+        df_saldos = repo.fetch_catalogo_saldos(conn)
+        df_bodega = repo.fetch_catalogo_bodega(conn)
+    return CatalogoProductos.desde_tablas(df_saldos, df_bodega)
+
+
 def get_consulta_producto(codigo_barras):
+    """
+    Ficha del producto: existencias, ventas por ventana, distribución por
+    tienda, historial y gráfico.
+    """
+    return get_consulta_productos([codigo_barras])[codigo_barras]
+
+
+def get_consulta_productos(codigos):
+    """
+    Ficha de varios productos a la vez: {codigo: ficha}, en el orden pedido.
+
+    Por cada lote de códigos, dos consultas: existencias y ventas agregadas
+    por código, tienda y día (ventanas de 30/60/90 días, ventas por tienda y
+    serie diaria salen de esas filas). El historial lista las últimas
+    LIMITE_HISTORIAL ventas por día y tienda. El índice de presencia se usa
+    para todo el lote junto.
+    """
+    codigos = list(dict.fromkeys(codigos))
+    if not codigos:
+        return {}
+
+    # Los códigos que no están en el catálogo no tienen ficha: no se consultan
+    catalogo = get_catalogo_productos()
+    conocidos = [c for c in codigos if c in catalogo]
+    if not conocidos:
+        return {c: _no_encontrado(c) for c in codigos}
 
     with get_connection() as conn:
-        df_info = repo.fetch_info_producto(conn, codigo_barras)
-
-        if df_info.empty:
-            df_info = repo.fetch_info_producto_bodega(conn, codigo_barras)
-            if df_info.empty:
-                return {
-                    "encontrado": False,
-                    "mensaje": f"No se encontró el código {codigo_barras}"
-                }
-
-        info = df_info.iloc[0].to_dict()
-
-        df_tiendas = repo.fetch_existencias_tiendas(conn, codigo_barras)
-        df_bodega = repo.fetch_existencias_bodega(conn, codigo_barras)
-
-        df_existencias = pd.concat([df_tiendas, df_bodega], ignore_index=True)
-
-        stock_total = int(df_existencias["stock_actual"].sum())
-        stock_bodega = int(df_bodega["stock_actual"].sum()) if not df_bodega.empty else 0
-        stock_tiendas = stock_total - stock_bodega
-
-        ventas_30 = int(repo.fetch_ventas_periodo(conn, codigo_barras, 30)["ventas"].iloc[0] or 0)
-        ventas_60 = int(repo.fetch_ventas_periodo(conn, codigo_barras, 60)["ventas"].iloc[0] or 0)
-        ventas_90 = int(repo.fetch_ventas_periodo(conn, codigo_barras, 90)["ventas"].iloc[0] or 0)
-
-        velocidad_dia = round(ventas_30 / 30, 2) if ventas_30 > 0 else 0
-        dias_agotar = int(stock_tiendas / velocidad_dia) if velocidad_dia > 0 else 999
-
-        ultima_venta = repo.fetch_ultima_venta(conn, codigo_barras)["ultima_venta"].iloc[0]
-
-        df_ventas_tienda = repo.fetch_ventas_por_tienda(conn, codigo_barras)
-        df_dist = df_tiendas.merge(df_ventas_tienda, on="tienda", how="left").fillna(0)
-
-        todas_tiendas = repo.fetch_todas_tiendas(conn)["tienda"].tolist()
-        tiendas_con_producto = df_tiendas["tienda"].tolist()
-        tiendas_sin_producto = [t for t in todas_tiendas if t not in tiendas_con_producto]
-
-        df_historial = repo.fetch_historial(conn, codigo_barras)
-        df_grafico = repo.fetch_grafico_ventas(conn, codigo_barras)
-
-        if velocidad_dia == 0:
-            texto, estado = "❌ Sin movimiento - Considerar redistribución", "sin_movimiento"
-        elif dias_agotar < 15:
-            texto, estado = f"🔴 URGENTE - Reabastecer ({dias_agotar} días)", "critico"
-        elif dias_agotar < 30:
-            texto, estado = f"🟡 Programar reabastecimiento ({dias_agotar} días)", "alerta"
-        else:
-            texto, estado = f"✅ Stock óptimo ({dias_agotar} días)", "optimo"
-
-        return {
-            "encontrado": True,
-            "info_general": {
-                "codigo": info["c_barra"],
-                "marca": info["d_marca"],
-                "color": info["color"],
-                "stock_total": stock_total,
-                "stock_bodega": stock_bodega,
-                "stock_tiendas": stock_tiendas,
-                "valor_inventario": None
-            },
-            "ventas": {
-                "ultimos_30_dias": ventas_30,
-                "ultimos_60_dias": ventas_60,
-                "ultimos_90_dias": ventas_90,
-                "velocidad_dia": velocidad_dia,
-                "dias_para_agotar": dias_agotar,
-                "ultima_fecha_venta": ultima_venta
-            },
-            "distribucion": df_dist.to_dict(orient="records"),
-            "tiendas_sin_producto": tiendas_sin_producto,
-            "historial": df_historial.to_dict(orient="records"),
-            "grafico_ventas": {
-                "fechas": df_grafico["fecha"].tolist(),
-                "valores": df_grafico["ventas"].astype(int).tolist()
-            },
-            "recomendacion": {
-                "texto": texto,
-                "estado": estado
-            }
-        }
\ No newline at end of file
+        df_tiendas, df_bodega = repo.fetch_existencias_productos(conn, conocidos)
+        df_ventas = repo.fetch_ventas_productos(conn, conocidos, VENTANAS_DIAS, DIAS_HISTORIAL)
+
+    # Ficha: primera fila de saldos del código; si solo está en bodega, sin marca
+    info = {
+        **_primera_fila(df_bodega),
+        **_primera_fila(df_tiendas),
+    }
+
+    stock_tiendas = _suma_por_codigo(df_tiendas, "stock_actual")
+    stock_bodega = _suma_por_codigo(df_bodega, "stock_actual")
+
+    ventas_ventana, ultima_venta, por_tienda, historial, grafico = _agregar_ventas(df_ventas)
+
+    df_dist = df_tiendas[["codigo"] + COLUMNAS_EXISTENCIA]
+    df_dist = df_dist.assign(ventas_30d=[
+        por_tienda.get(clave, np.nan) for clave in zip(df_dist["codigo"], df_dist["tienda"])
+    ]).fillna(0)
+    distribucion = _registros_por_codigo(df_dist)
+
+    config = get_config_almacenes()
+    todas_tiendas = list(dict.fromkeys(
+        t for t in config["clean_name"].dropna() if "BODEGA" not in t.upper()
+    ))
+    presencia = get_indice_presencia().matriz(codigos, tienda_por_almacen(config), todas_tiendas)
+
+    fichas = {}
+    for i, codigo in enumerate(codigos):
+        if codigo not in info:
+            fichas[codigo] = _no_encontrado(codigo)
+            continue
+
+        fichas[codigo] = _ficha(
+            info[codigo],
+            stock_tiendas.get(codigo, 0),
+            stock_bodega.get(codigo),
+            ventas_ventana.get(codigo, {}),
+            ultima_venta.get(codigo),
+            distribucion.get(codigo, []),
+            [t for t, esta in zip(todas_tiendas, presencia[i]) if not esta],
+            historial.get(codigo, []),
+            grafico.get(codigo, []),
+        )
+
+    return fichas
+
+
+def _no_encontrado(codigo):
+    return {
+        "encontrado": False,
+        "mensaje": f"No se encontró el código {codigo}"
+    }
+
+
+def _primera_fila(df):
+    primeras = {}
+    for codigo, c_barra, marca, color in zip(df["codigo"], df["c_barra"], df["d_marca"], df["color"]):
+        primeras.setdefault(codigo, {"c_barra": c_barra, "d_marca": marca, "color": color})
+    return primeras
+
+
+def _suma_por_codigo(df, columna):
+    """Suma de columna por código (sin nulos) como dict."""
+    sumas = {}
+    for codigo, valor in zip(df["codigo"], df[columna]):
+        if pd.notna(valor):
+            sumas[codigo] = sumas.get(codigo, 0) + valor
+    return sumas
+
+
+def _agregar_ventas(df_ventas):
+    """
+    Une en una pasada las filas de fetch_ventas_productos (código, tienda y
+    día): ventanas y última venta por código, ventas por (código, tienda),
+    historial por día y tienda (del más reciente, LIMITE_HISTORIAL filas) y
+    serie diaria por código.
+    """
+    ventanas, ultima_venta, por_tienda, dias = {}, {}, {}, {}
+    columnas = ["codigo", "tienda", "fecha", "cantidad", "en_tienda", "ultima_venta"] + VENTANAS
+    for codigo, tienda, fecha, cantidad, en_tienda, ultima, *en_ventanas in zip(
+        *(df_ventas[c] for c in columnas)
+    ):
+        acumulado = ventanas.setdefault(codigo, dict.fromkeys(VENTANAS, 0))
+        for ventana, valor in zip(VENTANAS, en_ventanas):
+            acumulado[ventana] += valor
+        if pd.notna(ultima) and (codigo not in ultima_venta or ultima > ultima_venta[codigo]):
+            ultima_venta[codigo] = ultima
+        por_tienda[(codigo, tienda)] = por_tienda.get((codigo, tienda), 0) + en_tienda
+        if pd.notna(fecha):
+            dias.setdefault(codigo, []).append((fecha, tienda, cantidad))
+
+    historial, grafico = {}, {}
+    for codigo, filas in dias.items():
+        # Día más reciente primero; en el mismo día, por tienda y cantidad mayor
+        filas.sort(key=lambda f: (f[1] is None, f[1] or "", -f[2]))
+        filas.sort(key=lambda f: f[0], reverse=True)
+        historial[codigo] = [
+            {"fecha": f, "tienda": t, "cantidad": c} for f, t, c in filas[:LIMITE_HISTORIAL]
+        ]
+        por_dia = {}
+        for f, _, c in filas:
+            por_dia[f] = por_dia.get(f, 0) + c
+        grafico[codigo] = [{"fecha": f, "cantidad": c} for f, c in sorted(por_dia.items())]
+
+    return ventanas, ultima_venta, por_tienda, historial, grafico
+
+
+def _registros_por_codigo(df):
+    """Filas de df como dicts (sin codigo), agrupadas por código en su orden."""
+    grupos = {}
+    for fila in df.to_dict(orient="records"):
+        grupos.setdefault(fila.pop("codigo"), []).append(fila)
+    return grupos
+
+
+def _ficha(info, stock_tiendas, stock_bodega, ventas, ultima_venta,
+           distribucion, tiendas_sin_producto, historial, grafico):
+    stock_bodega = int(stock_bodega) if stock_bodega is not None else 0
+    stock_total = int(stock_tiendas + stock_bodega)
+    stock_tiendas = stock_total - stock_bodega
+
+    ventas_30 = int(ventas.get("en_30", 0))
+    ventas_60 = int(ventas.get("en_60", 0))
+    ventas_90 = int(ventas.get("en_90", 0))
+
+    velocidad_dia = round(ventas_30 / 30, 2) if ventas_30 > 0 else 0
+    dias_agotar = int(stock_tiendas / velocidad_dia) if velocidad_dia > 0 else 999
+
+    if velocidad_dia == 0:
+        texto, estado = "❌ Sin movimiento - Considerar redistribución", "sin_movimiento"
+    elif dias_agotar < 15:
+        texto, estado = f"🔴 URGENTE - Reabastecer ({dias_agotar} días)", "critico"
+    elif dias_agotar < 30:
+        texto, estado = f"🟡 Programar reabastecimiento ({dias_agotar} días)", "alerta"
+    else:
+        texto, estado = f"✅ Stock óptimo ({dias_agotar} días)", "optimo"
+
+    return {
+        "encontrado": True,
+        "info_general": {
+            "codigo": info["c_barra"],
+            "marca": info["d_marca"],
+            "color": info["color"],
+            "stock_total": stock_total,
+            "stock_bodega": stock_bodega,
+            "stock_tiendas": stock_tiendas,
+            "valor_inventario": None
+        },
+        "ventas": {
+            "ultimos_30_dias": ventas_30,
+            "ultimos_60_dias": ventas_60,
+            "ultimos_90_dias": ventas_90,
+            "velocidad_dia": velocidad_dia,
+            "dias_para_agotar": dias_agotar,
+            "ultima_fecha_venta": ultima_venta
+        },
+        "distribucion": distribucion,
+        "tiendas_sin_producto": tiendas_sin_producto,
+        "historial": historial,
+        "grafico_ventas": {
+            "fechas": [g["fecha"] for g in grafico],
+            "valores": [int(g["cantidad"]) for g in grafico]
+        },
+        "recomendacion": {
+            "texto": texto,
+            "estado": estado
+        }
+    }
\ No newline at end of file
@@ -1,8 +1,31 @@
 # reabastecimiento_service.py
 
+import numpy as np
 import pandas as pd
-from app.database import get_connection, date_subtract_days, date_format_convert
-from app.utils.text import _norm
+from datetime import datetime, timedelta
+from app.database import get_connection, date_subtract_days, date_format_convert, date_literal
+from app.exceptions import InvalidDataError
+from app.repositories import reabastecimiento_repository as repo
+from app.services.presencia_service import get_indice_presencia, tienda_por_almacen
+from app.utils.procesos import mapear_en_procesos
+from app.utils.text import _norm, _norm_series
+
+
+COLUMNAS_SALIDA = [
+    "region", "tienda", "c_barra", "d_marca", "color",
+    "ventas_periodo", "stock_actual", "stock_bodega",
+    "stock_minimo_dinamico", "cantidad_a_despachar", "observacion"
+]
+
+# Cantidad por tipo cuando stock_minimo_config no la define
+STOCK_MIN_DEFAULTS = {
+    "fijo_especial": 8,
+    "fijo_normal": 5,
+    "multimarca": 2,
+    "jgl": 3,
+    "jgm": 3,
+    "default": 4,
+}
 
 
 def get_reabastecimiento_avanzado(
@@ -13,252 +36,457 @@ def get_reabastecimiento_avanzado(
     incluir_fijos=True,
     guardar_debug_csv=True,
     nuevos_codigos=None,
-    solo_con_ventas=False
+    solo_con_ventas=False,
+    particionar_por=None,
+    max_workers=None,
+    tiendas=None,
+    codigos=None,
+    fecha_inicio=None,
+    fecha_fin=None
 ):
     """
     Genera el reporte de reabastecimiento avanzado, expansión y nuevos códigos.
     Versión restaurada funcional (equivalente al backup original).
+
+    Con particionar_por="region" o "tienda" el cálculo se reparte por
+    partición en un pool de procesos (útil en corridas nacionales).
+    El resultado es el mismo que en modo secuencial.
+
+    Filtros (se aplican en las consultas, no sobre el resultado):
+        tiendas: nombres de tienda (limpio o raw, sin distinguir mayúsculas/tildes)
+        codigos: códigos de barra
+        fecha_inicio / fecha_fin: período DD/MM/YYYY; las ventanas de días
+            se cuentan hacia atrás desde fecha_fin y no pasan de fecha_inicio
     """
 
     if nuevos_codigos is None:
         nuevos_codigos = []
 
-    # =========================
-    # CARGA BASE DE DATOS
-    # =========================
+    codigos = [str(c).strip().upper() for c in codigos or [] if str(c).strip()]
+    ventanas, fecha_hasta = _ventanas_sql([dias_reab, dias_exp], fecha_inicio, fecha_fin)
+    codigos_expansion = None
+
     with get_connection() as conn:
-        df_cfg = pd.read_sql("SELECT tipo, cantidad FROM stock_minimo_config", conn)
-        cfg_map = {
-            str(r["tipo"]).lower(): int(r["cantidad"])
-            for _, r in df_cfg.iterrows()
-            if pd.notna(r["cantidad"])
-        }
-
-        referencias_fijas = pd.read_sql(
-            "SELECT cod_barras FROM referencias_fijas", conn
-        )["cod_barras"].dropna().astype(str).tolist()
-
-        marcas_multimarca = pd.read_sql(
-            "SELECT marca FROM marcas_multimarca", conn
-        )["marca"].dropna().astype(str).tolist()
-
-        codigos_excluidos = pd.read_sql(
-            "SELECT cod_barras FROM codigos_excluidos", conn
-        )["cod_barras"].dropna().astype(str).tolist()
-
-        config_tiendas = pd.read_sql(
-            "SELECT raw_name, clean_name, region, fija, tipo_tienda FROM config_tiendas",
-            conn
+        config_tiendas = repo.fetch_config_tiendas(conn)
+        tiendas = _resolver_tiendas(config_tiendas, tiendas)
+        datos = _cargar_datos(
+            conn, ventanas, fecha_hasta=fecha_hasta, tiendas=tiendas,
+            codigos=codigos, config_tiendas=config_tiendas
         )
 
-        # -------------------------
-        # REABASTECIMIENTO BASE
-        # -------------------------
-        fecha_desde_reab = date_subtract_days(dias_reab)
-        fecha_col = date_format_convert("h.f_sistema")
-
-        query = f"""
-        WITH base AS (
-            SELECT 
-                s.c_barra,
-                s.d_marca,
-                COALESCE(ct.clean_name, s.d_almacen) AS tienda,
-                s.d_color_proveedor AS color,
-                s.saldo_disponible AS stock_actual,
-                COALESCE(b.saldo_disponibles, 0) AS stock_bodega
-            FROM ventas_saldos_raw s
-            LEFT JOIN inventario_bodega_raw b ON s.c_barra = b.c_barra
-            LEFT JOIN config_tiendas ct ON s.d_almacen = ct.raw_name
-            WHERE s.c_barra NOT IN (SELECT cod_barras FROM codigos_excluidos)
-        ),
-        ventas_reab AS (
-            SELECT 
-                h.c_barra,
-                COALESCE(ct.clean_name, h.d_almacen) AS tienda,
-                SUM(h.cn_venta) AS ventas_periodo
-            FROM ventas_historico_raw h
-            LEFT JOIN config_tiendas ct ON h.d_almacen = ct.raw_name
-            WHERE {fecha_col} >= {fecha_desde_reab}
-            GROUP BY h.c_barra, tienda
+        # Las ventas leídas solo cubren las tiendas pedidas; la validez para
+        # expansión sigue dependiendo de las ventas de toda la cadena.
+        if tiendas:
+            codigos_expansion = repo.fetch_codigos_expansion(
+                conn, date_format_convert("h.f_sistema"), ventanas[dias_exp],
+                ventas_min_exp, fecha_hasta=fecha_hasta, codigos=codigos
+            )["c_barra"].astype(str).str.upper().unique()
+
+    ctx = _preparar_contexto(datos)
+
+    params = {
+        "dias_reab": dias_reab,
+        "dias_exp": dias_exp,
+        "ventas_min_exp": ventas_min_exp,
+        "excluir_sin_movimiento": excluir_sin_movimiento,
+        "incluir_fijos": incluir_fijos,
+        "nuevos_codigos": nuevos_codigos,
+        "codigos_expansion": codigos_expansion,
+    }
+
+    if particionar_por:
+        result = _calcular_en_paralelo(ctx, params, particionar_por, max_workers)
+    else:
+        result = _calcular_reabastecimiento(ctx, **params)
+
+    if guardar_debug_csv:
+        sin_region = result[result["region"] == "SIN REGION"][["tienda"]].drop_duplicates()
+        if not sin_region.empty:
+            sin_region.to_csv("tiendas_sin_region.csv", index=False, encoding="utf-8-sig")
+
+    if solo_con_ventas:
+        result = _filtrar_solo_con_ventas(result)
+
+    return result
+
+
+def evaluar_escenarios_reabastecimiento(
+    escenarios,
+    excluir_sin_movimiento=True,
+    incluir_fijos=True,
+    solo_con_ventas=False
+):
+    """
+    Evalúa varias combinaciones de parámetros (what-if) sobre las mismas lecturas.
+
+    Saldos, configuración y existencias se leen una sola vez, y las ventas
+    de todas las ventanas de días salen de un único recorrido del histórico.
+    Cada escenario solo repite el cálculo en memoria.
+
+    Args:
+        escenarios: lista de dicts con dias_reab, dias_exp y ventas_min_exp
+
+    Returns:
+        Lista de dicts con los parámetros y totales de cada escenario.
+    """
+    ventanas = set()
+    for esc in escenarios:
+        ventanas.update((esc["dias_reab"], esc["dias_exp"]))
+
+    with get_connection() as conn:
+        datos = _cargar_datos(conn, _ventanas_sql(ventanas)[0])
+
+    ctx = _preparar_contexto(datos)
+
+    resultados = []
+    for esc in escenarios:
+        df = _calcular_reabastecimiento(
+            ctx,
+            dias_reab=esc["dias_reab"],
+            dias_exp=esc["dias_exp"],
+            ventas_min_exp=esc["ventas_min_exp"],
+            excluir_sin_movimiento=excluir_sin_movimiento,
+            incluir_fijos=incluir_fijos,
         )
-        SELECT 
-            base.c_barra,
-            base.d_marca,
-            base.tienda,
-            base.color,
-            base.stock_actual,
-            base.stock_bodega,
-            COALESCE(v.ventas_periodo, 0) AS ventas_periodo
-        FROM base
-        LEFT JOIN ventas_reab v
-            ON base.c_barra = v.c_barra AND base.tienda = v.tienda;
-        """
-        df = pd.read_sql(query, conn)
-
-        # -------------------------
-        # EXPANSIÓN (VENTAS LARGAS)
-        # -------------------------
-        fecha_desde_exp = date_subtract_days(dias_exp)
-        query_exp = f"""
-        SELECT 
-            h.c_barra,
-            COALESCE(ct.clean_name, h.d_almacen) AS tienda,
-            SUM(h.cn_venta) AS ventas_expansion
-        FROM ventas_historico_raw h
-        LEFT JOIN config_tiendas ct ON h.d_almacen = ct.raw_name
-        WHERE {fecha_col} >= {fecha_desde_exp}
-        GROUP BY h.c_barra, tienda
-        """
-        df_exp = pd.read_sql(query_exp, conn)
-
-        tiendas_all = config_tiendas["clean_name"].dropna().unique().tolist()
+        if solo_con_ventas:
+            df = _filtrar_solo_con_ventas(df)
+
+        compra = df["observacion"] == "COMPRA"
+        expansion = df["observacion"] == "EXPANSION"
+
+        resultados.append({
+            "dias_reab": esc["dias_reab"],
+            "dias_exp": esc["dias_exp"],
+            "ventas_min_exp": esc["ventas_min_exp"],
+            "total_items": len(df),
+            "unidades_despachar": int(df["cantidad_a_despachar"].sum()),
+            "items_reabastecer": int((df["observacion"] == "REABASTECER").sum()),
+            "items_compra": int(compra.sum()),
+            "unidades_compra": int(df.loc[compra, "cantidad_a_despachar"].sum()),
+            "items_expansion": int(expansion.sum()),
+            "codigos_expansion": int(df.loc[expansion, "c_barra"].nunique()),
+            "unidades_expansion": int(df.loc[expansion, "cantidad_a_despachar"].sum()),
+        })
+
+    return resultados
+
+
+# Campos de ReabastecimientoItem y su valor por defecto si el reporte no trae la columna
+CAMPOS_ITEM = {
+    "tienda": "",
+    "producto": "",
+    "descripcion": "",
+    "stock_actual": 0,
+    "venta_promedio": 0.0,
+    "dias_stock_actual": 0.0,
+    "necesidad": 0,
+}
+
+
+def construir_items_respuesta(df):
+    """
+    Arma los items de ReabastecimientoItem y el resumen por tienda
+    de forma vectorizada (sin iterar filas).
 
-    # =========================
-    # NORMALIZACIÓN
-    # =========================
-    config_tiendas["clean_norm"] = config_tiendas["clean_name"].fillna("").apply(_norm)
+    Returns:
+        (DataFrame de items, dict resumen_por_tienda)
+    """
+    items = pd.DataFrame(index=df.index)
+    for campo, defecto in CAMPOS_ITEM.items():
+        col = df[campo] if campo in df.columns else pd.Series(defecto, index=df.index)
+        if isinstance(defecto, str):
+            items[campo] = col.astype(str)
+        elif isinstance(defecto, int):
+            items[campo] = col.fillna(0).astype("int64")
+        else:
+            items[campo] = col.fillna(0).astype("float64")
+
+    dias = df["dias_stock_actual"] if "dias_stock_actual" in df.columns else items["dias_stock_actual"]
+    items["prioridad"] = np.select([dias < 3, dias < 7], ["ALTA", "MEDIA"], default="BAJA")
+
+    necesidad = items["necesidad"]
+    resumen = (
+        items.assign(
+            con_necesidad=(necesidad > 0).astype("int64"),
+            unidades=necesidad.where(necesidad > 0, 0),
+        )
+        .groupby("tienda", sort=False)
+        .agg(
+            total_productos=("tienda", "size"),
+            productos_con_necesidad=("con_necesidad", "sum"),
+            unidades_necesarias=("unidades", "sum"),
+        )
+    )
+    resumen_por_tienda = {
+        tienda: {k: int(v) for k, v in fila.items()}
+        for tienda, fila in resumen.to_dict(orient="index").items()
+    }
+
+    return items.reset_index(drop=True), resumen_por_tienda
+
+
+# =========================
+# CARGA BASE DE DATOS
+# =========================
+
+def _cargar_datos(conn, ventanas, fecha_hasta=None, tiendas=None, codigos=None, config_tiendas=None):
+    """
+    Lee todo lo que necesita el cálculo; las ventas salen de un solo recorrido.
+
+    Args:
+        ventanas: dict {dias: expresión SQL de fecha desde} (ver _ventanas_sql)
+        tiendas / codigos: limitan saldos, ventas y existencias a ese subconjunto
+    """
+    fecha_col = date_format_convert("h.f_sistema")
+    if config_tiendas is None:
+        config_tiendas = repo.fetch_config_tiendas(conn)
+
+    return {
+        "df_cfg": repo.fetch_stock_minimo_config(conn),
+        "referencias_fijas": repo.fetch_referencias_fijas(conn)["cod_barras"].dropna().astype(str).tolist(),
+        "marcas_multimarca": repo.fetch_marcas_multimarca(conn)["marca"].dropna().astype(str).tolist(),
+        "codigos_excluidos": repo.fetch_codigos_excluidos(conn)["cod_barras"].dropna().astype(str).tolist(),
+        "config_tiendas": config_tiendas,
+        "tiendas_filtro": tiendas,
+        "saldos": repo.fetch_saldos_reabastecimiento(conn, tiendas=tiendas, codigos=codigos),
+        "ventas": repo.fetch_ventas_ventanas(
+            conn, fecha_col, ventanas, fecha_hasta=fecha_hasta, tiendas=tiendas, codigos=codigos
+        ),
+        "info_ref": repo.fetch_info_referencias(conn, codigos=codigos),
+        "indice_presencia": get_indice_presencia(),
+        "tienda_por_almacen": tienda_por_almacen(config_tiendas),
+    }
+
+
+def _ventanas_sql(dias, fecha_inicio=None, fecha_fin=None):
+    """
+    Expresión SQL de "fecha desde" por ventana de días.
+
+    Sin período se cuenta desde hoy. Con fecha_fin las ventanas se cuentan
+    desde esa fecha (que también queda como límite superior) y con
+    fecha_inicio ninguna ventana empieza antes de ella.
+
+    Returns:
+        (dict {dias: fecha desde}, fecha hasta o None)
+    """
+    dias = sorted(set(dias))
+    if not fecha_inicio and not fecha_fin:
+        return {d: date_subtract_days(d) for d in dias}, None
+
+    referencia = _parsear_fecha(fecha_fin, "fecha_fin") if fecha_fin else datetime.now()
+    inicio = _parsear_fecha(fecha_inicio, "fecha_inicio") if fecha_inicio else None
+
+    ventanas = {}
+    for d in dias:
+        desde = referencia - timedelta(days=d)
+        if inicio and inicio > desde:
+            desde = inicio
+        ventanas[d] = date_literal(desde)
+
+    return ventanas, date_literal(referencia) if fecha_fin else None
+
+
+def _parsear_fecha(valor, campo):
+    """Fecha DD/MM/YYYY; lanza InvalidDataError si no tiene ese formato."""
+    try:
+        return datetime.strptime(valor, "%d/%m/%Y")
+    except (TypeError, ValueError):
+        raise InvalidDataError("Fecha debe estar en formato DD/MM/YYYY", field=campo, value=valor)
+
+
+def _resolver_tiendas(config_tiendas, tiendas):
+    """
+    Traduce los nombres pedidos al nombre con que aparece la tienda en el
+    reporte (clean_name si está configurada). Acepta clean_name o raw_name
+    sin distinguir mayúsculas ni tildes; los nombres desconocidos se
+    conservan tal cual (tiendas sin configurar).
+    """
+    if not tiendas:
+        return None
+
+    buscadas = {_norm(t) for t in tiendas}
+    limpio = config_tiendas["clean_name"].fillna("")
+    coincide = (
+        _norm_series(limpio).isin(buscadas)
+        | _norm_series(config_tiendas["raw_name"].fillna("")).isin(buscadas)
+    )
+
+    return sorted(set(limpio[coincide & (limpio != "")]) | set(tiendas))
+
+
+# =========================
+# NORMALIZACIÓN
+# =========================
+
+def _preparar_contexto(datos):
+    """Calcula una sola vez todo lo que no depende de los parámetros del reporte."""
+    df_cfg = datos["df_cfg"]
+    cfg_map = {
+        str(t).lower(): int(c)
+        for t, c in zip(df_cfg["tipo"], df_cfg["cantidad"])
+        if pd.notna(c)
+    }
+
+    config_tiendas = datos["config_tiendas"].copy()
+    config_tiendas["clean_norm"] = _norm_series(config_tiendas["clean_name"].fillna(""))
     region_map = dict(zip(config_tiendas["clean_norm"], config_tiendas["region"]))
     tiendas_fijas_set = set(
         config_tiendas.loc[config_tiendas["fija"] == 1, "clean_name"].apply(_norm)
     )
 
-    df["tienda_norm"] = df["tienda"].fillna("").apply(_norm)
-    df["region"] = df["tienda_norm"].map(region_map).fillna("SIN REGION")
-
-    df = df[~df["tienda"].str.contains("bodega jagi", case=False, na=False)]
+    tiendas_all = config_tiendas["clean_name"].dropna().unique().tolist()
     tiendas_all = [t for t in tiendas_all if "bodega jagi" not in t.lower()]
 
-    ref_set = set(r.strip().upper() for r in referencias_fijas if r)
-    marca_set = set(m.strip().upper() for m in marcas_multimarca if m)
-
-    # =========================
-    # STOCK MÍNIMO DINÁMICO
-    # =========================
-    def calcular_stock_min(row):
-        tienda_norm = _norm(row["tienda"])
-        code = str(row["c_barra"]).upper()
-        marca = str(row["d_marca"]).upper()
-
-        if code in ref_set:
-            return cfg_map.get("fijo_especial", 8) if tienda_norm in tiendas_fijas_set else cfg_map.get("fijo_normal", 5)
-        if marca in marca_set:
-            return cfg_map.get("multimarca", 2)
-        if "JGL" in code or "JGL" in marca:
-            return cfg_map.get("jgl", 3)
-        if "JGM" in code or "JGM" in marca:
-            return cfg_map.get("jgm", 3)
-        return cfg_map.get("default", 4)
-
-    df["stock_minimo_dinamico"] = df.apply(calcular_stock_min, axis=1)
-
-    df["cantidad_a_despachar"] = df.apply(
-        lambda r: max(r["stock_minimo_dinamico"] - (r["stock_actual"] or 0), 0)
-        if (r["ventas_periodo"] > 0 or str(r["c_barra"]).upper() in ref_set)
-        else 0,
-        axis=1
+    ref_set = set(r.strip().upper() for r in datos["referencias_fijas"] if r)
+    marca_set = set(m.strip().upper() for m in datos["marcas_multimarca"] if m)
+
+    # -------------------------
+    # BASE (SALDOS) + STOCK MÍNIMO
+    # -------------------------
+    base = datos["saldos"]
+    base["tienda_norm"] = _norm_series(base["tienda"].fillna(""))
+    base["region"] = base["tienda_norm"].map(region_map).fillna("SIN REGION")
+    base = base[~base["tienda"].str.contains("bodega jagi", case=False, na=False)].copy()
+
+    base["c_barra_up"] = base["c_barra"].astype(str).str.upper()
+    tipos = _tipo_stock_minimo(
+        base["c_barra_up"],
+        base["d_marca"].astype(str).str.upper(),
+        base["tienda_norm"].isin(tiendas_fijas_set),
+        ref_set,
+        marca_set,
     )
+    base["stock_minimo_dinamico"] = pd.Series(tipos, index=base.index).map(
+        {t: cfg_map.get(t, cantidad) for t, cantidad in STOCK_MIN_DEFAULTS.items()}
+    )
+    base["es_fijo"] = base["c_barra_up"].isin(ref_set)
+
+    # -------------------------
+    # TIENDAS DESTINO (EXPANSIÓN / NUEVOS)
+    # -------------------------
+    tiendas_destino = pd.DataFrame({"tienda": tiendas_all})
+    tiendas_destino["tienda_norm"] = tiendas_destino["tienda"].apply(_norm)
+    tiendas_destino["region"] = tiendas_destino["tienda_norm"].map(
+        lambda t: region_map.get(t, "SIN REGION")
+    )
+    tiendas_destino["fija"] = tiendas_destino["tienda_norm"].isin(tiendas_fijas_set)
+    if datos.get("tiendas_filtro"):
+        filtro_norm = {_norm(t) for t in datos["tiendas_filtro"]}
+        tiendas_destino = tiendas_destino[tiendas_destino["tienda_norm"].isin(filtro_norm)]
+
+    # Almacén (d_almacen) -> tienda normalizada, para leer el índice de presencia
+    norm_por_almacen = {a: _norm(t) for a, t in datos["tienda_por_almacen"].items()}
+
+    info_ref = datos["info_ref"].copy()
+    info_ref["c_barra_up"] = info_ref["c_barra"].astype(str).str.upper()
+    info_ref = info_ref.drop_duplicates("c_barra_up").set_index("c_barra_up")
+
+    ventas = datos["ventas"]
+    ventas = ventas[ventas["c_barra"].notna() & ventas["tienda"].notna()].copy()
+    ventas["tienda_norm"] = _norm_series(ventas["tienda"])
+
+    return {
+        "cfg_map": cfg_map,
+        "ref_set": ref_set,
+        "marca_set": marca_set,
+        "codigos_excluidos": datos["codigos_excluidos"],
+        "tiendas_destino": tiendas_destino,
+        "base": base,
+        "ventas": ventas,
+        "info_ref": info_ref,
+        "indice_presencia": datos["indice_presencia"],
+        "norm_por_almacen": norm_por_almacen,
+    }
+
+
+# =========================
+# STOCK MÍNIMO DINÁMICO
+# =========================
+
+def _tipo_stock_minimo(codigos_up, marcas_up, tienda_fija, ref_set, marca_set):
+    """Tipo de stock mínimo por fila (misma precedencia que la regla original)."""
+    es_ref = codigos_up.isin(ref_set)
+    return np.select(
+        [
+            es_ref & tienda_fija,
+            es_ref,
+            marcas_up.isin(marca_set),
+            codigos_up.str.contains("JGL", regex=False) | marcas_up.str.contains("JGL", regex=False),
+            codigos_up.str.contains("JGM", regex=False) | marcas_up.str.contains("JGM", regex=False),
+        ],
+        ["fijo_especial", "fijo_normal", "multimarca", "jgl", "jgm"],
+        default="default",
+    )
+
 
-    df["observacion"] = df.apply(
-        lambda r: "OK"
-        if r["cantidad_a_despachar"] == 0
-        else "COMPRA"
-        if r["cantidad_a_despachar"] > (r["stock_bodega"] or 0)
-        else "REABASTECER",
-        axis=1
+# =========================
+# CÁLCULO
+# =========================
+
+def _calcular_reabastecimiento(
+    ctx,
+    dias_reab,
+    dias_exp,
+    ventas_min_exp,
+    excluir_sin_movimiento=True,
+    incluir_fijos=True,
+    nuevos_codigos=None,
+    codigos_expansion=None,
+):
+    """Reabastecimiento + expansión + nuevos códigos para un juego de parámetros."""
+    cfg_map = ctx["cfg_map"]
+    ventas = ctx["ventas"]
+
+    # -------------------------
+    # REABASTECIMIENTO BASE
+    # -------------------------
+    ventas_reab = ventas.loc[
+        ventas[f"ventas_{dias_reab}"].notna(), ["c_barra", "tienda", f"ventas_{dias_reab}"]
+    ].rename(columns={f"ventas_{dias_reab}": "ventas_periodo"})
+
+    df = ctx["base"].merge(ventas_reab, on=["c_barra", "tienda"], how="left")
+    df["ventas_periodo"] = df["ventas_periodo"].fillna(0)
+
+    con_demanda = (df["ventas_periodo"] > 0) | df["es_fijo"]
+    df["cantidad_a_despachar"] = np.where(
+        con_demanda,
+        (df["stock_minimo_dinamico"] - df["stock_actual"].fillna(0)).clip(lower=0),
+        0,
+    )
+    df["observacion"] = np.select(
+        [
+            df["cantidad_a_despachar"] == 0,
+            df["cantidad_a_despachar"] > df["stock_bodega"].fillna(0),
+        ],
+        ["OK", "COMPRA"],
+        default="REABASTECER",
     )
 
     if excluir_sin_movimiento:
         if incluir_fijos:
-            df = df[(df["ventas_periodo"] > 0) | (df["c_barra"].str.upper().isin(ref_set))]
+            df = df[(df["ventas_periodo"] > 0) | df["es_fijo"]]
         else:
             df = df[df["ventas_periodo"] > 0]
 
-    # =========================
-    # EXPANSIÓN (LÓGICA COMPLETA)
-    # =========================
-    with get_connection() as conn:
-        info_ref = pd.read_sql("""
-            SELECT DISTINCT c_barra, d_marca, d_color_proveedor AS color
-            FROM ventas_saldos_raw
-            WHERE c_barra IS NOT NULL
-        """, conn)
-
-        df_existencias = pd.read_sql("""
-            SELECT DISTINCT 
-                COALESCE(ct.clean_name, s.d_almacen) AS tienda,
-                s.c_barra,
-                s.saldo_disponible
-            FROM ventas_saldos_raw s
-            LEFT JOIN config_tiendas ct ON s.d_almacen = ct.raw_name
-        """, conn)
-
-    df_existencias["tienda_norm"] = df_existencias["tienda"].apply(_norm)
-    df_existencias["c_barra_up"] = df_existencias["c_barra"].astype(str).str.upper()
-    existentes_fisicos = set(zip(df_existencias["tienda_norm"], df_existencias["c_barra_up"]))
-
-    df_exp_validas = df_exp[df_exp["ventas_expansion"] >= ventas_min_exp].copy()
-    df_exp_validas = df_exp_validas[~df_exp_validas["c_barra"].isin(codigos_excluidos)]
-    df_exp_validas["c_barra_up"] = df_exp_validas["c_barra"].astype(str).str.upper()
-
-    exp_rows = []
-
-    for code in df_exp_validas["c_barra_up"].unique():
-        tiendas_con_venta = df_exp_validas.loc[
-            df_exp_validas["c_barra_up"] == code, "tienda"
-        ].dropna().unique().tolist()
-        tiendas_con_venta_norm = [_norm(t) for t in tiendas_con_venta]
-
-        info = info_ref[info_ref["c_barra"].astype(str).str.upper() == code]
-        d_marca_val = info["d_marca"].iloc[0] if not info.empty else "SIN MARCA"
-        color_val = info["color"].iloc[0] if not info.empty else "SIN COLOR"
-
-        for tienda in tiendas_all:
-            tienda_norm = _norm(tienda)
-            if tienda_norm in tiendas_con_venta_norm:
-                continue
-            if (tienda_norm, code) in existentes_fisicos:
-                continue
-
-            if code in ref_set:
-                tipo = "fijo_especial" if tienda_norm in tiendas_fijas_set else "fijo_normal"
-            elif d_marca_val.upper() in marca_set:
-                tipo = "multimarca"
-            elif "JGL" in code or "JGL" in d_marca_val.upper():
-                tipo = "jgl"
-            elif "JGM" in code or "JGM" in d_marca_val.upper():
-                tipo = "jgm"
-            else:
-                tipo = "default"
-
-            stock_min = cfg_map.get(tipo, 4)
-
-            exp_rows.append({
-                "region": region_map.get(tienda_norm, "SIN REGION"),
-                "tienda": tienda,
-                "c_barra": code,
-                "d_marca": d_marca_val,
-                "color": color_val,
-                "ventas_periodo": 0,
-                "stock_actual": 0,
-                "stock_bodega": 0,
-                "stock_minimo_dinamico": stock_min,
-                "cantidad_a_despachar": stock_min,
-                "observacion": "EXPANSION"
-            })
-
-    if exp_rows:
-        df = pd.concat([df, pd.DataFrame(exp_rows)], ignore_index=True)
+    partes = [df]
 
-    # =========================
+    # -------------------------
+    # EXPANSIÓN (VENTAS LARGAS)
+    # -------------------------
+    df_exp = _calcular_expansion(ctx, dias_exp, ventas_min_exp, codigos_expansion)
+    if not df_exp.empty:
+        partes.append(df_exp)
+
+    # -------------------------
     # NUEVOS CÓDIGOS
-    # =========================
+    # -------------------------
     if nuevos_codigos:
         nuevos_rows = []
+        tiendas = ctx["tiendas_destino"]
         for c in nuevos_codigos:
-            for tienda in tiendas_all:
-                tienda_norm = _norm(tienda)
+            for tienda, region in zip(tiendas["tienda"], tiendas["region"]):
                 nuevos_rows.append({
-                    "region": region_map.get(tienda_norm, "SIN REGION"),
+                    "region": region,
                     "tienda": tienda,
                     "c_barra": c.get("c_barra"),
                     "d_marca": c.get("d_marca", "SIN MARCA"),
@@ -270,31 +498,166 @@ def get_reabastecimiento_avanzado(
                     "cantidad_a_despachar": cfg_map.get("general", 4),
                     "observacion": "NUEVO"
                 })
-        df = pd.concat([df, pd.DataFrame(nuevos_rows)], ignore_index=True)
+        partes.append(pd.DataFrame(nuevos_rows))
 
     # =========================
     # SALIDA FINAL
     # =========================
+    df = pd.concat(partes, ignore_index=True) if len(partes) > 1 else df
     df = df[df["observacion"] != "OK"]
     df = df.sort_values(by=["region", "tienda", "d_marca", "c_barra"])
 
-    columnas = [
-        "region", "tienda", "c_barra", "d_marca", "color",
-        "ventas_periodo", "stock_actual", "stock_bodega",
-        "stock_minimo_dinamico", "cantidad_a_despachar", "observacion"
-    ]
+    return df[COLUMNAS_SALIDA].copy()
 
-    result = df[columnas].copy()
 
-    if guardar_debug_csv:
-        sin_region = result[result["region"] == "SIN REGION"][["tienda"]].drop_duplicates()
-        if not sin_region.empty:
-            sin_region.to_csv("tiendas_sin_region.csv", index=False, encoding="utf-8-sig")
+def _calcular_expansion(ctx, dias_exp, ventas_min_exp, codigos=None):
+    """
+    Códigos con ventas largas sugeridos a tiendas que no los venden ni los tienen.
+    Se arma como producto cruzado (código × tienda) con anti-join, en vez de
+    recorrer código por código.
 
-    if solo_con_ventas:
-        result = result[
-            (result["ventas_periodo"] > 0)
-            | (result["observacion"].isin(["EXPANSION", "NUEVO"]))
-        ]
+    codigos permite pasar la lista global de códigos válidos cuando el
+    contexto solo trae las ventas de una partición.
+    """
+    validas = _ventas_expansion_validas(ctx["ventas"], dias_exp, ventas_min_exp, ctx["codigos_excluidos"])
+    if codigos is None:
+        codigos = validas["c_barra_up"].unique()
+    if len(codigos) == 0:
+        return pd.DataFrame()
+
+    con_venta = pd.MultiIndex.from_arrays([validas["c_barra_up"], validas["tienda_norm"]]).unique()
+
+    codigos = pd.DataFrame({"c_barra": codigos})
+    info = ctx["info_ref"].reindex(codigos["c_barra"])
+    con_info = codigos["c_barra"].isin(ctx["info_ref"].index).to_numpy()
+    codigos["d_marca"] = np.where(con_info, info["d_marca"].to_numpy(), "SIN MARCA")
+    codigos["color"] = np.where(con_info, info["color"].to_numpy(), "SIN COLOR")
+
+    # Código ya presente físicamente en la tienda (índice de presencia),
+    # en el mismo orden del producto cruzado: código × tienda destino
+    destino_norm = ctx["tiendas_destino"]["tienda_norm"]
+    norms = destino_norm.unique()
+    existe = ctx["indice_presencia"].matriz(
+        codigos["c_barra"], ctx["norm_por_almacen"], norms
+    )[:, pd.Index(norms).get_indexer(destino_norm)]
+
+    cand = codigos.merge(ctx["tiendas_destino"], how="cross")
+    descartar = (
+        pd.MultiIndex.from_arrays([cand["c_barra"], cand["tienda_norm"]]).isin(con_venta)
+        | existe.ravel()
+    )
+    cand = cand[~descartar]
+    if cand.empty:
+        return pd.DataFrame()
+
+    tipos = _tipo_stock_minimo(
+        cand["c_barra"],
+        cand["d_marca"].astype(str).str.upper(),
+        cand["fija"],
+        ctx["ref_set"],
+        ctx["marca_set"],
+    )
+    cfg_map = ctx["cfg_map"]
+    stock_min = pd.Series(tipos, index=cand.index).map(
+        {t: cfg_map.get(t, 4) for t in STOCK_MIN_DEFAULTS}
+    )
+
+    return pd.DataFrame({
+        "region": cand["region"],
+        "tienda": cand["tienda"],
+        "c_barra": cand["c_barra"],
+        "d_marca": cand["d_marca"],
+        "color": cand["color"],
+        "ventas_periodo": 0,
+        "stock_actual": 0,
+        "stock_bodega": 0,
+        "stock_minimo_dinamico": stock_min,
+        "cantidad_a_despachar": stock_min,
+        "observacion": "EXPANSION",
+    })
+
+
+# =========================
+# EJECUCIÓN PARTICIONADA
+# =========================
+
+PARTICIONES_VALIDAS = ("region", "tienda")
+
+
+def _calcular_en_paralelo(ctx, params, particionar_por, max_workers=None):
+    """
+    Reparte el cálculo por región o tienda en el pool de procesos compartido.
+
+    Cada tarea lleva solo el contexto de su partición (saldos, tiendas
+    destino y ventas de sus tiendas). Los resultados se unen y se reordenan
+    con el mismo criterio de la salida secuencial.
+    """
+    if particionar_por not in PARTICIONES_VALIDAS:
+        raise ValueError(
+            f"particionar_por inválido: '{particionar_por}'. "
+            f"Valores permitidos: {', '.join(PARTICIONES_VALIDAS)}"
+        )
+
+    # Particiones más grandes primero para balancear la carga
+    tamanos = pd.concat([
+        ctx["base"][particionar_por],
+        ctx["tiendas_destino"][particionar_por],
+    ]).value_counts(dropna=False)
+    particiones = tamanos.index.tolist()
+
+    if len(particiones) <= 1 or max_workers == 1:
+        return _calcular_reabastecimiento(ctx, **params)
+
+    # Los códigos válidos para expansión dependen de las ventas de toda la
+    # cadena; cada partición solo recibe las ventas de sus propias tiendas.
+    if params.get("codigos_expansion") is None:
+        validas = _ventas_expansion_validas(
+            ctx["ventas"], params["dias_exp"], params["ventas_min_exp"], ctx["codigos_excluidos"]
+        )
+        params = dict(params, codigos_expansion=validas["c_barra_up"].unique())
 
-    return result
\ No newline at end of file
+    partes = mapear_en_procesos(
+        _calcular_particion,
+        [_contexto_particion(ctx, particionar_por, valor) for valor in particiones],
+        [params] * len(particiones),
+        max_workers=max_workers,
+    )
+
+    partes = [p for p in partes if not p.empty]
+    if not partes:
+        return pd.DataFrame(columns=COLUMNAS_SALIDA)
+
+    df = pd.concat(partes, ignore_index=True)
+    return df.sort_values(by=["region", "tienda", "d_marca", "c_barra"])
+
+
+def _contexto_particion(ctx, columna, valor):
+    base = ctx["base"][ctx["base"][columna].isin([valor])]
+    destino = ctx["tiendas_destino"][ctx["tiendas_destino"][columna].isin([valor])]
+    tiendas_norm = set(base["tienda_norm"]) | set(destino["tienda_norm"])
+
+    return dict(
+        ctx,
+        base=base,
+        tiendas_destino=destino,
+        ventas=ctx["ventas"][ctx["ventas"]["tienda_norm"].isin(tiendas_norm)],
+    )
+
+
+def _calcular_particion(ctx_particion, params):
+    return _calcular_reabastecimiento(ctx_particion, **params)
+
+
+def _ventas_expansion_validas(ventas, dias_exp, ventas_min_exp, codigos_excluidos):
+    validas = ventas[
+        (ventas[f"ventas_{dias_exp}"] >= ventas_min_exp)
+        & ~ventas["c_barra"].isin(codigos_excluidos)
+    ]
+    return validas.assign(c_barra_up=validas["c_barra"].astype(str).str.upper())
+
+
+def _filtrar_solo_con_ventas(result):
+    return result[
+        (result["ventas_periodo"] > 0)
+        | (result["observacion"].isin(["EXPANSION", "NUEVO"]))
+    ]
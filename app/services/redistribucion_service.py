@@ -1,14 +1,76 @@
 # redistribucion_service.py
 
+import numpy as np
 import pandas as pd
+from datetime import date
+from itertools import groupby
 
 from app.database import get_connection, date_subtract_days, date_format_convert
 from app.repositories import redistribucion_repository as repo
-from app.utils.text import _norm
+from app.utils.cache import CacheGeneracional
+from app.utils.procesos import mapear_en_procesos
+from app.utils.text import _norm, _norm_series
 
 
-def get_redistribucion_regional(dias=30, ventas_min=1, tienda_origen=None):
+MODOS_REDISTRIBUCION = ("regional", "optimo")
 
+# Costo por unidad cuando costos_traslado no define el par de regiones
+COSTO_MISMA_REGION = 1
+COSTO_OTRA_REGION = 5
+
+# Por debajo de esta cantidad de códigos no vale la pena abrir el pool
+MIN_CODIGOS_PARALELO = 500
+
+# Plan completo (todos los orígenes) por (dias, ventas_min, modo, fecha)
+_cache_planes = CacheGeneracional(maxsize=8)
+
+
+def get_redistribucion_regional(dias=30, ventas_min=1, tienda_origen=None, modo="regional", max_workers=None):
+    """
+    Sugiere traslados de tiendas con excedente sin ventas hacia tiendas
+    con faltante que sí venden.
+
+    modo="regional": solo dentro de la misma región (asignación greedy).
+    modo="optimo": toda la cadena; por código se resuelve un flujo de costo
+        mínimo (máxima necesidad cubierta al menor costo de traslado según
+        costos_traslado). Los códigos se reparten en un pool de procesos.
+
+    El plan de toda la cadena se calcula una vez por (dias, ventas_min, modo)
+    y generación de datos; con tienda_origen se retorna su parte del plan.
+    """
+    if modo not in MODOS_REDISTRIBUCION:
+        raise ValueError(
+            f"modo inválido: '{modo}'. "
+            f"Valores permitidos: {', '.join(MODOS_REDISTRIBUCION)}"
+        )
+
+    plan = _cache_planes.obtener(
+        (dias, ventas_min, modo, date.today()),
+        lambda: _plan_por_origen(dias, ventas_min, modo, max_workers),
+    )
+
+    if tienda_origen:
+        df = plan["por_origen"].get(_norm(tienda_origen))
+        return df.copy() if df is not None else pd.DataFrame()
+
+    return plan["completo"].copy()
+
+
+def _plan_por_origen(dias, ventas_min, modo, max_workers=None):
+    """Plan completo y su índice por tienda origen (normalizada)."""
+    completo = _calcular_redistribucion(dias, ventas_min, modo, max_workers)
+    if completo.empty:
+        return {"completo": completo, "por_origen": {}}
+
+    origen_norm = _norm_series(completo["tienda_origen"])
+    por_origen = {
+        t: grupo.reset_index(drop=True)
+        for t, grupo in completo.groupby(origen_norm, sort=False)
+    }
+    return {"completo": completo, "por_origen": por_origen}
+
+
+def _calcular_redistribucion(dias, ventas_min, modo, max_workers=None):
     with get_connection() as conn:
         df_cfg, referencias_fijas, marcas_multimarca, codigos_excluidos, config_tiendas = \
             repo.fetch_configuracion(conn)
@@ -18,6 +80,7 @@ def get_redistribucion_regional(dias=30, ventas_min=1, tienda_origen=None):
 
         ventas = repo.fetch_ventas(conn, fecha_col, fecha_desde)
         existencias = repo.fetch_existencias(conn)
+        costos = repo.fetch_costos_traslado(conn) if modo == "optimo" else None
 
     # ---------------- NORMALIZACIÓN ----------------
     cfg_map = {
@@ -43,20 +106,22 @@ def get_redistribucion_regional(dias=30, ventas_min=1, tienda_origen=None):
     ref_set = set(r.upper() for r in referencias_fijas)
     marca_set = set(m.upper() for m in marcas_multimarca)
 
-    def stock_min(c, m):
-        c, m = str(c).upper(), str(m).upper()
-        if c in ref_set:
-            return cfg_map.get("fijo_normal", 5)
-        if m in marca_set:
-            return cfg_map.get("multimarca", 2)
-        if "JGL" in c or "JGL" in m:
-            return cfg_map.get("jgl", 3)
-        if "JGM" in c or "JGM" in m:
-            return cfg_map.get("jgm", 3)
-        return cfg_map.get("general", 4)
-
-    existencias["stock_minimo"] = existencias.apply(
-        lambda r: stock_min(r["c_barra"], r["d_marca"]), axis=1
+    codigos_up = existencias["c_barra"].astype(str).str.upper()
+    marcas_up = existencias["d_marca"].astype(str).str.upper()
+    existencias["stock_minimo"] = np.select(
+        [
+            codigos_up.isin(ref_set),
+            marcas_up.isin(marca_set),
+            codigos_up.str.contains("JGL", regex=False) | marcas_up.str.contains("JGL", regex=False),
+            codigos_up.str.contains("JGM", regex=False) | marcas_up.str.contains("JGM", regex=False),
+        ],
+        [
+            cfg_map.get("fijo_normal", 5),
+            cfg_map.get("multimarca", 2),
+            cfg_map.get("jgl", 3),
+            cfg_map.get("jgm", 3),
+        ],
+        default=cfg_map.get("general", 4),
     )
 
     # ---------------- MERGE ----------------
@@ -83,45 +148,311 @@ def get_redistribucion_regional(dias=30, ventas_min=1, tienda_origen=None):
         (df["ventas_periodo"] >= ventas_min)
     ]
 
-    if tienda_origen:
-        t_norm = _norm(tienda_origen)
-        origen = origen[origen["tienda_norm"] == t_norm]
-        if origen.empty:
-            return pd.DataFrame()
-        region = origen.iloc[0]["region"]
-        destino = destino[destino["region"] == region]
-
     # ---------------- MATCH ----------------
-    merged = origen.merge(
-        destino,
-        on=["region", "c_barra", "d_marca"],
-        suffixes=("_origen", "_destino")
-    )
+    if modo == "optimo":
+        final = _optimizar_traslados(origen, destino, _mapa_costos(costos), max_workers)
+    else:
+        final = _asignar_traslados(origen, destino, ["region", "c_barra", "d_marca"])
 
-    if merged.empty:
+    if final.empty:
         return pd.DataFrame()
 
-    merged["cantidad_sugerida"] = merged.apply(
-        lambda r: max(
-            1,
-            min(
-                (r["stock_actual_origen"] - r["stock_minimo_origen"]) // 2,
-                (r["stock_minimo_destino"] - r["stock_actual_destino"])
-            )
-        ),
-        axis=1
+    return final
+
+
+def _asignar_traslados(origen, destino, claves):
+    """
+    Reparte el excedente de cada origen entre los destinos de su grupo
+    (región, código, marca) sin prometer más de lo que hay.
+
+    - Capacidad del origen: max(1, (stock - mínimo) // 2)
+    - Necesidad del destino: mínimo - stock
+    - Orígenes con más excedente y destinos con más necesidad (y más
+      ventas) se atienden primero.
+
+    Capacidades y necesidades se ponen como intervalos consecutivos sobre
+    un mismo eje (cada grupo en su propio tramo) y cada traslado es la
+    intersección de un intervalo de origen con uno de destino. No se arma
+    el cruce origen × destino: la memoria crece con len(origen) + len(destino).
+    """
+    columnas = [
+        "region", "c_barra", "d_marca",
+        "tienda_origen", "tienda_destino", "cantidad_sugerida"
+    ]
+    if origen.empty or destino.empty:
+        return pd.DataFrame(columns=columnas)
+
+    # Grupo común para ambos lados (NaN en la marca también agrupa)
+    llaves = pd.concat([origen[claves], destino[claves]], ignore_index=True)
+    grupo = llaves.groupby(claves, sort=True, dropna=False).ngroup().to_numpy()
+
+    o = origen.assign(
+        grupo=grupo[:len(origen)],
+        cantidad=np.maximum(1, (origen["stock_actual"] - origen["stock_minimo"]) // 2),
+    )
+    d = destino.assign(
+        grupo=grupo[len(origen):],
+        cantidad=destino["stock_minimo"] - destino["stock_actual"],
     )
 
-    final = merged[merged["cantidad_sugerida"] > 0].copy()
+    comunes = np.intersect1d(o["grupo"].unique(), d["grupo"].unique())
+    o = o[o["grupo"].isin(comunes)].sort_values(
+        ["grupo", "cantidad", "tienda_clean"], ascending=[True, False, True]
+    )
+    d = d[d["grupo"].isin(comunes)].sort_values(
+        ["grupo", "cantidad", "ventas_periodo", "tienda_clean"],
+        ascending=[True, False, False, True]
+    )
+    if o.empty:
+        return pd.DataFrame(columns=columnas)
 
-    if final.empty:
-        return pd.DataFrame()
+    # Cada grupo ocupa su propio tramo del eje
+    total_o = o.groupby("grupo")["cantidad"].sum()
+    total_d = d.groupby("grupo")["cantidad"].sum()
+    tramo = np.maximum(total_o, total_d)
+    inicio_grupo = tramo.cumsum() - tramo
+
+    def intervalos(lado):
+        fin = (
+            lado["grupo"].map(inicio_grupo).to_numpy()
+            + lado.groupby("grupo")["cantidad"].cumsum().to_numpy()
+        )
+        return fin - lado["cantidad"].to_numpy(), fin
+
+    o_ini, o_fin = intervalos(o)
+    d_ini, d_fin = intervalos(d)
+
+    cortes = np.unique(np.concatenate([o_ini, o_fin, d_ini, d_fin]))
+    desde, largo = cortes[:-1], np.diff(cortes)
 
-    return final[[
+    i = np.searchsorted(o_fin, desde, side="right")
+    j = np.searchsorted(d_fin, desde, side="right")
+    valido = (i < len(o)) & (j < len(d))
+    i, j, largo, desde = i[valido], j[valido], largo[valido], desde[valido]
+    cubierto = (o_ini[i] <= desde) & (d_ini[j] <= desde)
+    i, j, largo = i[cubierto], j[cubierto], largo[cubierto]
+
+    o_sel = o.iloc[i]
+    return pd.DataFrame({
+        "region": o_sel["region"].to_numpy(),
+        "c_barra": o_sel["c_barra"].to_numpy(),
+        "d_marca": o_sel["d_marca"].to_numpy(),
+        "tienda_origen": o_sel["tienda_clean"].to_numpy(),
+        "tienda_destino": d["tienda_clean"].to_numpy()[j],
+        "cantidad_sugerida": largo.astype(int),
+    })
+
+
+# ---------------- MODO ÓPTIMO (FLUJO DE COSTO MÍNIMO) ----------------
+
+def _mapa_costos(costos):
+    """{(region_origen, region_destino): costo} en mayúsculas."""
+    costos = costos.dropna(subset=["region_origen", "region_destino", "costo"])
+    return {
+        (str(o).strip().upper(), str(d).strip().upper()): float(c)
+        for o, d, c in zip(costos["region_origen"], costos["region_destino"], costos["costo"])
+    }
+
+
+def _costo_traslado(costos, region_origen, region_destino):
+    o, d = str(region_origen).upper(), str(region_destino).upper()
+    if (o, d) in costos:
+        return costos[(o, d)]
+    return COSTO_MISMA_REGION if o == d else COSTO_OTRA_REGION
+
+
+def _optimizar_traslados(origen, destino, costos, max_workers=None):
+    """
+    Un problema de transporte por código (c_barra, d_marca) en toda la cadena.
+    Cada código se resuelve por separado; con muchos códigos se reparten
+    por bloques en el pool de procesos compartido.
+    """
+    columnas = [
         "region", "c_barra", "d_marca",
-        "tienda_clean_origen", "tienda_clean_destino",
-        "cantidad_sugerida"
-    ]].rename(columns={
-        "tienda_clean_origen": "tienda_origen",
-        "tienda_clean_destino": "tienda_destino"
-    })
\ No newline at end of file
+        "tienda_origen", "tienda_destino", "cantidad_sugerida", "region_destino"
+    ]
+    if origen.empty or destino.empty:
+        return pd.DataFrame(columns=columnas)
+
+    o = pd.DataFrame({
+        "lado": 0,
+        "c_barra": origen["c_barra"],
+        "d_marca": origen["d_marca"],
+        "region": origen["region"],
+        "tienda": origen["tienda_clean"],
+        "cantidad": np.maximum(1, (origen["stock_actual"] - origen["stock_minimo"]) // 2),
+        "ventas": 0,
+    })
+    d = pd.DataFrame({
+        "lado": 1,
+        "c_barra": destino["c_barra"],
+        "d_marca": destino["d_marca"],
+        "region": destino["region"],
+        "tienda": destino["tienda_clean"],
+        "cantidad": destino["stock_minimo"] - destino["stock_actual"],
+        "ventas": destino["ventas_periodo"],
+    })
+    todo = pd.concat([o, d], ignore_index=True)
+    todo["grupo"] = todo.groupby(["c_barra", "d_marca"], sort=False, dropna=False).ngroup()
+
+    # Mismo orden de atención que el modo regional
+    todo = todo.sort_values(
+        ["grupo", "lado", "cantidad", "ventas", "tienda"],
+        ascending=[True, True, False, False, True]
+    )
+
+    problemas = []
+    filas = zip(
+        todo["grupo"], todo["lado"], todo["c_barra"], todo["d_marca"],
+        todo["region"], todo["tienda"], todo["cantidad"].astype(int)
+    )
+    for _, grupo in groupby(filas, key=lambda f: f[0]):
+        grupo = list(grupo)
+        ofertas = [(f[4], f[5], f[6]) for f in grupo if f[1] == 0]
+        demandas = [(f[4], f[5], f[6]) for f in grupo if f[1] == 1]
+        if ofertas and demandas:
+            problemas.append((grupo[0][2], grupo[0][3], ofertas, demandas))
+
+    if len(problemas) < MIN_CODIGOS_PARALELO or max_workers == 1:
+        traslados = _resolver_codigos(problemas, costos)
+    else:
+        bloques = max(1, len(problemas) // MIN_CODIGOS_PARALELO)
+        partes = [problemas[k::bloques] for k in range(bloques)]
+        traslados = [
+            t for parte in mapear_en_procesos(
+                _resolver_codigos, partes, [costos] * len(partes), max_workers=max_workers
+            )
+            for t in parte
+        ]
+
+    df = pd.DataFrame(traslados, columns=columnas)
+    return df.sort_values(["region", "c_barra", "tienda_origen", "tienda_destino"], ignore_index=True)
+
+
+def _resolver_codigos(problemas, costos):
+    """Resuelve una lista de códigos; cada uno es (c_barra, d_marca, ofertas, demandas)."""
+    traslados = []
+    for c_barra, d_marca, ofertas, demandas in problemas:
+        for region_o, tienda_o, region_d, tienda_d, cantidad in _resolver_codigo(ofertas, demandas, costos):
+            traslados.append((region_o, c_barra, d_marca, tienda_o, tienda_d, cantidad, region_d))
+    return traslados
+
+
+def _resolver_codigo(ofertas, demandas, costos):
+    """
+    Traslados de un código. Como el costo solo depende del par de regiones,
+    el flujo se resuelve entre regiones y luego se reparte entre tiendas
+    (cualquier reparto dentro de un par de regiones cuesta lo mismo).
+
+    Args:
+        ofertas / demandas: listas de (region, tienda, unidades) en orden de atención
+    """
+    oferta_region, demanda_region = {}, {}
+    for region, _, unidades in ofertas:
+        oferta_region[region] = oferta_region.get(region, 0) + unidades
+    for region, _, unidades in demandas:
+        demanda_region[region] = demanda_region.get(region, 0) + unidades
+
+    flujo = _flujo_costo_minimo(oferta_region, demanda_region, costos)
+
+    # Colas por región con lo que queda en cada tienda
+    pendientes_o, pendientes_d = {}, {}
+    for region, tienda, unidades in ofertas:
+        pendientes_o.setdefault(region, []).append([tienda, unidades])
+    for region, tienda, unidades in demandas:
+        pendientes_d.setdefault(region, []).append([tienda, unidades])
+
+    traslados = []
+    # Primero los pares de la misma región: las tiendas grandes quedan cerca
+    for (region_o, region_d), unidades in sorted(flujo.items(), key=lambda x: x[0][0] != x[0][1]):
+        cola_o, cola_d = pendientes_o[region_o], pendientes_d[region_d]
+        while unidades > 0:
+            o, d = cola_o[0], cola_d[0]
+            cantidad = min(o[1], d[1], unidades)
+            traslados.append((region_o, o[0], region_d, d[0], cantidad))
+            o[1] -= cantidad
+            d[1] -= cantidad
+            unidades -= cantidad
+            if o[1] == 0:
+                cola_o.pop(0)
+            if d[1] == 0:
+                cola_d.pop(0)
+
+    return traslados
+
+
+def _flujo_costo_minimo(oferta, demanda, costos):
+    """
+    Problema de transporte: envía min(oferta total, demanda total) unidades
+    al menor costo. Caminos más cortos sucesivos (Bellman-Ford) sobre el
+    grafo residual; el grafo tiene un nodo por región, así que es pequeño.
+
+    Returns:
+        {(region_origen, region_destino): unidades}
+    """
+    ro, rd = list(oferta), list(demanda)
+    resto_o = [oferta[r] for r in ro]
+    resto_d = [demanda[r] for r in rd]
+    costo = [[_costo_traslado(costos, a, b) for b in rd] for a in ro]
+    flujo = [[0] * len(rd) for _ in ro]
+    infinito = float("inf")
+
+    while True:
+        # Distancias desde la fuente a cada región origen (o) y destino (d)
+        dist_o = [0 if resto_o[i] > 0 else infinito for i in range(len(ro))]
+        dist_d = [infinito] * len(rd)
+        previo_o = [None] * len(ro)
+        previo_d = [None] * len(rd)
+
+        for _ in range(len(ro) + len(rd)):
+            cambio = False
+            for i in range(len(ro)):
+                if dist_o[i] == infinito:
+                    continue
+                for j in range(len(rd)):
+                    if dist_o[i] + costo[i][j] < dist_d[j]:
+                        dist_d[j] = dist_o[i] + costo[i][j]
+                        previo_d[j] = i
+                        cambio = True
+            for j in range(len(rd)):
+                if dist_d[j] == infinito:
+                    continue
+                for i in range(len(ro)):
+                    if flujo[i][j] > 0 and dist_d[j] - costo[i][j] < dist_o[i]:
+                        dist_o[i] = dist_d[j] - costo[i][j]
+                        previo_o[i] = j
+                        cambio = True
+            if not cambio:
+                break
+
+        candidatos = [j for j in range(len(rd)) if resto_d[j] > 0 and dist_d[j] < infinito]
+        if not candidatos:
+            break
+        j = min(candidatos, key=lambda k: dist_d[k])
+
+        # Reconstruir el camino fuente -> ... -> j y su capacidad
+        camino = []
+        capacidad = resto_d[j]
+        actual = j
+        while True:
+            i = previo_d[actual]
+            camino.append((i, actual, 1))
+            if previo_o[i] is None:
+                inicio = i
+                capacidad = min(capacidad, resto_o[i])
+                break
+            actual = previo_o[i]
+            camino.append((i, actual, -1))
+            capacidad = min(capacidad, flujo[i][actual])
+
+        for i, k, sentido in camino:
+            flujo[i][k] += sentido * capacidad
+        resto_o[inicio] -= capacidad
+        resto_d[j] -= capacidad
+
+    return {
+        (ro[i], rd[j]): flujo[i][j]
+        for i in range(len(ro))
+        for j in range(len(rd))
+        if flujo[i][j] > 0
+    }
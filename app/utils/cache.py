@@ -0,0 +1,154 @@
+# cache.py
+
+import logging
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import DBAPIError
+
+from app.database import get_connection
+
+
+logger = logging.getLogger(__name__)
+
+# Generación de datos: sube cada vez que cambian los datos cargados o la
+# configuración. Los resultados cacheados de una generación anterior se
+# descartan solos.
+#
+# invalidar_cache sube el contador del proceso en el momento (cargas hechas
+# por la API) y además la generación guardada en la tabla meta_datos, para
+# los demás procesos/workers (python -m app.cargar_csv, tareas programadas).
+# Esa tabla la relee un hilo vigilante cada INTERVALO_LECTURA segundos: las
+# consultas a las caches solo leen memoria. Nada se lee de la base hasta el
+# primer uso.
+TABLA_META = "meta_datos"
+
+# Segundos entre lecturas de la generación guardada
+INTERVALO_LECTURA = 1.0
+
+_generacion = 0
+_persistida = 0
+_vigilante = None
+_detener = threading.Event()
+_lock = threading.Lock()
+
+
+def _leer_generacion_persistida():
+    with get_connection() as conn:
+        if not inspect(conn).has_table(TABLA_META):
+            return 0
+        fila = conn.execute(
+            text(f"SELECT valor FROM {TABLA_META} WHERE clave = 'generacion'")
+        ).fetchone()
+    return fila[0] if fila else 0
+
+
+def _subir_generacion_persistida():
+    with get_connection() as conn:
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {TABLA_META} (clave TEXT PRIMARY KEY, valor INTEGER)"
+        ))
+        resultado = conn.execute(
+            text(f"UPDATE {TABLA_META} SET valor = valor + 1 WHERE clave = 'generacion'")
+        )
+        if resultado.rowcount == 0:
+            conn.execute(text(f"INSERT INTO {TABLA_META} (clave, valor) VALUES ('generacion', 1)"))
+        conn.commit()
+    return _leer_generacion_persistida()
+
+
+def refrescar_generacion():
+    """Relee la generación guardada en la base (la usa el hilo vigilante)."""
+    global _persistida
+    try:
+        valor = _leer_generacion_persistida()
+    except DBAPIError as e:
+        logger.warning(f"⚠️ No se pudo leer la generación de datos: {e}")
+        return
+    with _lock:
+        _persistida = valor
+
+
+def _vigilar():
+    while not _detener.wait(INTERVALO_LECTURA):
+        refrescar_generacion()
+
+
+def _iniciar_vigilante():
+    global _vigilante
+    with _lock:
+        if _vigilante is not None:
+            return
+        _vigilante = threading.Thread(target=_vigilar, name="generacion-datos", daemon=True)
+    refrescar_generacion()
+    _vigilante.start()
+
+
+def detener_vigilante():
+    """Detiene el hilo vigilante (al cerrar la app o al borrar la base de pruebas)."""
+    _detener.set()
+    if _vigilante is not None:
+        _vigilante.join()
+
+
+def generacion_datos():
+    """Generación actual de los datos (del proceso y la guardada en la base)."""
+    if _vigilante is None:
+        _iniciar_vigilante()
+    with _lock:
+        return (_generacion, _persistida)
+
+
+def invalidar_cache():
+    """Marca los datos como modificados (cargas de CSV, inventario, configuración)."""
+    global _generacion, _persistida
+    with _lock:
+        _generacion += 1
+    try:
+        persistida = _subir_generacion_persistida()
+    except DBAPIError as e:
+        logger.warning(f"⚠️ No se pudo guardar la generación de datos: {e}")
+        return
+    with _lock:
+        _persistida = persistida
+
+
+class CacheGeneracional:
+    """
+    Cache en memoria (LRU) cuyas entradas valen solo para la generación
+    de datos en que se calcularon.
+    """
+
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self._datos = OrderedDict()
+        # Se fija en el primer uso: crear la cache no toca la base
+        self._generacion = None
+        self._lock = threading.Lock()
+
+    def obtener(self, clave, calcular):
+        """Retorna el valor de clave; si no existe (o cambió la generación) lo calcula."""
+        with self._lock:
+            if self._generacion != generacion_datos():
+                self._datos.clear()
+                self._generacion = generacion_datos()
+            if clave in self._datos:
+                self._datos.move_to_end(clave)
+                return self._datos[clave]
+            generacion = self._generacion
+
+        valor = calcular()
+
+        with self._lock:
+            if generacion == generacion_datos():
+                self._datos[clave] = valor
+                self._datos.move_to_end(clave)
+                while len(self._datos) > self.maxsize:
+                    self._datos.popitem(last=False)
+
+        return valor
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
@@ -0,0 +1,66 @@
+# catalogo.py
+
+from typing import NamedTuple, Optional
+
+import pandas as pd
+
+
+class ProductoCatalogo(NamedTuple):
+    marca: Optional[str]
+    color: Optional[str]
+    fuente: str  # "saldos" o "bodega"
+
+
+class CatalogoProductos:
+    """
+    Catálogo en memoria código -> (marca, color, fuente).
+
+    Un código está en saldos o, si no aparece allí, en bodega; es la misma
+    precedencia que usaban las validaciones contra la BD. Las búsquedas son
+    exactas (el código tal como está en las tablas _raw).
+    """
+
+    def __init__(self, productos):
+        self._productos = productos
+
+    @classmethod
+    def desde_tablas(cls, df_saldos, df_bodega):
+        """
+        Construye el catálogo desde filas (c_barra, d_marca, color) de saldos
+        y de bodega. Si un código trae varias combinaciones, vale la primera.
+        """
+        productos = {}
+        for df, fuente in ((df_bodega, "bodega"), (df_saldos, "saldos")):
+            df = df.drop_duplicates("c_barra")
+            df = df.astype(object).where(df.notna(), None)
+            productos.update(
+                (str(c), ProductoCatalogo(marca, color, fuente))
+                for c, marca, color in zip(df["c_barra"], df["d_marca"], df["color"])
+            )
+        return cls(productos)
+
+    def __len__(self):
+        return len(self._productos)
+
+    def __contains__(self, codigo):
+        return str(codigo) in self._productos
+
+    def get(self, codigo):
+        """ProductoCatalogo del código, o None si no existe."""
+        return self._productos.get(str(codigo))
+
+    def resolver(self, codigos):
+        """
+        Separa codigos en existentes y nuevos, en el orden recibido.
+
+        Retorna (existentes, nuevos): existentes es una lista de
+        (codigo, ProductoCatalogo) y nuevos una lista de códigos.
+        """
+        existentes, nuevos = [], []
+        for codigo in codigos:
+            producto = self._productos.get(str(codigo))
+            if producto is None:
+                nuevos.append(codigo)
+            else:
+                existentes.append((codigo, producto))
+        return existentes, nuevos
@@ -0,0 +1,84 @@
+# paginacion.py
+
+import base64
+import json
+
+import numpy as np
+
+from app.exceptions import InvalidDataError
+
+
+def codificar_cursor(valores):
+    """Cursor opaco con los valores de orden de la última fila entregada."""
+    valores = [v.item() if isinstance(v, np.generic) else v for v in valores]
+    crudo = json.dumps(valores, default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(crudo.encode("utf-8")).decode("ascii")
+
+
+def decodificar_cursor(cursor, n_columnas):
+    """
+    Valores de orden guardados en el cursor.
+
+    Lanza InvalidDataError si el cursor no es válido para n_columnas.
+    """
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise InvalidDataError("Cursor de paginación inválido", field="cursor", value=cursor)
+    if not isinstance(valores, list) or len(valores) != n_columnas:
+        raise InvalidDataError("Cursor de paginación inválido", field="cursor", value=cursor)
+    return valores
+
+
+def sql_pagina(sql_base, columnas, cursor, page_size):
+    """
+    Envuelve sql_base (sin ORDER BY) en una consulta keyset.
+
+    columnas son alias de sql_base que nunca son NULL y que juntos deben
+    ser únicos por fila: la comparación es estricta, así que filas con las
+    mismas claves después del corte de página se saltarían. Si no lo son,
+    la última columna debe ser un desempate único (p. ej. row_id de la
+    tabla base). Retorna (sql, params_extra); se pide una fila de más para
+    saber si hay otra página.
+    """
+    lista = ", ".join(columnas)
+    sql = f"SELECT * FROM ({sql_base}) pagina"
+    params = []
+    if cursor:
+        marcas = ", ".join("?" for _ in columnas)
+        sql += f" WHERE ({lista}) > ({marcas})"
+        params.extend(decodificar_cursor(cursor, len(columnas)))
+    sql += f" ORDER BY {lista} LIMIT ?"
+    params.append(page_size + 1)
+    return sql, params
+
+
+def cortar_pagina(df, columnas, page_size):
+    """
+    Recorta el resultado de sql_pagina a page_size filas.
+
+    Retorna (df_pagina, siguiente_cursor); el cursor es None en la última página.
+    """
+    if len(df) <= page_size:
+        return df, None
+    df = df.iloc[:page_size]
+    return df, codificar_cursor(df[columnas].iloc[-1].tolist())
+
+
+def pagina_dataframe(df, columnas, cursor, page_size):
+    """
+    Keyset sobre un DataFrame ya ordenado por columnas (sin nulos en ellas
+    y únicas por fila, como en sql_pagina).
+
+    Retorna (df_pagina, siguiente_cursor).
+    """
+    if cursor:
+        valores = decodificar_cursor(cursor, len(columnas))
+        mayor = np.zeros(len(df), dtype=bool)
+        igual = np.ones(len(df), dtype=bool)
+        for col, valor in zip(columnas, valores):
+            serie = df[col].to_numpy()
+            mayor |= igual & (serie > valor)
+            igual &= serie == valor
+        df = df[mayor]
+    return cortar_pagina(df.iloc[:page_size + 1], columnas, page_size)
@@ -0,0 +1,105 @@
+# presencia.py
+
+import numpy as np
+
+
+class IndicePresencia:
+    """
+    Índice compacto de presencia producto × almacén.
+
+    Por cada código (en mayúsculas) guarda un bitmap sobre el diccionario
+    de almacenes (d_almacen tal como viene en saldos):
+    - presente: el código tiene fila en saldos en ese almacén
+    - con_stock: además tiene saldo_disponible > 0
+
+    Los bitmaps van empaquetados (np.packbits), un byte por cada 8 almacenes.
+    """
+
+    def __init__(self, codigos, almacenes, presente, con_stock):
+        self.codigos = list(codigos)
+        self.almacenes = list(almacenes)
+        self.presente = presente
+        self.con_stock = con_stock
+        self._pos = {c: i for i, c in enumerate(self.codigos)}
+
+    @classmethod
+    def desde_saldos(cls, df):
+        """
+        Construye el índice desde filas (c_barra, d_almacen, con_stock).
+        Códigos que solo difieren en mayúsculas quedan en el mismo bitmap.
+        """
+        codigos_up = df["c_barra"].astype(str).str.upper()
+        filas, codigos = codigos_up.factorize()
+        almacenes = np.unique(df["d_almacen"].astype(str))
+        columnas = np.searchsorted(almacenes, df["d_almacen"].astype(str))
+
+        presente = np.zeros((len(codigos), len(almacenes)), dtype=bool)
+        con_stock = np.zeros_like(presente)
+        presente[filas, columnas] = True
+        positivo = df["con_stock"].to_numpy() == 1
+        con_stock[filas[positivo], columnas[positivo]] = True
+
+        return cls(
+            codigos,
+            almacenes,
+            np.packbits(presente, axis=1),
+            np.packbits(con_stock, axis=1),
+        )
+
+    def _bits(self, con_stock):
+        return self.con_stock if con_stock else self.presente
+
+    def fila(self, codigo, con_stock=False):
+        """Bitmap empaquetado de un código (ceros si no está en saldos)."""
+        pos = self._pos.get(str(codigo).upper())
+        bits = self._bits(con_stock)
+        if pos is None:
+            return np.zeros(bits.shape[1], dtype=np.uint8)
+        return bits[pos]
+
+    def almacenes_de(self, codigo, con_stock=False):
+        """Almacenes donde está el código, en el orden del diccionario."""
+        mascara = np.unpackbits(self.fila(codigo, con_stock), count=len(self.almacenes))
+        return [self.almacenes[i] for i in np.flatnonzero(mascara)]
+
+    def almacenes_activos(self, excluir=None):
+        """Almacenes con al menos un código (OR de todos los bitmaps)."""
+        bits = self.presente
+        if excluir:
+            excluidos = {str(c).upper() for c in excluir}
+            bits = bits[[c not in excluidos for c in self.codigos]]
+        if len(bits) == 0:
+            return []
+        mascara = np.unpackbits(np.bitwise_or.reduce(bits, axis=0), count=len(self.almacenes))
+        return [self.almacenes[i] for i in np.flatnonzero(mascara)]
+
+    def matriz(self, codigos, grupo_almacen=None, grupos=None, con_stock=False):
+        """
+        Presencia de varios códigos como matriz booleana.
+
+        Sin grupos: columnas = almacenes del diccionario.
+        Con grupo_almacen (dict almacén -> grupo, p. ej. nombre limpio de tienda)
+        y grupos (lista ordenada): columnas = grupos; un grupo está presente
+        si alguno de sus almacenes lo está.
+        """
+        bits = self._bits(con_stock)
+        pos = np.array([self._pos.get(str(c).upper(), -1) for c in codigos], dtype=np.int64)
+
+        m = np.zeros((len(pos), len(self.almacenes)), dtype=bool)
+        conocidos = pos >= 0
+        if conocidos.any():
+            m[conocidos] = np.unpackbits(
+                bits[pos[conocidos]], axis=1, count=len(self.almacenes)
+            ).astype(bool)
+
+        if grupo_almacen is None:
+            return m
+
+        col_grupo = {g: j for j, g in enumerate(grupos)}
+        asignacion = np.zeros((len(self.almacenes), len(grupos)), dtype=np.int32)
+        for i, almacen in enumerate(self.almacenes):
+            j = col_grupo.get(grupo_almacen.get(almacen))
+            if j is not None:
+                asignacion[i, j] = 1
+
+        return (m.astype(np.int32) @ asignacion) > 0
@@ -0,0 +1,43 @@
+# procesos.py
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Pools de procesos compartidos, uno por tamaño (max_workers). Se crean en
+# el primer uso y se reutilizan: cada reporte paralelo no levanta un pool
+# nuevo. Los workers arrancan con spawn: la app es multihilo (threadpool de
+# FastAPI) y un fork copiaría locks y conexiones tomados por otros hilos.
+_pools = {}
+_lock = threading.Lock()
+
+
+def _pool(max_workers):
+    with _lock:
+        pool = _pools.get(max_workers)
+        if pool is None:
+            pool = _pools[max_workers] = ProcessPoolExecutor(
+                max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return pool
+
+
+def mapear_en_procesos(funcion, *iterables, max_workers=None):
+    """
+    list(map(funcion, *iterables)) en el pool compartido, en el orden de
+    los argumentos. funcion debe ser una función de módulo y sus argumentos
+    serializables (cada tarea lleva los suyos).
+
+    Si un proceso del pool muere, el pool se descarta y la siguiente
+    llamada crea uno nuevo.
+    """
+    pool = _pool(max_workers)
+    try:
+        return list(pool.map(funcion, *iterables))
+    except BrokenProcessPool:
+        with _lock:
+            if _pools.get(max_workers) is pool:
+                del _pools[max_workers]
+        raise
+
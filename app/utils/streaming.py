@@ -0,0 +1,27 @@
+# streaming.py
+
+# Filas por lote al leer del cursor en las respuestas por streaming
+TAMANO_LOTE = 2000
+
+FORMATOS_STREAM = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def codificar_lotes(lotes, formato="ndjson"):
+    """
+    Codifica lotes de filas (DataFrames de pd.read_sql con chunksize) a bytes.
+
+    Cada lote se codifica y se entrega por separado, así en memoria solo
+    hay un lote a la vez. NDJSON: un objeto JSON por línea. CSV: encabezado
+    en el primer lote.
+    """
+    primero = True
+    for df in lotes:
+        if formato == "csv":
+            if primero or not df.empty:
+                yield df.to_csv(index=False, header=primero).encode("utf-8")
+        elif not df.empty:
+            yield df.to_json(orient="records", lines=True, force_ascii=False).encode("utf-8")
+        primero = False
@@ -12,4 +12,19 @@ def _norm(s):
     s = "".join(ch for ch in s if not unicodedata.combining(ch))
     s = s.strip().lower()
     s = " ".join(s.split())
-    return s
\ No newline at end of file
+    return s
+
+def _norm_series(serie):
+    """Aplica _norm a una Serie normalizando cada valor distinto una sola vez."""
+    valores = serie.drop_duplicates()
+    return serie.map(dict(zip(valores, valores.map(_norm))))
+
+def clave_marca(marca, mapa=None):
+    """
+    Clave normalizada de una marca (_norm). Si mapa trae la marca
+    (clave cruda -> clave limpia, p. ej. desde map_marcas), usa la limpia.
+    """
+    clave = _norm(marca)
+    if mapa:
+        clave = mapa.get(clave, clave)
+    return clave
@@ -2,8 +2,35 @@
 
 import sys
 import os
+import shutil
+
+import pytest
 
 ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
 
 if ROOT_DIR not in sys.path:
-    sys.path.insert(0, ROOT_DIR)
\ No newline at end of file
+    sys.path.insert(0, ROOT_DIR)
+
+# Las pruebas corren sobre una copia de la base, con los derivados que arma
+# la carga de CSV (marca_key, top_marcas, índice de búsqueda); la base real
+# no se modifica. DB_PATH se fija antes de importar app (load_dotenv no lo pisa).
+BASE_REAL = os.path.join(ROOT_DIR, "data", "jagi_mahalo.db")
+BASE_PRUEBAS = os.path.join(ROOT_DIR, "data", "jagi_mahalo_test.db")
+
+if os.path.exists(BASE_REAL):
+    shutil.copy(BASE_REAL, BASE_PRUEBAS)
+    os.environ["DB_PATH"] = "data/jagi_mahalo_test.db"
+
+
+@pytest.fixture(scope="session", autouse=True)
+def datos_derivados():
+    from app.cargar_csv import construir_derivados
+    from app.database import engine
+    from app.utils.cache import detener_vigilante
+
+    construir_derivados()
+    yield
+    detener_vigilante()
+    engine.dispose()
+    if os.path.exists(BASE_PRUEBAS):
+        os.remove(BASE_PRUEBAS)
@@ -49,6 +49,14 @@ def create_schema():
     );
     """)
 
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS costos_traslado (
+        region_origen TEXT,
+        region_destino TEXT,
+        costo REAL
+    );
+    """)
+
     # --- INVENTARIO ---
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS inventario_bodega_raw (
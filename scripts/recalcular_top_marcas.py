@@ -0,0 +1,19 @@
+# recalcular_top_marcas.py
+
+"""
+Tarea diaria: recalcula top_marcas (ventana móvil de 30 días).
+
+La carga de CSV ya lo calcula; esta tarea lo mantiene al día los días
+sin carga. Programarla una vez al día, por ejemplo con cron:
+
+    5 0 * * * cd /ruta/jagi_erp && python -m scripts.recalcular_top_marcas
+"""
+
+from datetime import date
+
+from app.services.analisis_marca_service import construir_top_marcas
+
+
+if __name__ == "__main__":
+    construir_top_marcas()
+    print(f"🏆 top_marcas recalculado ({date.today().isoformat()})")
@@ -10,6 +10,7 @@
 let datosPreview = null;
 let paginaActual = 1;
 let tipoModalActual = null; // 'filtros' o 'preview'
+let previewRemoto = null; // { url, body, total, nextCursor } si el preview llega por lotes
 
 // ==========================================
 // 2. INICIALIZACIÓN
@@ -185,6 +186,7 @@ function cerrarModal() {
     if (modal) modal.classList.add('hidden');
     
     datosPreview = null;
+    previewRemoto = null;
     tipoModalActual = null; // Resetear tipo de modal
     
     // Asegurar que se muestre la tabla normal y se oculte la sección de filtros
@@ -210,7 +212,7 @@ function renderizarTabla() {
     );
 
     // Renderizar estadísticas
-    renderizarEstadisticasPreview(datosFiltrados);
+    renderizarEstadisticasPreview(datosFiltrados, search);
 
     // Paginación
     const inicio = (paginaActual - 1) * CONFIG.REGISTROS_POR_PAGINA;
@@ -242,40 +244,92 @@ function renderizarTabla() {
         '</tr>';
     }).join('');
 
+    // Sin búsqueda, el total es el del servidor (incluye lotes aún no pedidos)
+    const totalRegistros = previewRemoto && !search ? previewRemoto.total : datosFiltrados.length;
+
     // Info paginación
-    actualizarInfoPaginacion(inicio, fin, datosFiltrados.length);
+    actualizarInfoPaginacion(inicio, fin, totalRegistros);
     
     // Botones paginación
-    renderizarBotonesPaginacion(datosFiltrados.length);
+    renderizarBotonesPaginacion(totalRegistros);
+}
+
+// Pide un lote del preview al servidor (paginación por cursor)
+async function pedirLotePreview(url, body, cursor = null) {
+    const response = await fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            ...body,
+            paginacion: { page_size: CONFIG.REGISTROS_POR_LOTE, cursor }
+        })
+    });
+    if (!response.ok) throw new Error('Error al cargar lote del preview');
+    return response.json();
+}
+
+async function cargarSiguienteLote() {
+    if (!previewRemoto || !previewRemoto.nextCursor) return;
+    
+    const result = await pedirLotePreview(previewRemoto.url, previewRemoto.body, previewRemoto.nextCursor);
+    datosPreview = datosPreview.concat(result.datos);
+    previewRemoto.nextCursor = result.has_more ? result.next_cursor : null;
 }
 
-function renderizarEstadisticasPreview(datos) {
+async function irPaginaSiguiente() {
+    const fin = paginaActual * CONFIG.REGISTROS_POR_PAGINA;
+    
+    if (fin >= datosPreview.length && previewRemoto && previewRemoto.nextCursor) {
+        try {
+            await cargarSiguienteLote();
+        } catch (error) {
+            console.error(error);
+            showNotification(CONFIG.MESSAGES.errorConexion, 'error');
+            return;
+        }
+    }
+    
+    paginaActual++;
+    renderizarTabla();
+}
+
+// Sin búsqueda, las tarjetas de un preview por lotes usan las estadísticas
+// del servidor (todo el resultado); si no, se calculan sobre lo cargado.
+function renderizarEstadisticasPreview(datos, search = '') {
     const stats = document.getElementById('previewStats');
     if (!stats) return;
     
+    const delServidor = Boolean(previewRemoto && previewRemoto.estadisticas && !search);
+    const resumen = delServidor ? previewRemoto.estadisticas : {
+        total_registros: datos.length,
+        tiendas: new Set(datos.map(r => r.tienda || r.tienda_destino)).size,
+        productos: new Set(datos.map(r => r.c_barra)).size,
+        unidades: datos.reduce((sum, r) => sum + (r.cantidad_a_despachar || r.cantidad_sugerida || 0), 0)
+    };
+    // Quedan lotes sin pedir: lo calculado en el navegador es parcial
+    const parcial = !delServidor && previewRemoto && previewRemoto.nextCursor;
+    
     stats.innerHTML = `
         <div class="bg-blue-50 p-3 rounded text-center">
-            <div class="text-2xl font-bold text-blue-600">${datos.length}</div>
+            <div class="text-2xl font-bold text-blue-600">${resumen.total_registros}</div>
             <div class="text-xs text-gray-600">Total Registros</div>
         </div>
         <div class="bg-green-50 p-3 rounded text-center">
-            <div class="text-2xl font-bold text-green-600">${
-                new Set(datos.map(r => r.tienda || r.tienda_destino)).size
-            }</div>
+            <div class="text-2xl font-bold text-green-600">${resumen.tiendas}</div>
             <div class="text-xs text-gray-600">Tiendas</div>
         </div>
         <div class="bg-orange-50 p-3 rounded text-center">
-            <div class="text-2xl font-bold text-orange-600">${
-                new Set(datos.map(r => r.c_barra)).size
-            }</div>
+            <div class="text-2xl font-bold text-orange-600">${resumen.productos}</div>
             <div class="text-xs text-gray-600">Productos</div>
         </div>
         <div class="bg-purple-50 p-3 rounded text-center">
-            <div class="text-2xl font-bold text-purple-600">${
-                datos.reduce((sum, r) => sum + (r.cantidad_a_despachar || r.cantidad_sugerida || 0), 0)
-            }</div>
+            <div class="text-2xl font-bold text-purple-600">${resumen.unidades}</div>
             <div class="text-xs text-gray-600">Unidades Total</div>
         </div>
+        ${parcial ? `
+        <div class="col-span-full text-xs text-gray-500 text-center">
+            Parcial: calculado sobre los ${datosPreview.length} registros cargados
+        </div>` : ''}
     `;
 }
 
@@ -308,7 +362,7 @@ function renderizarBotonesPaginacion(totalRegistros) {
     
     if (paginaActual < totalPaginas) {
         pagination.innerHTML += `
-            <button onclick="paginaActual++; renderizarTabla()" 
+            <button onclick="irPaginaSiguiente()" 
                 class="px-3 py-1 bg-blue-600 text-white rounded text-sm">
                 Siguiente →
             </button>`;
@@ -394,21 +448,19 @@ async function generarReabastecimiento() {
     try {
         showNotification('Generando análisis de reabastecimiento...', 'success');
         
-        const response = await fetch(`${CONFIG.API_URL}/reabastecimiento-preview`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(params)
-        });
-
-        if (response.ok) {
-            const result = await response.json();
-            if (result.success) {
-                abrirModal(`Reabastecimiento - ${result.total} registros`, result.datos);
-            } else {
-                showNotification('No hay datos para mostrar', 'error');
-            }
+        const url = `${CONFIG.API_URL}/reabastecimiento-preview`;
+        const result = await pedirLotePreview(url, params);
+        if (result.success) {
+            previewRemoto = {
+                url,
+                body: params,
+                total: result.total,
+                estadisticas: result.estadisticas,
+                nextCursor: result.has_more ? result.next_cursor : null
+            };
+            abrirModal(`Reabastecimiento - ${result.total} registros`, result.datos);
         } else {
-            showNotification('Error al generar preview', 'error');
+            showNotification('No hay datos para mostrar', 'error');
         }
     } catch (error) {
         console.error(error);
@@ -437,6 +489,17 @@ async function exportarDesdePreview() {
         return;
     }
     
+    // Completar los lotes pendientes para exportar el preview entero
+    try {
+        while (previewRemoto && previewRemoto.nextCursor) {
+            await cargarSiguienteLote();
+        }
+    } catch (error) {
+        console.error(error);
+        showNotification(CONFIG.MESSAGES.errorConexion, 'error');
+        return;
+    }
+    
     // Inicializar estado desde preview
     estadoFiltros.columnas = Object.keys(datosPreview[0]);
     estadoFiltros.columnasSeleccionadas = [...estadoFiltros.columnas];
@@ -477,6 +540,7 @@ async function generarRedistribucion() {
         if (response.ok) {
             const result = await response.json();
             if (result.success) {
+                previewRemoto = null;
                 abrirModal(`Redistribución - ${result.total} registros`, result.datos);
             } else {
                 showNotification(result.message || 'No hay redistribuciones sugeridas', 'error');
@@ -641,39 +705,37 @@ async function generarReporteConFiltros(tipo) {
     try {
         showNotification(`Generando ${tipo}...`, 'success');
         
-        const response = await fetch(`${CONFIG.API_URL}/reportes/${tipo}-preview`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(params)
-        });
-
-        if (response.ok) {
-            const result = await response.json();
-            if (result.success) {
-                // Cambiar a modo preview normal
-                tipoModalActual = 'preview';
-                
-                // Actualizar título del modal
-                document.getElementById('modalTitle').textContent = `${tipo.charAt(0).toUpperCase() + tipo.slice(1)} - ${result.total} registros`;
-                
-                // Cargar los datos en el preview
-                datosPreview = result.datos;
-                paginaActual = 1;
-                
-                // Mostrar tabla normal, ocultar filtros
-                const tablaSeccion = document.getElementById('tabla-seccion');
-                const filtrosSeccion = document.getElementById('filtros-seccion');
-                
-                if (tablaSeccion) tablaSeccion.classList.remove('hidden');
-                if (filtrosSeccion) filtrosSeccion.classList.add('hidden');
-                
-                renderizarTabla();
-                
-            } else {
-                showNotification(result.message || `No hay ${tipo} con los filtros aplicados`, 'error');
-            }
+        const url = `${CONFIG.API_URL}/reportes/${tipo}-preview`;
+        const result = await pedirLotePreview(url, params);
+        if (result.success) {
+            // Cambiar a modo preview normal
+            tipoModalActual = 'preview';
+            
+            // Actualizar título del modal
+            document.getElementById('modalTitle').textContent = `${tipo.charAt(0).toUpperCase() + tipo.slice(1)} - ${result.total} registros`;
+            
+            // Cargar el primer lote en el preview; el resto se pide al paginar
+            datosPreview = result.datos;
+            paginaActual = 1;
+            previewRemoto = {
+                url,
+                body: params,
+                total: result.total,
+                estadisticas: result.estadisticas,
+                nextCursor: result.has_more ? result.next_cursor : null
+            };
+            
+            // Mostrar tabla normal, ocultar filtros
+            const tablaSeccion = document.getElementById('tabla-seccion');
+            const filtrosSeccion = document.getElementById('filtros-seccion');
+            
+            if (tablaSeccion) tablaSeccion.classList.remove('hidden');
+            if (filtrosSeccion) filtrosSeccion.classList.add('hidden');
+            
+            renderizarTabla();
+            
         } else {
-            showNotification(`Error al generar ${tipo}`, 'error');
+            showNotification(result.message || `No hay ${tipo} con los filtros aplicados`, 'error');
         }
     } catch (error) {
         console.error(error);
@@ -1643,6 +1705,64 @@ async function validarCodigoLanzamiento() {
     }
 }
 
+/**
+ * Valida de una vez los códigos pegados en la lista: los existentes se
+ * agregan con su marca/color; los nuevos quedan en el campo para
+ * ingresarlos manualmente uno a uno
+ */
+async function validarListaLanzamientos() {
+    const textarea = document.getElementById('lanzamiento-lista');
+    const statusDiv = document.getElementById('lanzamiento-status');
+    const codigos = textarea.value.split(/[\s,;]+/).filter(c => c);
+    
+    if (codigos.length === 0) {
+        showNotification('Pega al menos un código de barras', 'error');
+        return;
+    }
+    
+    try {
+        const response = await fetch(`${CONFIG.API_URL}/validar-codigos-lanzamiento`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ codigos })
+        });
+        const result = await response.json();
+        
+        if (!response.ok || !result.success) {
+            throw new Error(result.error || result.detail || 'Error al validar códigos');
+        }
+        
+        let agregados = 0;
+        result.existentes.forEach(p => {
+            if (listaLanzamientos.some(item => item.c_barra === p.c_barra)) return;
+            listaLanzamientos.push({
+                c_barra: p.c_barra,
+                d_marca: p.marca || 'SIN MARCA',
+                color: p.color || 'SIN COLOR'
+            });
+            agregados++;
+        });
+        
+        renderizarListaLanzamientos();
+        textarea.value = result.nuevos.join('\n');
+        
+        if (result.nuevos.length > 0) {
+            statusDiv.className = 'mb-3 p-2 rounded text-sm bg-yellow-100 text-yellow-800 border border-yellow-300';
+            statusDiv.textContent = `⚠️ ${agregados} agregados. ${result.nuevos.length} productos nuevos quedan en la lista: ingresa su marca y color manualmente`;
+        } else {
+            statusDiv.className = 'mb-3 p-2 rounded text-sm bg-green-100 text-green-800 border border-green-300';
+            statusDiv.textContent = `✅ ${agregados} productos agregados a lanzamientos`;
+        }
+        statusDiv.classList.remove('hidden');
+        
+    } catch (error) {
+        console.error('Error al validar lista de códigos:', error);
+        statusDiv.className = 'mb-3 p-2 rounded text-sm bg-red-100 text-red-800 border border-red-300';
+        statusDiv.textContent = '❌ Error al validar la lista de códigos';
+        statusDiv.classList.remove('hidden');
+    }
+}
+
 /**
  * Agrega un nuevo producto a la lista de lanzamientos
  */
@@ -10,6 +10,9 @@ const CONFIG = {
     // Configuración de paginación
     REGISTROS_POR_PAGINA: 50,
     
+    // Filas que se piden al servidor por lote en los previews
+    REGISTROS_POR_LOTE: 500,
+    
     // Valores por defecto para formularios
     DEFAULTS: {
         diasReabastecimiento: 10,
@@ -1,7 +1,20 @@
 # test_analisis_marca_2
 
 import pytest
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
 from app.consultas import get_analisis_marca
+from app.database import get_connection
+from app.exceptions import DerivedDataMissingError
+from app.repositories.analisis_marca_repository import (
+    crear_clave_marca,
+    get_top_marca,
+    get_top_todas_marcas,
+)
+from app.services.analisis_marca_service import construir_clave_marca, construir_top_marcas
+from app.utils.text import clave_marca
 
 MARCA_TEST = "JAGI CAPS LICENCIAS"
 
@@ -49,4 +62,110 @@ def test_tiendas_consistentes_con_top10(analisis_marca):
     for tienda in tiendas:
         total = tienda["productos_top10"] + tienda["productos_faltantes"]
         assert total == len(top10)
-        assert tienda["ventas_top10"] >= 0
\ No newline at end of file
+        assert tienda["ventas_top10"] >= 0
+
+def test_matriz_por_tienda_coincide_con_el_detalle(analisis_marca):
+    top10 = analisis_marca["top10"]
+
+    for tienda in analisis_marca["tiendas"]:
+        con = [p for p in top10 if tienda["tienda"] in p["tiendas_con_producto"]]
+        assert tienda["productos_top10"] == len(con)
+        assert tienda["ventas_top10"] == sum(p["ventas_30d"] for p in con)
+
+
+def _marca_de(codigo):
+    with get_connection() as conn:
+        df = pd.read_sql(
+            "SELECT d_marca FROM ventas_saldos_raw WHERE c_barra = ? LIMIT 1", conn, params=(codigo,)
+        )
+    return df["d_marca"].iloc[0]
+
+
+def test_marca_exacta_no_mezcla_marcas_que_la_contienen():
+    # "JAGI CAPS" está contenida en MARCA_TEST, pero es otra marca
+    for producto in get_analisis_marca("JAGI CAPS")["top10"]:
+        assert clave_marca(_marca_de(producto["c_barra"])) == "jagi caps"
+
+
+def test_marca_por_prefijo_y_aproximada():
+    prefijo = get_analisis_marca(MARCA_TEST[:8].lower())
+    assert prefijo["top10"]
+
+    assert get_analisis_marca("CAPS LICENCIAS")["top10"] == []
+    aproximada = get_analisis_marca("CAPS LICENCIAS", aproximada=True)
+    assert aproximada["top10"] == get_analisis_marca(MARCA_TEST)["top10"]
+
+
+def test_top_precalculado_igual_al_calculado():
+    clave = clave_marca(MARCA_TEST)
+
+    with get_connection() as conn:
+        leido = get_top_marca(conn, clave)
+        calculado = get_top_todas_marcas(conn, 10)
+
+    calculado = calculado[calculado["marca_key"] == clave]
+    assert leido["c_barra"].tolist() == calculado["c_barra"].tolist()
+    assert leido["ventas_30d"].tolist() == calculado["ventas_30d"].tolist()
+
+
+def test_sin_marca_key_error_claro_sin_migrar():
+    with get_connection() as conn:
+        conn.execute(text("DROP INDEX idx_ventas_saldos_raw_marca_key"))
+        conn.execute(text("ALTER TABLE ventas_saldos_raw DROP COLUMN marca_key"))
+        conn.commit()
+    try:
+        with pytest.raises(DerivedDataMissingError):
+            get_analisis_marca(MARCA_TEST)
+        with get_connection() as conn:
+            columnas = pd.read_sql("PRAGMA table_info(ventas_saldos_raw)", conn)["name"]
+        assert "marca_key" not in set(columnas)
+    finally:
+        construir_clave_marca()
+
+
+def _tabla_temporal_existe(conn):
+    return conn.execute(text(
+        "SELECT 1 FROM sqlite_temp_master WHERE name = 'tmp_marca_key'"
+    )).first() is not None
+
+
+def test_clave_marca_se_recrea_tras_una_carga_fallida():
+    with get_connection() as conn:
+        claves = dict(conn.execute(text(
+            "SELECT DISTINCT d_marca, marca_key FROM ventas_saldos_raw WHERE d_marca IS NOT NULL"
+        )).all())
+
+        # Un valor que sqlite no acepta hace fallar la carga a mitad de camino
+        with pytest.raises(DBAPIError):
+            crear_clave_marca(conn, {"MARCA": object()})
+        assert not _tabla_temporal_existe(conn)
+
+        # Una tabla que quedó de antes tampoco impide la siguiente carga
+        conn.execute(text("CREATE TEMPORARY TABLE tmp_marca_key (d_marca TEXT)"))
+        crear_clave_marca(conn, claves)
+
+        assert not _tabla_temporal_existe(conn)
+        assert dict(conn.execute(text(
+            "SELECT DISTINCT d_marca, marca_key FROM ventas_saldos_raw WHERE d_marca IS NOT NULL"
+        )).all()) == claves
+
+
+def test_lee_top_guardado_con_su_fecha_sin_recalcular():
+    with get_connection() as conn:
+        conn.execute(text("UPDATE top_marcas SET fecha_calculo = '2000-01-01'"))
+        conn.commit()
+    try:
+        assert get_analisis_marca(MARCA_TEST)["fecha_calculo"] == "2000-01-01"
+    finally:
+        construir_top_marcas()
+
+
+def test_sin_top_marcas_error_claro():
+    with get_connection() as conn:
+        conn.execute(text("DROP TABLE top_marcas"))
+        conn.commit()
+    try:
+        with pytest.raises(DerivedDataMissingError):
+            get_analisis_marca(MARCA_TEST)
+    finally:
+        construir_top_marcas()
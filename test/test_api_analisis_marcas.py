@@ -0,0 +1,36 @@
+# test_api_analisis_marcas.py
+
+import io
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from openpyxl import load_workbook
+
+from app.main import app
+
+
+client = TestClient(app)
+
+
+def test_todas_las_marcas_igual_al_analisis_individual():
+    datos = client.get("/analisis-marcas", params={"top_n": 10}).json()["datos"]
+
+    for resumen in datos["marcas"][:3]:
+        individual = client.get(f"/analisis-marca/{resumen['marca']}").json()["datos"]
+        top = [p for p in datos["productos"] if p["marca"] == resumen["marca"]]
+
+        assert resumen["total_productos"] == individual["resumen"]["total_productos"]
+        assert resumen["oportunidades_redistribucion"] == individual["resumen"]["oportunidades_redistribucion"]
+        assert sorted(p["c_barra"] for p in top) == sorted(p["c_barra"] for p in individual["top10"])
+
+
+def test_exportar_libro_con_una_hoja_por_tabla():
+    response = client.get("/analisis-marcas/exportar", params={"top_n": 5})
+    if response.status_code == 404:
+        pytest.skip("La base de datos no tiene marcas para analizar")
+
+    assert response.status_code == 200
+    wb = load_workbook(io.BytesIO(response.content), read_only=True)
+    assert wb.sheetnames == ["Marcas", "Top 5", "Tiendas"]
+    os.remove("analisis_marcas.xlsx")
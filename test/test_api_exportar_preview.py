@@ -0,0 +1,46 @@
+# test_api_exportar_preview.py
+
+import io
+import os
+import zipfile
+
+from fastapi.testclient import TestClient
+from openpyxl import load_workbook
+
+from app.main import app
+
+
+client = TestClient(app)
+
+DATOS = [
+    {"tienda": "NORTE", "c_barra": "A1", "cantidad": 1},
+    {"tienda": "SUR", "c_barra": "B2", "cantidad": 2},
+    {"tienda": "NORTE", "c_barra": "C3", "cantidad": 3},
+]
+
+
+def test_exportar_preview_un_libro_por_tienda():
+    response = client.post(
+        "/exportar-preview-personalizado",
+        json={"datos": DATOS, "nombre_reporte": "Prueba Zip", "por_tienda": True}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(response.content)) as zf:
+        assert zf.namelist() == ["NORTE.xlsx", "SUR.xlsx"]
+        wb = load_workbook(io.BytesIO(zf.read("NORTE.xlsx")))
+    assert [c.value for c in wb["NORTE"]["B"]] == ["c_barra", "A1", "C3"]
+    os.remove("prueba_zip_por_tienda.zip")
+
+
+def test_exportar_preview_un_libro_con_hoja_por_tienda():
+    response = client.post(
+        "/exportar-preview-personalizado",
+        json={"datos": DATOS, "nombre_reporte": "Prueba Libro"}
+    )
+
+    assert response.status_code == 200
+    wb = load_workbook(io.BytesIO(response.content))
+    assert wb.sheetnames == ["NORTE", "SUR"]
+    os.remove("prueba_libro_personalizado.xlsx")
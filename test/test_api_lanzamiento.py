@@ -0,0 +1,28 @@
+# test_api_lanzamiento.py
+
+from fastapi.testclient import TestClient
+from app.main import app
+
+
+client = TestClient(app)
+
+
+def test_validacion_por_lote_igual_a_la_individual():
+    sugerencias = client.get("/buscar-producto/JGL").json()["resultados"]
+    codigos = [r["c_barra"] for r in sugerencias[:10]] + ["NUEVO-0001", "NUEVO-0001"]
+
+    lote = client.post("/validar-codigos-lanzamiento", json={"codigos": codigos}).json()
+
+    assert lote["success"]
+    assert lote["nuevos"] == ["NUEVO-0001"]
+    assert lote["total"] == len(lote["existentes"]) + len(lote["nuevos"])
+    for producto in lote["existentes"]:
+        individual = client.get(f"/validar-codigo-lanzamiento/{producto['c_barra']}").json()
+        assert individual["existe"]
+        assert (individual["marca"], individual["color"]) == (producto["marca"], producto["color"])
+
+
+def test_validacion_por_lote_requiere_codigos():
+    response = client.post("/validar-codigos-lanzamiento", json={"codigos": []})
+
+    assert response.status_code == 422
@@ -0,0 +1,119 @@
+# test_api_paginacion.py
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app import main
+from app.database import get_connection
+from app.main import app
+from app.services.reabastecimiento_service import COLUMNAS_SALIDA
+
+
+client = TestClient(app)
+
+
+def _todas_las_paginas(url, body, page_size):
+    datos, cursor = [], None
+    while True:
+        pagina = client.post(
+            url, json={**body, "paginacion": {"page_size": page_size, "cursor": cursor}}
+        ).json()
+        datos += pagina["datos"]
+        if not pagina["has_more"]:
+            return pagina["total"], datos
+        cursor = pagina["next_cursor"]
+
+
+def test_paginas_de_existencias_igual_al_preview_completo():
+    completo = client.post("/reportes/existencias-preview", json={}).json()
+    if not completo["success"]:
+        pytest.skip("La base de datos no tiene existencias")
+
+    total, datos = _todas_las_paginas("/reportes/existencias-preview", {}, 150)
+
+    assert total == completo["total"]
+    assert datos == completo["datos"]
+
+
+def test_paginas_de_reabastecimiento_igual_al_preview_completo():
+    completo = client.post("/reabastecimiento-preview", json={}).json()
+    if not completo["datos"]:
+        pytest.skip("La base de datos no tiene resultados de reabastecimiento")
+
+    total, datos = _todas_las_paginas("/reabastecimiento-preview", {}, 100)
+
+    assert total == completo["total"]
+    assert datos == completo["datos"]
+
+
+def _estadisticas(datos):
+    return {
+        "total_registros": len(datos),
+        "tiendas": len({d["tienda"] for d in datos}),
+        "productos": len({d["c_barra"] for d in datos}),
+        "unidades": sum(d.get("cantidad_a_despachar") or 0 for d in datos),
+    }
+
+
+@pytest.mark.parametrize("url", ["/reportes/existencias-preview", "/reabastecimiento-preview"])
+def test_estadisticas_de_la_primera_pagina_cubren_todo_el_resultado(url):
+    completo = client.post(url, json={}).json()
+    if not completo.get("datos"):
+        pytest.skip("La base de datos no tiene datos para el preview")
+
+    pagina = client.post(url, json={"paginacion": {"page_size": 10}}).json()
+
+    assert pagina["has_more"]
+    assert pagina["estadisticas"] == _estadisticas(completo["datos"])
+
+
+@pytest.fixture
+def saldos_repetidos():
+    """Tres filas de saldos con las mismas claves de orden."""
+    fila = {"d_almacen": "ALM PRUEBA REPETIDA", "c_barra": "REP-1", "d_marca": "MARCA REP"}
+    with get_connection() as conn:
+        for saldo in (1, 2, 3):
+            conn.execute(text(
+                "INSERT INTO ventas_saldos_raw (d_almacen, c_barra, d_marca, saldo_disponible) "
+                "VALUES (:d_almacen, :c_barra, :d_marca, :saldo)"
+            ), {**fila, "saldo": saldo})
+        conn.commit()
+    yield fila
+    with get_connection() as conn:
+        conn.execute(text("DELETE FROM ventas_saldos_raw WHERE d_almacen = :d_almacen"), fila)
+        conn.commit()
+
+
+def test_paginas_de_existencias_con_claves_repetidas(saldos_repetidos):
+    total, datos = _todas_las_paginas(
+        "/reportes/existencias-preview", {"tienda": saldos_repetidos["d_almacen"]}, 1
+    )
+
+    assert total == 3
+    assert sorted(d["stock_actual"] for d in datos) == [1, 2, 3]
+
+
+def test_paginas_de_reabastecimiento_con_tiendas_repetidas(monkeypatch):
+    # Dos almacenes con el mismo nombre limpio dan filas con las mismas claves
+    filas = [
+        ["NORTE", "Tienda Doble", "A1", "MARCA", "AZUL", 1, 0, 0, 2, cantidad, ""]
+        for cantidad in (1, 2, 3)
+    ]
+    df = pd.DataFrame(filas, columns=COLUMNAS_SALIDA)
+    monkeypatch.setattr(main, "get_reabastecimiento_avanzado", lambda **kwargs: df.copy())
+
+    total, datos = _todas_las_paginas("/reabastecimiento-preview", {"dias_reab": 997}, 1)
+
+    assert total == 3
+    assert [d["cantidad_a_despachar"] for d in datos] == [1, 2, 3]
+
+
+def test_cursor_invalido():
+    response = client.post(
+        "/reportes/existencias-preview",
+        json={"paginacion": {"page_size": 10, "cursor": "no-es-un-cursor"}}
+    )
+
+    assert response.status_code == 400
@@ -0,0 +1,45 @@
+# test_api_reabastecimiento.py
+
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.schemas.reabastecimiento import ReabastecimientoItem
+
+
+client = TestClient(app)
+
+
+def _calcular(**extra):
+    hoy = date.today()
+    return client.post(
+        "/reabastecimiento",
+        json={
+            "dias_venta": 10,
+            "dias_stock": 60,
+            "fecha_inicio": (hoy - timedelta(days=30)).strftime("%d/%m/%Y"),
+            "fecha_fin": hoy.strftime("%d/%m/%Y"),
+            **extra,
+        }
+    )
+
+
+def test_reabastecimiento_items_validos_y_totales_coherentes():
+    response = _calcular()
+    data = response.json()
+
+    assert response.status_code == 200
+    assert data["success"] is True
+    items = data["items"]
+    if not items:
+        pytest.skip("La base de datos no tiene resultados de reabastecimiento")
+
+    for item in items:
+        ReabastecimientoItem.model_validate(item)
+    assert data["total_items"] == len(items)
+    assert data["items_con_necesidad"] == sum(1 for i in items if i["necesidad"] > 0)
+    assert data["total_unidades_necesarias"] == sum(i["necesidad"] for i in items)
+    assert sum(t["total_productos"] for t in data["resumen_por_tienda"].values()) == len(items)
+    assert data["parametros"]["dias_venta"] == 10
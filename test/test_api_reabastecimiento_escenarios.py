@@ -0,0 +1,36 @@
+# test_api_reabastecimiento_escenarios.py
+
+from fastapi.testclient import TestClient
+from app.main import app
+
+
+client = TestClient(app)
+GRILLA = {"dias_reab": [7, 10], "dias_exp": [60, 90], "ventas_min_exp": [3]}
+
+
+def test_endpoint_escenarios_una_fila_por_combinacion():
+    response = client.post("/reabastecimiento/escenarios", json=GRILLA)
+    data = response.json()
+
+    assert response.status_code == 200
+    assert data["success"] is True
+    assert data["total"] == 4
+    assert len(data["escenarios"]) == 4
+
+
+def test_endpoint_escenarios_totales_coherentes():
+    response = client.post("/reabastecimiento/escenarios", json=GRILLA)
+
+    for esc in response.json()["escenarios"]:
+        assert esc["unidades_despachar"] >= esc["unidades_compra"] + esc["unidades_expansion"]
+        assert esc["total_items"] >= esc["items_compra"] + esc["items_expansion"]
+        assert esc["codigos_expansion"] <= esc["items_expansion"]
+
+
+def test_endpoint_escenarios_rechaza_dias_invalidos():
+    response = client.post(
+        "/reabastecimiento/escenarios",
+        json={"dias_reab": [0], "dias_exp": [60], "ventas_min_exp": [3]}
+    )
+
+    assert response.status_code == 422
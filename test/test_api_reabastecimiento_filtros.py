@@ -0,0 +1,47 @@
+# test_api_reabastecimiento_filtros.py
+
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+
+
+client = TestClient(app)
+
+
+def test_preview_filtrado_por_tienda_igual_al_reporte_completo():
+    completo = client.post("/reabastecimiento-preview", json={}).json()
+    datos = completo["datos"]
+    if not datos:
+        pytest.skip("La base de datos no tiene resultados de reabastecimiento")
+
+    tienda = datos[0]["tienda"]
+    esperado = [d for d in datos if d["tienda"] == tienda]
+
+    response = client.post(
+        "/reabastecimiento/preview-filtrado",
+        json={"tiendas_filtro": [tienda]}
+    )
+    data = response.json()
+
+    assert response.status_code == 200
+    assert data["total_registros"] == len(esperado)
+    assert data["tiendas_incluidas"] == 1
+    assert data["datos"] == esperado[:100]
+
+
+def test_reabastecimiento_tienda_inexistente_sin_items():
+    response = client.post(
+        "/reabastecimiento",
+        json={
+            "dias_venta": 10,
+            "dias_stock": 60,
+            "fecha_inicio": "01/01/2026",
+            "fecha_fin": "30/01/2026",
+            "tiendas": ["TIENDA QUE NO EXISTE"]
+        }
+    )
+    data = response.json()
+
+    assert response.status_code == 200
+    assert data["total_items"] == 0
+    assert data["items"] == []
@@ -0,0 +1,34 @@
+# test_api_streaming.py
+
+import io
+import json
+
+import pandas as pd
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import get_existencias_por_tienda, get_movimiento
+from app.services.existencias_service import stream_existencias_por_tienda
+
+
+client = TestClient(app)
+
+
+def test_movimiento_ndjson_una_fila_por_linea():
+    response = client.get("/reportes/movimiento/stream", params={"dias": 30})
+    filas = [json.loads(linea) for linea in response.text.splitlines()]
+    esperado = get_movimiento(30)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert len(filas) == len(esperado)
+    assert [f["c_barra"] for f in filas] == esperado["c_barra"].tolist()
+
+
+def test_existencias_csv_por_lotes_igual_al_reporte():
+    contenido = b"".join(stream_existencias_por_tienda("csv", tamano_lote=100))
+    df = pd.read_csv(io.StringIO(contenido.decode("utf-8")), dtype={"c_barra": str})
+    esperado = get_existencias_por_tienda()
+
+    assert list(df.columns) == list(esperado.columns)
+    assert df["c_barra"].tolist() == esperado["c_barra"].tolist()
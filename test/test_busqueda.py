@@ -0,0 +1,72 @@
+# test_busqueda.py
+
+import shutil
+
+import pytest
+import pandas as pd
+from sqlalchemy import create_engine, inspect, text
+
+from app.database import DB_PATH
+from app.repositories import busqueda_repository as repo
+
+
+def _copia_base(tmp_path_factory):
+    if DB_PATH is None:
+        pytest.skip("Las pruebas de búsqueda usan una copia de la base SQLite")
+    copia = tmp_path_factory.mktemp("busqueda") / "jagi_mahalo.db"
+    shutil.copy(DB_PATH, copia)
+    return create_engine(f"sqlite:///{copia}")
+
+
+@pytest.fixture(scope="module")
+def conn(tmp_path_factory):
+    """Conexión a una copia de la base con el índice de búsqueda (no toca la base real)."""
+    engine = _copia_base(tmp_path_factory)
+    with engine.connect() as conexion:
+        if not repo.crear_indice_busqueda(conexion):
+            pytest.skip("SQLite sin FTS5 trigram")
+        yield conexion
+    engine.dispose()
+
+
+@pytest.fixture(scope="module")
+def codigo(conn):
+    df = pd.read_sql("SELECT c_barra FROM ventas_saldos_raw WHERE LENGTH(c_barra) > 4 LIMIT 1", conn)
+    if df.empty:
+        pytest.skip("La base de datos no tiene códigos en saldos")
+    return str(df["c_barra"].iloc[0])
+
+
+def test_codigo_exacto_y_prefijos_primero(conn, codigo):
+    exacto = repo.fetch_busqueda_indexada(conn, codigo.lower(), 20)
+    assert exacto["c_barra"].iloc[0] == codigo
+
+    prefijo = codigo[:-1]
+    df = repo.fetch_busqueda_indexada(conn, prefijo, 20)
+    empieza = df["c_barra"].str.upper().str.startswith(prefijo.upper()).tolist()
+    assert empieza == sorted(empieza, reverse=True)
+
+
+def test_indice_encuentra_lo_mismo_que_like_por_codigo(conn, codigo):
+    indexada = repo.fetch_busqueda_indexada(conn, codigo, 1000)
+    like = repo.fetch_busqueda_like(conn, codigo, 1000)
+
+    assert set(like["c_barra"]) <= set(indexada["c_barra"])
+
+
+def test_reconstruccion_fallida_conserva_el_indice_anterior(tmp_path_factory, codigo):
+    engine = _copia_base(tmp_path_factory)
+    with engine.connect() as conexion:
+        if not repo.crear_indice_busqueda(conexion):
+            pytest.skip("SQLite sin FTS5 trigram")
+
+        # Sin la tabla de origen la nueva construcción falla a mitad de camino
+        conexion.execute(text("ALTER TABLE ventas_saldos_raw RENAME TO saldos_aparte"))
+        conexion.commit()
+        assert repo.crear_indice_busqueda(conexion) is False
+
+        tablas = set(inspect(conexion).get_table_names())
+        assert repo.TABLA_BUSQUEDA in tablas
+        assert f"{repo.TABLA_BUSQUEDA}_nueva" not in tablas
+        assert codigo in set(repo.fetch_busqueda_indexada(conexion, codigo, 20)["c_barra"])
+    engine.dispose()
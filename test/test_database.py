@@ -0,0 +1,23 @@
+# test_database.py
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from app.database import get_connection
+
+
+def test_conexiones_simultaneas_no_comparten_la_conexion():
+    with get_connection() as a, get_connection() as b:
+        assert a.connection.dbapi_connection is not b.connection.dbapi_connection
+
+
+def test_consultas_desde_varios_hilos():
+    def contar(_):
+        with get_connection() as conn:
+            return int(pd.read_sql("SELECT COUNT(*) AS n FROM config_tiendas", conn)["n"].iloc[0])
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        conteos = list(pool.map(contar, range(32)))
+
+    assert len(set(conteos)) == 1
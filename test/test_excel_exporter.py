@@ -0,0 +1,83 @@
+# test_excel_exporter.py
+
+import io
+import zipfile
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from app.reports.excel_exporter import exportar_excel_formateado, exportar_excel_por_tienda_zip
+
+
+def test_una_hoja_formateada_por_tienda(tmp_path):
+    df = pd.DataFrame({
+        "tienda": ["NORTE", "SUR", "NORTE"],
+        "c_barra": ["A1", "B2", "C3"],
+        "cantidad": [1, None, 3],
+    })
+    archivo = tmp_path / "reporte.xlsx"
+
+    exportar_excel_formateado(df, archivo, "Prueba")
+
+    wb = load_workbook(archivo)
+    assert wb.sheetnames == ["NORTE", "SUR"]
+
+    ws = wb["NORTE"]
+    assert [c.value for c in ws[1]] == ["tienda", "c_barra", "cantidad"]
+    assert [c.value for c in ws["B"]][1:] == ["A1", "C3"]
+    assert ws["A1"].style == "jagi_encabezado"
+    assert ws["A2"].style == "jagi_cuerpo_alterno"
+    assert ws["A3"].style == "jagi_cuerpo"
+    assert ws.freeze_panes == "A2"
+    assert wb["SUR"]["C2"].value is None
+
+
+def test_ancho_de_columna_segun_su_contenido(tmp_path):
+    df = pd.DataFrame({
+        "tienda": ["NORTE"] * 3,
+        "observacion": ["ok", "Sin stock en bodega", None],
+        "color": ["AZUL", "ROJO", "VERDE"],
+    })
+    archivo = tmp_path / "reporte.xlsx"
+
+    exportar_excel_formateado(df, archivo)
+
+    anchos = load_workbook(archivo)["NORTE"].column_dimensions
+    assert anchos["B"].width > anchos["C"].width
+    assert anchos["C"].width == (len("color") + 2) * 1.1
+
+
+def test_zip_con_un_libro_por_tienda_igual_a_sus_hojas(tmp_path):
+    df = pd.DataFrame({
+        "tienda": ["NORTE", "SUR", "CENTRO", "ESTE/1", "NORTE"],
+        "c_barra": ["A1", "B2", "C3", "D4", "E5"],
+        "cantidad": [1, 2, 3, 4, 5],
+    })
+    archivo = tmp_path / "reporte.zip"
+
+    exportar_excel_por_tienda_zip(df, archivo, "Prueba", max_workers=2)
+
+    with zipfile.ZipFile(archivo) as zf:
+        assert zf.namelist() == ["CENTRO.xlsx", "ESTE_1.xlsx", "NORTE.xlsx", "SUR.xlsx"]
+        wb = load_workbook(io.BytesIO(zf.read("NORTE.xlsx")))
+
+    assert wb.sheetnames == ["NORTE"]
+    assert [c.value for c in wb["NORTE"]["B"]] == ["c_barra", "A1", "E5"]
+    assert wb["NORTE"]["A1"].style == "jagi_encabezado"
+
+
+def test_zip_sin_nombres_de_archivo_repetidos(tmp_path):
+    df = pd.DataFrame({
+        "tienda": ["A/B", "A:B", "a_b"],
+        "c_barra": ["A1", "B2", "C3"],
+    })
+    archivo = tmp_path / "reporte.zip"
+
+    exportar_excel_por_tienda_zip(df, archivo, max_workers=1)
+
+    with zipfile.ZipFile(archivo) as zf:
+        assert zf.namelist() == ["A_B.xlsx", "A_B_2.xlsx", "a_b_3.xlsx"]
+        wb = load_workbook(io.BytesIO(zf.read("A_B_2.xlsx")))
+
+    assert wb.sheetnames == ["A_B"]
+    assert wb.active["B2"].value == "B2"
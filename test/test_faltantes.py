@@ -0,0 +1,94 @@
+# test_faltantes.py
+
+from datetime import date
+
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+from app.database import date_format_convert, date_subtract_days, get_connection
+from app.services.faltantes_service import get_faltantes
+from app.utils.cache import invalidar_cache
+
+
+def _faltantes_por_bucle(dias=90):
+    """Versión anterior (bucle producto × tienda, códigos tal como vienen)."""
+    with get_connection() as conn:
+        excluidos = pd.read_sql("SELECT cod_barras FROM codigos_excluidos", conn)["cod_barras"].astype(str)
+        ventas = pd.read_sql(f"""
+            SELECT c_barra, d_marca, d_almacen
+            FROM ventas_historico_raw
+            WHERE {date_format_convert("f_sistema")} >= {date_subtract_days(dias)}
+            GROUP BY c_barra, d_marca, d_almacen
+            HAVING SUM(cn_venta) > 0
+        """, conn)
+        existencias = pd.read_sql("SELECT c_barra, d_almacen FROM ventas_saldos_raw", conn)
+        tiendas = pd.read_sql("SELECT raw_name, clean_name FROM config_tiendas", conn)
+
+    def limpiar(df):
+        df = df.merge(tiendas, left_on="d_almacen", right_on="raw_name", how="left")
+        df["tienda"] = df["clean_name"].fillna(df["d_almacen"])
+        df = df[~df["tienda"].str.contains("BODEGA", case=False, na=False)]
+        return df[~df["c_barra"].isin(excluidos)]
+
+    ventas, existencias = limpiar(ventas), limpiar(existencias)
+    tiendas_activas = existencias["tienda"].drop_duplicates().tolist()
+
+    filas = []
+    for c_barra, d_marca in ventas[["c_barra", "d_marca"]].drop_duplicates().itertuples(index=False):
+        con_stock = set(existencias.loc[existencias["c_barra"] == c_barra, "tienda"])
+        filas += [(c_barra, d_marca, t) for t in tiendas_activas if t not in con_stock]
+
+    df = pd.DataFrame(filas, columns=["c_barra", "d_marca", "tienda_faltante"])
+    return df.sort_values(by=["d_marca", "tienda_faltante"])
+
+
+def test_mismas_filas_y_orden_que_el_bucle():
+    esperado = _faltantes_por_bucle()
+    if esperado.empty:
+        pytest.skip("La base de datos no tiene faltantes")
+
+    pd.testing.assert_frame_equal(
+        get_faltantes().reset_index(drop=True), esperado.reset_index(drop=True)
+    )
+
+
+@pytest.fixture
+def codigo_en_minusculas():
+    """Código vendido en 'ABC-MAY' que en saldos está como 'abc-may' en una tienda."""
+    hoy = date.today().strftime("%d/%m/%Y")
+    with get_connection() as conn:
+        almacen = conn.execute(text(
+            "SELECT d_almacen FROM ventas_saldos_raw "
+            "WHERE d_almacen NOT LIKE '%BODEGA%' LIMIT 1"
+        )).scalar()
+        conn.execute(text(
+            "INSERT INTO ventas_historico_raw (d_almacen, c_barra, d_marca, f_sistema, cn_venta) "
+            "VALUES (:almacen, 'ABC-MAY', 'MARCA MAY', :hoy, 1)"
+        ), {"almacen": almacen, "hoy": hoy})
+        conn.execute(text(
+            "INSERT INTO ventas_saldos_raw (d_almacen, c_barra, d_marca, saldo_disponible) "
+            "VALUES (:almacen, 'abc-may', 'MARCA MAY', 1)"
+        ), {"almacen": almacen})
+        conn.commit()
+    invalidar_cache()
+    yield almacen
+    with get_connection() as conn:
+        conn.execute(text("DELETE FROM ventas_historico_raw WHERE c_barra = 'ABC-MAY'"))
+        conn.execute(text("DELETE FROM ventas_saldos_raw WHERE c_barra = 'abc-may'"))
+        conn.commit()
+    invalidar_cache()
+
+
+def test_codigos_se_comparan_sin_distinguir_mayusculas(codigo_en_minusculas):
+    with get_connection() as conn:
+        tienda = conn.execute(text(
+            "SELECT COALESCE(MAX(clean_name), :almacen) FROM config_tiendas WHERE raw_name = :almacen"
+        ), {"almacen": codigo_en_minusculas}).scalar()
+
+    df = get_faltantes()
+    faltan = df[df["c_barra"].str.upper() == "ABC-MAY"]
+
+    assert not faltan.empty
+    assert set(faltan["c_barra"]) == {"ABC-MAY"}
+    assert tienda not in set(faltan["tienda_faltante"])
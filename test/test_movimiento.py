@@ -0,0 +1,19 @@
+# test_movimiento.py
+
+from app.services import get_movimiento, get_resumen_movimiento
+
+
+def test_resumen_agrupado_en_sql_igual_al_agrupado_en_pandas():
+    detalle = get_movimiento(30)
+    esperado = (
+        detalle.groupby(["tienda", "estado"])
+        .agg(productos=("c_barra", "count"), stock_total=("stock_actual", "sum"))
+        .reset_index()
+    )
+
+    resumen = get_resumen_movimiento(30)
+
+    assert resumen[["tienda", "estado", "productos"]].equals(
+        esperado[["tienda", "estado", "productos"]]
+    )
+    assert (resumen["stock_total"] - esperado["stock_total"]).abs().max() < 1e-6
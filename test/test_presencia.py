@@ -0,0 +1,32 @@
+# test_presencia.py
+
+import pandas as pd
+
+from app.utils.presencia import IndicePresencia
+
+
+def _indice():
+    return IndicePresencia.desde_saldos(pd.DataFrame({
+        "c_barra": ["A1", "A1", "b2", "C3"],
+        "d_almacen": ["ALM 1", "ALM 2", "ALM 2", "ALM 3"],
+        "con_stock": [1, 0, 1, 0],
+    }))
+
+
+def test_almacenes_por_codigo_con_y_sin_stock():
+    indice = _indice()
+
+    assert indice.almacenes_de("A1") == ["ALM 1", "ALM 2"]
+    assert indice.almacenes_de("A1", con_stock=True) == ["ALM 1"]
+    assert indice.almacenes_de("B2") == ["ALM 2"]
+    assert indice.almacenes_de("NO EXISTE") == []
+
+
+def test_matriz_agrupada_por_tienda():
+    indice = _indice()
+    tienda = {"ALM 1": "Norte", "ALM 2": "Norte", "ALM 3": "Sur"}
+
+    m = indice.matriz(["A1", "C3", "X"], tienda, ["Norte", "Sur"])
+
+    assert m.tolist() == [[True, False], [False, True], [False, False]]
+    assert indice.almacenes_activos(excluir=["C3"]) == ["ALM 1", "ALM 2"]
@@ -0,0 +1,111 @@
+# test_producto.py
+
+import subprocess
+import sys
+
+import pytest
+import pandas as pd
+
+from app.database import get_connection
+from app.services import get_catalogo_productos, get_consulta_producto, get_consulta_productos
+from app.utils import cache
+
+
+def _un_codigo_con_ventas():
+    with get_connection() as conn:
+        df = pd.read_sql(
+            """
+            SELECT s.c_barra
+            FROM ventas_saldos_raw s
+            JOIN ventas_historico_raw h ON h.c_barra = s.c_barra
+            LIMIT 1
+            """,
+            conn
+        )
+    return df["c_barra"].iloc[0] if not df.empty else None
+
+
+def test_consulta_producto_coherente():
+    codigo = _un_codigo_con_ventas()
+    if codigo is None:
+        pytest.skip("La base de datos no tiene códigos con ventas")
+
+    datos = get_consulta_producto(codigo)
+    info, ventas = datos["info_general"], datos["ventas"]
+
+    assert datos["encontrado"]
+    assert info["codigo"] == codigo
+    assert info["stock_total"] == info["stock_bodega"] + info["stock_tiendas"]
+    assert ventas["ultimos_30_dias"] <= ventas["ultimos_60_dias"] <= ventas["ultimos_90_dias"]
+    assert len(datos["historial"]) <= 50
+
+
+def test_consulta_producto_inexistente():
+    datos = get_consulta_producto("CODIGO QUE NO EXISTE")
+
+    assert datos["encontrado"] is False
+
+
+def test_consulta_por_lote_igual_a_consulta_individual():
+    with get_connection() as conn:
+        codigos = pd.read_sql(
+            "SELECT DISTINCT c_barra FROM ventas_saldos_raw LIMIT 20", conn
+        )["c_barra"].tolist()
+    codigos.append("CODIGO QUE NO EXISTE")
+
+    fichas = get_consulta_productos(codigos)
+
+    assert list(fichas) == codigos
+    for codigo in codigos:
+        assert fichas[codigo] == get_consulta_producto(codigo)
+
+
+def test_catalogo_prefiere_saldos_sobre_bodega():
+    with get_connection() as conn:
+        df = pd.read_sql(
+            """
+            SELECT s.c_barra, s.d_marca, s.d_color_proveedor AS color
+            FROM ventas_saldos_raw s
+            JOIN inventario_bodega_raw b ON b.c_barra = s.c_barra
+            LIMIT 1
+            """,
+            conn
+        )
+    catalogo = get_catalogo_productos()
+
+    assert "CODIGO QUE NO EXISTE" not in catalogo
+    if df.empty:
+        pytest.skip("La base de datos no tiene códigos en saldos y bodega")
+    fila = df.iloc[0]
+    producto = catalogo.get(fila["c_barra"])
+    assert producto.fuente == "saldos"
+    assert producto.marca == fila["d_marca"]
+
+
+def _en_otro_proceso(sql):
+    """Ejecuta sql e invalida las caches desde otro proceso (como cargar_csv)."""
+    codigo = (
+        "from sqlalchemy import text\n"
+        "from app.database import get_connection\n"
+        "from app.utils.cache import invalidar_cache\n"
+        "with get_connection() as conn:\n"
+        f"    conn.execute(text({sql!r}))\n"
+        "    conn.commit()\n"
+        "invalidar_cache()\n"
+    )
+    subprocess.run([sys.executable, "-c", codigo], check=True)
+    # Lo que hace el hilo vigilante cada INTERVALO_LECTURA segundos
+    cache.refrescar_generacion()
+
+
+def test_catalogo_ve_codigos_cargados_por_otro_proceso():
+    assert "CODIGO OTRO PROCESO" not in get_catalogo_productos()
+
+    _en_otro_proceso(
+        "INSERT INTO ventas_saldos_raw (c_barra, d_marca, d_color_proveedor) "
+        "VALUES ('CODIGO OTRO PROCESO', 'MARCA', 'COLOR')"
+    )
+    try:
+        assert "CODIGO OTRO PROCESO" in get_catalogo_productos()
+    finally:
+        _en_otro_proceso("DELETE FROM ventas_saldos_raw WHERE c_barra = 'CODIGO OTRO PROCESO'")
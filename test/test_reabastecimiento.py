@@ -0,0 +1,35 @@
+# test_reabastecimiento.py
+
+import pytest
+from pandas.testing import assert_frame_equal
+
+from app.exceptions import InvalidDataError
+from app.services.reabastecimiento_service import COLUMNAS_SALIDA, get_reabastecimiento_avanzado
+
+
+def _ordenado(df):
+    return df.sort_values(COLUMNAS_SALIDA).reset_index(drop=True)
+
+
+@pytest.fixture(scope="module")
+def secuencial():
+    df = get_reabastecimiento_avanzado(guardar_debug_csv=False)
+    if df.empty:
+        pytest.skip("La base de datos no tiene resultados de reabastecimiento")
+    return _ordenado(df)
+
+
+@pytest.mark.parametrize("particionar_por", ["region", "tienda"])
+def test_modo_paralelo_igual_al_secuencial(secuencial, particionar_por):
+    df = get_reabastecimiento_avanzado(
+        guardar_debug_csv=False, particionar_por=particionar_por, max_workers=2
+    )
+
+    assert_frame_equal(_ordenado(df), secuencial)
+
+
+def test_fecha_mal_formada_error_de_datos():
+    with pytest.raises(InvalidDataError) as error:
+        get_reabastecimiento_avanzado(guardar_debug_csv=False, fecha_fin="2026-01-30")
+
+    assert error.value.details["field"] == "fecha_fin"
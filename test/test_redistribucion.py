@@ -0,0 +1,164 @@
+# test_redistribucion.py
+
+import subprocess
+import sys
+import threading
+
+import pytest
+import pandas as pd
+
+from app.services import redistribucion_service
+from app.services.redistribucion_service import (
+    _asignar_traslados,
+    _flujo_costo_minimo,
+    _optimizar_traslados,
+    get_redistribucion_regional,
+)
+from app.utils import cache
+from app.utils.cache import CacheGeneracional, invalidar_cache
+
+
+CLAVES = ["region", "c_barra", "d_marca"]
+
+
+def _tiendas(filas):
+    return pd.DataFrame(
+        filas,
+        columns=["region", "c_barra", "d_marca", "tienda_clean",
+                 "stock_actual", "stock_minimo", "ventas_periodo"]
+    )
+
+
+def test_excedente_de_un_origen_no_se_promete_dos_veces():
+    # Capacidad del origen: (12 - 4) // 2 = 4; necesidad total de destinos: 6
+    origen = _tiendas([["ANT", "C1", "M", "Origen", 12, 4, 0]])
+    destino = _tiendas([
+        ["ANT", "C1", "M", "Destino A", 1, 4, 5],
+        ["ANT", "C1", "M", "Destino B", 1, 4, 2],
+    ])
+
+    df = _asignar_traslados(origen, destino, CLAVES)
+
+    assert df["cantidad_sugerida"].sum() == 4
+    assert df.set_index("tienda_destino")["cantidad_sugerida"].to_dict() == {
+        "Destino A": 3,
+        "Destino B": 1,
+    }
+
+
+def test_solo_empareja_mismo_grupo():
+    origen = _tiendas([
+        ["ANT", "C1", "M", "Origen 1", 10, 4, 0],
+        ["VAL", "C2", "M", "Origen 2", 10, 4, 0],
+    ])
+    destino = _tiendas([
+        ["ANT", "C2", "M", "Destino", 0, 4, 3],
+        ["VAL", "C2", "M", "Destino 2", 2, 4, 1],
+    ])
+
+    df = _asignar_traslados(origen, destino, CLAVES)
+
+    assert df[["tienda_origen", "tienda_destino", "cantidad_sugerida"]].values.tolist() == [
+        ["Origen 2", "Destino 2", 2]
+    ]
+
+
+def test_flujo_optimo_cubre_lo_maximo_al_menor_costo():
+    costos = {("ANT", "ANT"): 1, ("ANT", "VAL"): 5, ("VAL", "ANT"): 5, ("VAL", "VAL"): 1}
+    flujo = _flujo_costo_minimo({"ANT": 4, "VAL": 3}, {"ANT": 2, "VAL": 6}, costos)
+
+    assert sum(flujo.values()) == 7
+    assert flujo == {("ANT", "ANT"): 2, ("ANT", "VAL"): 2, ("VAL", "VAL"): 3}
+
+
+def test_modo_optimo_en_paralelo_igual_al_secuencial(monkeypatch):
+    monkeypatch.setattr(redistribucion_service, "MIN_CODIGOS_PARALELO", 5)
+    codigos = [f"C{i}" for i in range(20)]
+    origen = _tiendas(
+        [["ANT", c, "M", "Origen A", 10 + i, 2, 0] for i, c in enumerate(codigos)]
+        + [["VAL", c, "M", "Origen V", 8, 2, 0] for c in codigos[::2]]
+    )
+    destino = _tiendas(
+        [["VAL", c, "M", "Destino V", 0, 4 + i % 3, i] for i, c in enumerate(codigos)]
+        + [["ANT", c, "M", "Destino A", 1, 5, 2] for c in codigos[1::3]]
+    )
+    costos = {("ANT", "ANT"): 1, ("ANT", "VAL"): 5, ("VAL", "ANT"): 5, ("VAL", "VAL"): 1}
+
+    secuencial = _optimizar_traslados(origen, destino, costos, max_workers=1)
+    paralelo = _optimizar_traslados(origen, destino, costos, max_workers=2)
+
+    assert not secuencial.empty
+    pd.testing.assert_frame_equal(paralelo, secuencial)
+
+
+def test_vista_por_tienda_es_parte_del_plan_completo():
+    completo = get_redistribucion_regional(dias=30, ventas_min=1)
+    if completo.empty:
+        pytest.skip("La base de datos no tiene redistribuciones sugeridas")
+
+    tienda = completo["tienda_origen"].iloc[0]
+    vista = get_redistribucion_regional(dias=30, ventas_min=1, tienda_origen=tienda.upper())
+    esperado = completo[completo["tienda_origen"] == tienda].reset_index(drop=True)
+
+    assert vista.equals(esperado)
+
+
+def test_cache_se_descarta_al_cambiar_generacion():
+    cache = CacheGeneracional()
+    llamadas = []
+
+    def calcular():
+        llamadas.append(1)
+        return len(llamadas)
+
+    assert cache.obtener("k", calcular) == 1
+    assert cache.obtener("k", calcular) == 1
+    invalidar_cache()
+    assert cache.obtener("k", calcular) == 2
+
+
+def test_cache_se_descarta_si_otro_proceso_cambia_los_datos():
+    planes = CacheGeneracional()
+    llamadas = []
+
+    def calcular():
+        llamadas.append(1)
+        return len(llamadas)
+
+    assert planes.obtener("k", calcular) == 1
+    # Otro proceso (p. ej. python -m app.cargar_csv) cambia los datos
+    subprocess.run(
+        [sys.executable, "-c", "from app.utils.cache import invalidar_cache; invalidar_cache()"],
+        check=True,
+    )
+    # Lo que hace el hilo vigilante cada INTERVALO_LECTURA segundos
+    cache.refrescar_generacion()
+    assert planes.obtener("k", calcular) == 2
+
+
+def test_consultar_la_cache_no_lee_la_base(monkeypatch):
+    leer = cache.get_connection
+
+    def sin_base():
+        # El hilo vigilante sí lee la base; la consulta a la cache no
+        if threading.current_thread() is threading.main_thread():
+            raise AssertionError("la consulta a la cache leyó la base")
+        return leer()
+
+    cache.generacion_datos()
+    monkeypatch.setattr(cache, "get_connection", sin_base)
+    planes = CacheGeneracional()
+
+    assert planes.obtener("k", lambda: 1) == 1
+    assert planes.obtener("k", lambda: 2) == 1
+
+
+def test_importar_la_app_no_lee_la_base():
+    codigo = (
+        "from app.utils import cache\n"
+        "def sin_base():\n"
+        "    raise RuntimeError('la importación leyó la base')\n"
+        "cache.get_connection = sin_base\n"
+        "import app.main\n"
+    )
+    subprocess.run([sys.executable, "-c", codigo], check=True)